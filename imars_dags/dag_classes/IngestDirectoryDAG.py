@@ -4,6 +4,7 @@ DAG that ingests files from a directory into IMaRS metadata db
 
 Example usage:
 --------------
+```
 IngestDirectoryDAG(
     directory_to_watch='/srv/imars-objects/ftp-ingest',
     schedule_interval=timedelta(days=1),
@@ -14,16 +15,60 @@ IngestDirectoryDAG(
         'duplicates_ok': True,
         'nohash': True,
     },
+    # load 8 files at once, at most 2 per NFS mount & 50MB/s overall:
+    max_workers=8,
+    per_mount_workers=2,
+    bytes_per_s=50e6,
 )
+```
+
+If the load kwargs include a `load_format` the directory is scanned once by
+a `scan_directory` task & each of those loads gets the files matching its
+format from there instead of running its own `imars_etl.find`
+(see ingest/scan.py).
+
+With `bulk=True` loads w/ a `load_format` that leave files in place
+(`object_store: 'no_upload'`) parse the `file` rows themselves & insert
+them in batches instead of calling `imars_etl.load` for each file
+(see ingest/bulk_load.py).
+
+With a `manifest_path` files loaded are recorded in a sqlite manifest (see
+ingest/manifest.py) so later runs only load new or changed files, once
+they are no longer being written. The manifest must be on a worker's local
+disk (sqlite locking is unreliable on NFS), so the DAG's tasks must then
+all run on that worker: pass a `queue` only it serves. Files still being
+written are left for the next run, so use it w/ `watch=True` or a short
+schedule_interval.
+
+With `watch=True` each run starts w/ a `watch_directory` task that waits
+(up to `watch_timeout`) for files to be closed after writing or moved into
+the directory (inotify, or polling on network filesystems; see
+ingest/watch.py) & the loads start once a burst of files has settled for
+`coalesce_time`. Runs follow each other back to back. Files changed while
+no run was watching end the next wait right away. Watching needs a
+`manifest_path`: the loads skip files still being written & files loaded
+by earlier runs, neither of which the watch alone can tell apart.
+Each wait holds a worker slot, so keep `watch_timeout` short.
 """
 from datetime import timedelta
 from datetime import datetime
+import os
 import shutil
+import time
 
 from airflow import DAG
 from airflow.operators.python_operator import PythonOperator
 import imars_etl
 
+from imars_dags.dag_classes.ingest.bulk_load import bulk_load
+from imars_dags.dag_classes.ingest.bulk_load import supports_bulk
+from imars_dags.dag_classes.ingest.manifest import IngestManifest
+from imars_dags.dag_classes.ingest.parallel_load import parallel_load
+from imars_dags.dag_classes.ingest.scan import get_index
+from imars_dags.dag_classes.ingest.scan import scan_directory
+from imars_dags.dag_classes.ingest.watch import changed_since
+from imars_dags.dag_classes.ingest.watch import open_watcher
+from imars_dags.dag_classes.ingest.watch import wait_for_files
 from imars_dags.util.merge_dicts import merge_dicts
 
 
@@ -36,6 +81,10 @@ class IngestDirectoryDAG(DAG):
         'status_id': 3,
         # 'dry_run': True,  # True if we are just testing
     }
+    SCAN_TASK_ID = "scan_directory"
+    WATCH_TASK_ID = "watch_directory"
+    # w/ watch each run waits for files, so a new run can start right away
+    WATCH_SCHEDULE_INTERVAL = timedelta(minutes=1)
 
     def __init__(
         self,
@@ -44,6 +93,17 @@ class IngestDirectoryDAG(DAG):
         load_kwargs_list,
         rm_loaded=False,
         schedule_interval=timedelta(days=1),
+        max_workers=1,
+        per_mount_workers=2,
+        bytes_per_s=None,
+        manifest_path=None,
+        settle_time=timedelta(minutes=5),
+        bulk=False,
+        watch=False,
+        watch_timeout=timedelta(minutes=10),
+        coalesce_time=timedelta(seconds=10),
+        poll_interval=timedelta(minutes=1),
+        queue=None,
         **kwargs
     ):
         """
@@ -55,24 +115,80 @@ class IngestDirectoryDAG(DAG):
             kwargs to pass to the load operation for each load
         rm_loaded : bool
             Loaded files will be removed iff True.
+        max_workers : int
+            max number of files loaded at once by each ingest task.
+        per_mount_workers : int or dict
+            max number of files loaded at once from each mounted
+            filesystem, or {mount_point: max} w/ key None as the default.
+        bytes_per_s : float
+            average read budget (by file size) of each ingest task.
+            None is no limit.
+        manifest_path : str path
+            sqlite manifest of the files already loaded, on a local disk of
+            the worker serving `queue`. None (the default) re-attempts
+            every file on every run.
+        settle_time : datetime.timedelta
+            files are only loaded once their size & mtime have not changed
+            for this long. Only used w/ a manifest.
+        bulk : bool
+            insert the `file` rows of loads that support it (see
+            bulk_load.supports_bulk) w/ multi-row INSERTs.
+        watch : bool
+            start each run by waiting for files to land in the directory
+            instead of running on schedule_interval (which is ignored).
+            Requires a manifest_path.
+        watch_timeout : datetime.timedelta
+            max wait for files; a run then scans the whole directory anyway.
+            The wait holds a worker slot the whole time.
+        coalesce_time : datetime.timedelta
+            files landing less than this apart are loaded together.
+        poll_interval : datetime.timedelta
+            re-scan interval when inotify cannot be used (eg: NFS).
+        queue : str
+            queue (see util.globals.QUEUE) the DAG's tasks run on. Required
+            w/ a manifest_path & must be served by a single worker.
         """
+        if watch is True and manifest_path is None:
+            raise ValueError(
+                "watch needs a manifest_path to skip files still being "
+                "written & files already loaded"
+            )
+        if manifest_path is not None and queue is None:
+            raise ValueError(
+                "manifest_path needs a `queue` served by a single worker"
+            )
+        if watch is True:
+            schedule_interval = self.WATCH_SCHEDULE_INTERVAL
+        default_args = {
+            # start_date is ideally utcnow()-schedule_interval but
+            #   that gets tricky if schedule_interval is string.
+            "start_date": datetime(2018, 7, 30),
+            "retries": 0,
+        }
+        if queue is not None:
+            default_args["queue"] = queue
         super(IngestDirectoryDAG, self).__init__(
             *args,
             schedule_interval=schedule_interval,
             catchup=False,
             max_active_runs=1,
-            default_args={
-                # start_date is ideally utcnow()-schedule_interval but
-                #   that gets tricky if schedule_interval is string.
-                "start_date": datetime(2018, 7, 30),
-                "retries": 0,
-            },
+            default_args=default_args,
             **kwargs
         )
         self.directory_path = directory_path
         assert len(load_kwargs_list) > 0
         self.load_kwargs_list = load_kwargs_list
         self.rm_loaded = rm_loaded
+        self.max_workers = max_workers
+        self.per_mount_workers = per_mount_workers
+        self.bytes_per_s = bytes_per_s
+        self.manifest_path = manifest_path
+        self.settle_time = settle_time
+        self.bulk = bulk
+        self.watch = watch
+        self.watch_timeout = watch_timeout
+        self.coalesce_time = coalesce_time
+        self.poll_interval = poll_interval
         self.add_ingest_tasks()
 
     def add_ingest_tasks(self):
@@ -80,15 +196,21 @@ class IngestDirectoryDAG(DAG):
         adds ingest tasks for each item in self.load_kwargs_list
 
         NOTE: tasks are one after the other to reduce stress on file servers
-           these could be parallel if disks & network could handle it.
+           & so the per-mount & byte-rate limits of each task (see
+           parallel_load.py) hold for the whole DAG. Use max_workers to
+           load files in parallel within each task.
         """
+        first_task = None
         prev_task = None
+        self.scanned_loads = {}  # task_id -> load kwargs w/ load_format
         for kwargs in self.load_kwargs_list:
             task_id = self.get_task_id(kwargs)
             kwargs = merge_dicts(
                 self.COMMON_ARGS,
                 kwargs
             )
+            if kwargs.get('load_format') is not None:
+                self.scanned_loads[task_id] = kwargs
             this_task = self.add_ingest_task(
                 task_id=task_id,
                 etl_load_args=kwargs
@@ -96,7 +218,25 @@ class IngestDirectoryDAG(DAG):
             if prev_task is not None:
                 # TODO: rm this if servers can handle it
                 prev_task >> this_task
+            else:
+                first_task = this_task
             prev_task = this_task
+        # added last so the ingest task_ids do not change
+        if len(self.scanned_loads) > 0:
+            scan_task = PythonOperator(
+                dag=self,
+                task_id=self.SCAN_TASK_ID,
+                python_callable=self._do_scan_directory,
+            )
+            scan_task >> first_task
+            first_task = scan_task
+        if self.watch is True:
+            PythonOperator(
+                dag=self,
+                task_id=self.WATCH_TASK_ID,
+                python_callable=self._do_watch_directory,
+                provide_context=True,
+            ) >> first_task
 
     def get_task_id(self, kwargs):
         """returns task id string for given kwargs list"""
@@ -139,6 +279,7 @@ class IngestDirectoryDAG(DAG):
                 etl_load_args
             ],
             python_callable=self._do_load_directory,
+            provide_context=True,
         )
 
     def add_ingest_file(self, task_id, etl_load_args):
@@ -155,7 +296,70 @@ class IngestDirectoryDAG(DAG):
             python_callable=self._do_load_file,
         )
 
-    def _do_load_directory(self, load_kwargs):
+    def _do_scan_directory(self, **kwargs):
+        """
+        lists the directory once & returns {task_id: [relpath, ...]} of the
+        files matching each scanned load's load_format. Each file goes to
+        the load w/ the most specific format only.
+        """
+        relpaths = scan_directory(self.directory_path)
+        classified = get_index(self.scanned_loads).classify(relpaths)
+        print("{} files found in '{}':".format(
+            len(relpaths), self.directory_path
+        ))
+        for task_id, task_relpaths in classified.items():
+            print("\t{}: {}".format(task_id, len(task_relpaths)))
+        # a load_format not matching the files shows up here
+        print("\tmatching no load_format: {}".format(
+            len(relpaths) - sum(map(len, classified.values()))
+        ))
+        return classified
+
+    def _do_watch_directory(self, **kwargs):
+        """
+        waits for files to be completed in the directory; returns their
+        relpaths & when the wait ended. Returns right away on the first run
+        or if files changed since the previous run stopped watching.
+        """
+        watcher = open_watcher(
+            self.directory_path, self.poll_interval.total_seconds()
+        )
+        try:
+            prev = kwargs['ti'].xcom_pull(
+                task_ids=self.WATCH_TASK_ID, include_prior_dates=True
+            )
+            completed = []
+            timeout = self.watch_timeout.total_seconds()
+            changed_at = []
+            if prev is not None:
+                changed_at = changed_since(
+                    self.directory_path,
+                    prev['stopped_at'] - self.settle_time.total_seconds() - 1
+                ).values()
+            if len(changed_at) > 0:
+                # files still settling in the last run are due in settle_time
+                timeout = min(timeout, self.settle_time.total_seconds())
+            if prev is None:
+                print("no previous watch; scanning whole directory.")
+            elif any(t >= prev['stopped_at'] - 1 for t in changed_at):
+                print("files changed since the last watch; not waiting.")
+            else:
+                print("waiting up to {}s for files in '{}' using {}...".format(
+                    timeout, self.directory_path, type(watcher).__name__
+                ))
+                completed = wait_for_files(
+                    watcher,
+                    timeout=timeout,
+                    coalesce_seconds=self.coalesce_time.total_seconds(),
+                )
+                if watcher.overflowed:
+                    print("events were lost; scanning whole directory.")
+        finally:
+            watcher.close()
+        print("{} files completed.".format(len(completed)))
+        return {'completed': completed, 'stopped_at': time.time()}
+
+    def _do_load_directory(self, load_kwargs, **kwargs):
         """
         a lot like running:
 
@@ -169,22 +373,77 @@ class IngestDirectoryDAG(DAG):
         '
         """
         print("loading output files into IMaRS data warehouse...")
-        to_load = imars_etl.find(
-            self.directory_path,
-            **load_kwargs
-        )
-        results = []
-        for filepath in to_load:
-            # TODO: try/except?
-            results.append(
-                imars_etl.load(filepath=filepath, **load_kwargs)
+        task_id = kwargs['task'].task_id
+        if task_id in self.scanned_loads:
+            to_load = [
+                os.path.join(self.directory_path, relpath)
+                for relpath in kwargs['ti'].xcom_pull(
+                    task_ids=self.SCAN_TASK_ID
+                )[task_id]
+            ]
+        else:
+            to_load = imars_etl.find(
+                self.directory_path,
+                **load_kwargs
+            )
+        settled = set()  # files known to be completely written
+        if self.watch is True:
+            settled = set(
+                os.path.join(self.directory_path, relpath)
+                for relpath in kwargs['ti'].xcom_pull(
+                    task_ids=self.WATCH_TASK_ID
+                )['completed']
+            )
+        manifest = None
+        if self.manifest_path is not None:
+            manifest = IngestManifest(
+                self.manifest_path, self.settle_time.total_seconds()
             )
+            manifest_key = "{}.{}".format(self.dag_id, task_id)
+            new, n_unchanged, unsettled = manifest.filter_new(
+                manifest_key, to_load, settled
+            )
+            print(
+                "{} files already loaded, {} still being written, {} new."
+                .format(n_unchanged, len(unsettled), len(new))
+            )
+            to_load = list(new)
+
+        def on_loaded(filepath):
+            if manifest is not None:
+                manifest.mark_loaded(manifest_key, filepath, *new[filepath])
             if self.rm_loaded is True:
-                print("trashing '{}'".format(filepath))
-                shutil.move(
-                    filepath,
-                    '/srv/imars-objects/trash/' + filepath.replace('/', '.-')
-                )
+                self._trash(filepath)
+
+        if self.bulk is True and supports_bulk(load_kwargs):
+            summary = bulk_load(
+                to_load, load_kwargs, directory=self.directory_path,
+                on_loaded=on_loaded
+            )
+        else:
+            _, summary = parallel_load(
+                to_load,
+                lambda filepath: imars_etl.load(
+                    filepath=filepath, **load_kwargs
+                ),
+                max_workers=self.max_workers,
+                per_mount=self.per_mount_workers,
+                bytes_per_s=self.bytes_per_s,
+                on_loaded=on_loaded,
+            )
+        if summary['n_failed'] > 0:
+            raise RuntimeError("{} of {} files failed to load".format(
+                summary['n_failed'], len(to_load)
+            ))
         # TODO: marks skipped unless something
         #           gets uploaded by using imars-etl python API directly.
-        return results
+        # a summary (not every load result) so XComs stay small
+        return summary
+
+    @staticmethod
+    def _trash(filepath):
+        print("trashing '{}'".format(filepath))
+        shutil.move(
+            filepath,
+            '/srv/imars-objects/trash/' + filepath.replace('/', '.-')
+        )
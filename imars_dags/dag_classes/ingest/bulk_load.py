@@ -0,0 +1,213 @@
+"""
+Bulk ingest of files whose metadata can be parsed from their paths.
+
+Instead of one `imars_etl.load` (connection, metadata parse & INSERT) per
+file, the `file` rows of a batch are parsed here using the load's
+`load_format` (see patterns.py) & written w/ one multi-row INSERT per
+batch over a single connection.
+
+Only loads that leave files in place (`object_store: 'no_upload'`), have
+a `load_format` & pass their metadata as plain kwargs (not in an `sql`
+string, which only imars_etl parses) can be bulk loaded (see
+supports_bulk); others must go through `imars_etl.load`.
+"""
+import os
+import time
+
+from imars_dags.dag_classes.ingest.patterns import PatternIndex
+from imars_dags.util import registry
+
+METADATA_CONN_ID = 'imars_metadata'
+# `file` columns written, in order
+BULK_COLS = [
+    'filepath', 'date_time', 'product_id', 'area_id', 'status_id',
+    'n_bytes', 'provenance',
+]
+
+
+def _get_metadata_conn():
+    # imported here so rows can be parsed & tested w/o airflow configured
+    from airflow.hooks.mysql_hook import MySqlHook
+    return MySqlHook(mysql_conn_id=METADATA_CONN_ID).get_conn()
+
+
+def supports_bulk(load_kwargs):
+    return (
+        load_kwargs.get('load_format') is not None and
+        load_kwargs.get('object_store') == 'no_upload' and
+        load_kwargs.get('sql') is None and
+        not load_kwargs.get('dry_run', False)
+    )
+
+
+class FileRowParser(object):
+    """parses `file` rows for the files of one load"""
+    def __init__(self, load_kwargs, directory=""):
+        self.directory = directory
+        self.values = dict(load_kwargs)
+        self.index = PatternIndex({
+            None: (load_kwargs['load_format'], self.values)
+        })
+
+    def get_row(self, filepath):
+        """returns `file` row dict for filepath; raises ValueError"""
+        found = self.index.match(os.path.relpath(filepath, self.directory))
+        if found is None:
+            raise ValueError("path does not match load_format")
+        _, date_time, fields = found
+        values = dict(self.values)
+        values.update(fields)
+        # explicit load kwargs take precedence over the path, as in imars_etl
+        values['date_time'] = values.get('date_time') or date_time
+        if values['date_time'] is None:
+            raise ValueError("no date_time in path or load kwargs")
+        if values.get('area_id') is None and \
+                values.get('area_short_name') is not None:
+            values['area_id'] = registry.id_lookup(
+                values['area_short_name'], 'area'
+            )
+        values['filepath'] = filepath
+        values['n_bytes'] = os.path.getsize(filepath)
+        return {col: values.get(col) for col in BULK_COLS}
+
+
+def _insert_sql(n_rows, skip_duplicates=False):
+    """
+    returns multi-row `INSERT INTO file` sql for n_rows rows.
+    W/ skip_duplicates rows clashing w/ a unique key are left as they are
+    (w/ 0 rows affected) by a no-op update. Unlike `INSERT IGNORE` that
+    does not turn truncation, bad date & NOT NULL errors into warnings.
+    """
+    return "INSERT INTO file ({}) VALUES {}{}".format(
+        ",".join(BULK_COLS),
+        ",".join(
+            ["({})".format(",".join(["%s"] * len(BULK_COLS)))] * n_rows
+        ),
+        " ON DUPLICATE KEY UPDATE id=id" if skip_duplicates else ""
+    )
+
+
+def _insert_batch(conn, rows, duplicates_ok):
+    """
+    inserts rows not already in the db.
+    returns (number of rows already in the db, filepaths that failed).
+
+    Rows clashing w/ a unique key of the `file` table (eg: same product,
+    date_time & area as a file already loaded) are skipped w/
+    `duplicates_ok` & fail otherwise. If any row cannot be inserted the
+    batch is retried row by row so only the rows w/ errors fail.
+    """
+    filepaths = [row['filepath'] for row in rows]
+    failed = []
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT filepath FROM file WHERE filepath IN ({})".format(
+                ",".join(["%s"] * len(filepaths))
+            ),
+            filepaths
+        )
+        existing = set(row[0] for row in cursor.fetchall())
+        if len(existing) > 0 and not duplicates_ok:
+            raise ValueError("files already in metadata db: {}".format(
+                sorted(existing)
+            ))
+        new_rows = [row for row in rows if row['filepath'] not in existing]
+        n_duplicates = len(existing)
+        if len(new_rows) > 0:
+            # rowcount counts inserted rows only (w/o CLIENT_FOUND_ROWS)
+            try:
+                cursor.execute(
+                    _insert_sql(len(new_rows), duplicates_ok),
+                    [row[col] for row in new_rows for col in BULK_COLS]
+                )
+                n_duplicates += len(new_rows) - cursor.rowcount
+            except conn.DatabaseError:
+                conn.rollback()
+                for row in new_rows:
+                    try:
+                        cursor.execute(
+                            _insert_sql(1, duplicates_ok),
+                            [row[col] for col in BULK_COLS]
+                        )
+                        n_duplicates += 1 - cursor.rowcount
+                    except conn.DatabaseError as err:
+                        print("cannot insert {}:\n\t{}".format(
+                            row['filepath'], err
+                        ))
+                        failed.append(row['filepath'])
+        conn.commit()
+    finally:
+        cursor.close()
+    return n_duplicates, failed
+
+
+def bulk_load(
+    filepaths, load_kwargs, directory="", get_conn=_get_metadata_conn,
+    batch_size=500, on_loaded=None
+):
+    """
+    parses & inserts `file` rows for filepaths in batches.
+
+    parameters:
+    -----------
+    load_kwargs : dict
+        imars_etl.load kwargs of the load (see supports_bulk).
+    directory : str
+        ingest directory; load_formats are matched against paths
+        relative to it.
+    batch_size : int
+        max rows per INSERT.
+    on_loaded : function
+        called w/ each filepath inserted or (w/ `duplicates_ok`) already
+        in the db. Not called for rows that failed.
+
+    returns
+    -------
+    dict summarizing the load.
+    """
+    t_start = time.monotonic()
+    parser = FileRowParser(load_kwargs, directory)
+    duplicates_ok = load_kwargs.get('duplicates_ok', False)
+    rows = []
+    failed = []
+    for filepath in filepaths:
+        try:
+            rows.append(parser.get_row(filepath))
+        except (ValueError, OSError, KeyError) as err:
+            print("cannot parse metadata of {}:\n\t{}".format(filepath, err))
+            failed.append(filepath)
+    n_inserted = 0
+    n_duplicates = 0
+    conn = get_conn()
+    try:
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            n_batch_duplicates, batch_failed = _insert_batch(
+                conn, batch, duplicates_ok
+            )
+            n_inserted += len(batch) - n_batch_duplicates - len(batch_failed)
+            n_duplicates += n_batch_duplicates
+            failed.extend(batch_failed)
+            if on_loaded is not None:
+                for row in batch:
+                    if row['filepath'] not in batch_failed:
+                        on_loaded(row['filepath'])
+    finally:
+        conn.close()
+    seconds = time.monotonic() - t_start
+    summary = {
+        'n_files': n_inserted,
+        'n_duplicates': n_duplicates,
+        'n_failed': len(failed),
+        'failed': failed[:10],
+        'n_bytes': sum(row['n_bytes'] for row in rows),
+        'seconds': seconds,
+        'files_per_s': len(rows) / max(seconds, 1e-6),
+    }
+    print(
+        "{n_files} files inserted, {n_duplicates} already loaded, "
+        "{n_failed} failed in {seconds:.1f}s ({files_per_s:.1f} files/s)."
+        .format(**summary)
+    )
+    return summary
@@ -0,0 +1,165 @@
+# std modules:
+from datetime import datetime
+import os
+import tempfile
+
+from imars_dags.dag_classes.ingest.bulk_load import bulk_load
+from imars_dags.dag_classes.ingest.bulk_load import FileRowParser
+from imars_dags.dag_classes.ingest.bulk_load import supports_bulk
+from imars_dags.util.testing import MetadataDBTestCase
+
+LOAD_KWARGS = {
+    'product_id': 36,
+    'area_id': 12,
+    'provenance': "bulk_test",
+    'load_format': "S3{sat_id}_%Y%m%dT%H%M%S_{orbit:03d}.zip",
+    'status_id': 3,
+    'object_store': 'no_upload',
+    'duplicates_ok': True,
+}
+
+
+class Test_bulk_load(MetadataDBTestCase):
+    def setUp(self):
+        super(Test_bulk_load, self).setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        # like the unique key of the metadata db's `file` table
+        self.conn.cursor().execute(
+            "CREATE UNIQUE INDEX file_key ON file "
+            "(product_id, date_time, area_id)"
+        )
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        super(Test_bulk_load, self).tearDown()
+
+    def write(self, name, content="data"):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "w") as f_obj:
+            f_obj.write(content)
+        return path
+
+    def select_files(self):
+        return self.select(
+            "SELECT filepath, product_id, area_id, status_id, n_bytes, "
+            "provenance FROM file ORDER BY filepath"
+        )
+
+    def test_supports_bulk(self):
+        self.assertTrue(supports_bulk(LOAD_KWARGS))
+        self.assertFalse(supports_bulk(dict(LOAD_KWARGS, object_store=None)))
+        self.assertFalse(supports_bulk(dict(LOAD_KWARGS, load_format=None)))
+        # only imars_etl parses `sql`
+        self.assertFalse(supports_bulk(dict(
+            LOAD_KWARGS, sql='product_id=36 AND area_id=12'
+        )))
+
+    def test_get_row(self):
+        """ fields come from the path & load kwargs """
+        path = self.write("S3A_20191130T153045_011.zip")
+        row = FileRowParser(LOAD_KWARGS, self.tmpdir.name).get_row(path)
+        self.assertEqual(row, {
+            'filepath': path,
+            'date_time': datetime(2019, 11, 30, 15, 30, 45),
+            'product_id': 36,
+            'area_id': 12,
+            'status_id': 3,
+            'n_bytes': 4,
+            'provenance': "bulk_test",
+        })
+
+    def test_batches_skip_duplicates(self):
+        """ rows are inserted in batches over one connection """
+        paths = [
+            self.write("S3A_20191130T1530{:02d}_011.zip".format(i))
+            for i in range(5)
+        ]
+        loaded = []
+        summary = bulk_load(
+            paths[:2], LOAD_KWARGS, self.tmpdir.name,
+            get_conn=self.get_conn, batch_size=2, on_loaded=loaded.append
+        )
+        self.assertEqual(summary['n_files'], 2)
+        summary = bulk_load(
+            paths, LOAD_KWARGS, self.tmpdir.name,
+            get_conn=self.get_conn, batch_size=2, on_loaded=loaded.append
+        )
+        self.assertEqual(self.n_conns, 2)
+        self.assertEqual(
+            (summary['n_files'], summary['n_duplicates']), (3, 2)
+        )
+        self.assertEqual(loaded, paths[:2] + paths)
+        rows = self.select_files()
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0], (paths[0], 36, 12, 3, 4, "bulk_test"))
+
+    def test_duplicates_not_ok(self):
+        path = self.write("S3A_20191130T153045_011.zip")
+        bulk_load([path], LOAD_KWARGS, self.tmpdir.name, self.get_conn)
+        with self.assertRaises(ValueError):
+            bulk_load(
+                [path], dict(LOAD_KWARGS, duplicates_ok=False),
+                self.tmpdir.name, self.get_conn
+            )
+
+    def test_unparseable_paths_fail(self):
+        good = self.write("S3A_20191130T153045_011.zip")
+        bad = self.write("notes.txt")
+        loaded = []
+        summary = bulk_load(
+            [good, bad], LOAD_KWARGS, self.tmpdir.name, self.get_conn,
+            on_loaded=loaded.append
+        )
+        self.assertEqual((summary['n_files'], summary['n_failed']), (1, 1))
+        self.assertEqual(summary['failed'], [bad])
+        self.assertEqual(loaded, [good])
+
+    def test_unique_key_clashes(self):
+        """ rows clashing w/ a loaded file are skipped or fail """
+        first = self.write("S3A_20191130T153045_011.zip")
+        bulk_load([first], LOAD_KWARGS, self.tmpdir.name, self.get_conn)
+        # same product, date_time & area; different path
+        os.mkdir(os.path.join(self.tmpdir.name, "copy"))
+        clash = self.write("copy/S3A_20191130T153045_011.zip")
+        new = self.write("S3A_20191130T153046_011.zip")
+        loaded = []
+        summary = bulk_load(
+            [clash, new], LOAD_KWARGS, self.tmpdir.name, self.get_conn,
+            on_loaded=loaded.append
+        )
+        self.assertEqual(
+            (summary['n_files'], summary['n_duplicates']), (1, 1)
+        )
+        self.assertEqual(loaded, [clash, new])
+        newer = self.write("S3A_20191130T153047_011.zip")
+        summary = bulk_load(
+            [clash, newer], dict(LOAD_KWARGS, duplicates_ok=False),
+            self.tmpdir.name, self.get_conn, on_loaded=loaded.append
+        )
+        self.assertEqual((summary['n_files'], summary['failed']), (1, [clash]))
+        self.assertEqual(loaded[2:], [newer])
+        self.assertEqual(
+            [row[0] for row in self.select_files()], [first, new, newer]
+        )
+
+    def test_bad_rows_fail(self):
+        """ rows w/ errors other than a duplicate key fail & are not loaded """
+        # like MySQL rejecting a bad date_time in strict mode
+        self.conn.cursor().execute(
+            "CREATE TRIGGER bad_date BEFORE INSERT ON file "
+            "WHEN NEW.date_time LIKE '%15:30:46%' "
+            "BEGIN SELECT RAISE(ABORT, 'incorrect datetime value'); END"
+        )
+        good = self.write("S3A_20191130T153045_011.zip")
+        bad = self.write("S3A_20191130T153046_011.zip")
+        loaded = []
+        summary = bulk_load(
+            [good, bad], LOAD_KWARGS, self.tmpdir.name, self.get_conn,
+            on_loaded=loaded.append
+        )
+        self.assertEqual(
+            (summary['n_files'], summary['n_duplicates'], summary['failed']),
+            (1, 0, [bad])
+        )
+        self.assertEqual(loaded, [good])
+        self.assertEqual([row[0] for row in self.select_files()], [good])
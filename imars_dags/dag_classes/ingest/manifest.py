@@ -0,0 +1,142 @@
+"""
+sqlite-backed manifest of files already loaded by an ingest task so that
+later runs only load new or changed files instead of re-attempting every
+file & relying on `duplicates_ok` to make the repeats harmless.
+
+Files are keyed by (path, size, mtime). A file is only loaded once it has
+settled: its size & mtime were unchanged across scans at least
+`settle_seconds` apart, or its mtime is older than that (eg: the backlog
+found by the first scan). Files still being written are left for a later
+run.
+
+The manifest must be on a local disk: sqlite's file locking is not
+reliable on NFS & other network filesystems, so a manifest shared that
+way can be corrupted by concurrent writers. A manifest on one worker's
+disk only knows the files loaded by that worker, so the tasks using it
+must all run on that one worker (eg: a queue only it serves); otherwise
+each file is loaded again by every other worker that runs the task.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_MANIFEST_PATH = os.path.expanduser(
+    "~/.cache/imars_dags/ingest_manifest.db"
+)
+
+
+class IngestManifest(object):
+    """
+    Usage:
+    ```
+    manifest = IngestManifest()
+    new, n_unchanged, unsettled = manifest.filter_new(key, filepaths)
+    for filepath, (size, mtime_ns) in new.items():
+        load(filepath)
+        manifest.mark_loaded(key, filepath, size, mtime_ns)
+    ```
+    `key` names the load (eg: "{dag_id}.{task_id}"); each key has its own
+    entries. Safe to share between threads.
+    """
+    def __init__(
+        self, db_path=DEFAULT_MANIFEST_PATH, settle_seconds=300,
+        clock=time.time
+    ):
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.settle_seconds = settle_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS loaded ("
+            "key TEXT, path TEXT, size INTEGER, mtime_ns INTEGER, "
+            "loaded_at REAL, PRIMARY KEY (key, path));"
+            # size & mtime of files not yet loaded when first seen as such
+            "CREATE TABLE IF NOT EXISTS seen ("
+            "key TEXT, path TEXT, size INTEGER, mtime_ns INTEGER, "
+            "first_seen REAL, PRIMARY KEY (key, path));"
+        )
+        self._conn.commit()
+
+    def _select(self, table, key):
+        return {
+            row[0]: tuple(row[1:])
+            for row in self._conn.execute(
+                "SELECT path, size, mtime_ns{} FROM {} WHERE key=?".format(
+                    ", first_seen" if table == "seen" else "", table
+                ),
+                (key,)
+            )
+        }
+
+    def filter_new(self, key, filepaths, settled=()):
+        """
+        returns (new, n_unchanged, unsettled) for the given files.
+        Files in `settled` are known to be complete (eg: from close-write
+        events, see watch.py) & are not held back.
+
+        * new : {filepath: (size, mtime_ns)} of settled files not loaded
+            at their current size & mtime.
+        * n_unchanged : number of files already loaded & unchanged since.
+        * unsettled : filepaths that may still be being written.
+
+        Entries of files no longer listed are forgotten.
+        """
+        now = self.clock()
+        with self._lock:
+            loaded = self._select("loaded", key)
+            seen = self._select("seen", key)
+        new = {}
+        n_unchanged = 0
+        unsettled = []
+        seen_updates = []
+        for filepath in filepaths:
+            try:
+                f_stat = os.stat(filepath)
+            except OSError as os_err:
+                print(os_err)  # removed since listed
+                continue
+            signature = (f_stat.st_size, f_stat.st_mtime_ns)
+            if loaded.get(filepath) == signature:
+                n_unchanged += 1
+                continue
+            first_seen = now
+            if seen.get(filepath, ())[:2] == signature:
+                first_seen = seen[filepath][2]
+            else:
+                seen_updates.append((key, filepath) + signature + (now,))
+            if (
+                filepath in settled or
+                now - first_seen >= self.settle_seconds or
+                now - f_stat.st_mtime >= self.settle_seconds
+            ):
+                new[filepath] = signature
+            else:
+                unsettled.append(filepath)
+        gone = set(loaded).union(seen).difference(filepaths)
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO seen VALUES (?,?,?,?,?)",
+                seen_updates
+            )
+            for table in ["loaded", "seen"]:
+                self._conn.executemany(
+                    "DELETE FROM {} WHERE key=? AND path=?".format(table),
+                    [(key, filepath) for filepath in gone]
+                )
+            self._conn.commit()
+        return new, n_unchanged, unsettled
+
+    def mark_loaded(self, key, filepath, size, mtime_ns):
+        """records that filepath was loaded at given size & mtime"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO loaded VALUES (?,?,?,?,?)",
+                (key, filepath, size, mtime_ns, self.clock())
+            )
+            self._conn.execute(
+                "DELETE FROM seen WHERE key=? AND path=?", (key, filepath)
+            )
+            self._conn.commit()
@@ -0,0 +1,97 @@
+# std modules:
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from imars_dags.dag_classes.ingest.manifest import IngestManifest
+from imars_dags.util.testing import FakeClock
+
+
+class Test_IngestManifest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.clock = FakeClock(time.time())
+        self.manifest = IngestManifest(
+            ":memory:", settle_seconds=60, clock=self.clock
+        )
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, name, content, age=0):
+        """writes file w/ mtime `age` seconds before the fake clock"""
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "w") as f_obj:
+            f_obj.write(content)
+        mtime = self.clock.now - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def load_all(self, key, paths, settled=()):
+        new, n_unchanged, unsettled = self.manifest.filter_new(
+            key, paths, settled
+        )
+        for path, (size, mtime_ns) in new.items():
+            self.manifest.mark_loaded(key, path, size, mtime_ns)
+        return new, n_unchanged, unsettled
+
+    def test_loaded_files_are_skipped(self):
+        """ only new or changed files are returned on later runs """
+        old = self.write("old.png", "a", age=3600)
+        new, n_unchanged, unsettled = self.load_all("dag.task", [old])
+        self.assertEqual(list(new), [old])
+        self.assertEqual((n_unchanged, unsettled), (0, []))
+
+        new, n_unchanged, _ = self.load_all("dag.task", [old])
+        self.assertEqual((new, n_unchanged), ({}, 1))
+
+        self.write("old.png", "changed", age=3600)
+        new, n_unchanged, _ = self.load_all("dag.task", [old])
+        self.assertEqual((list(new), n_unchanged), ([old], 0))
+
+    def test_keys_are_separate(self):
+        old = self.write("old.png", "a", age=3600)
+        self.load_all("dag.task_a", [old])
+        new, _, _ = self.load_all("dag.task_b", [old])
+        self.assertEqual(list(new), [old])
+
+    def test_growing_file_waits_until_settled(self):
+        """ a file is loaded once unchanged across scans settle apart """
+        path = self.write("growing.png", "a")
+        new, _, unsettled = self.load_all("k", [path])
+        self.assertEqual((new, unsettled), ({}, [path]))
+
+        self.clock.now += 30
+        self.write("growing.png", "ab", age=0)
+        new, _, unsettled = self.load_all("k", [path])
+        self.assertEqual((new, unsettled), ({}, [path]))
+
+        self.clock.now += 30  # unchanged, but only for 30s
+        new, _, unsettled = self.load_all("k", [path])
+        self.assertEqual(unsettled, [path])
+
+        self.clock.now += 31  # unchanged for 61s
+        new, _, unsettled = self.load_all("k", [path])
+        self.assertEqual((list(new), unsettled), ([path], []))
+
+    def test_unchanged_across_scans_settles(self):
+        """ size & mtime stable for settle_seconds of scans is enough """
+        path = self.write("future.png", "a", age=-600)  # clock skew
+        self.assertEqual(self.load_all("k", [path])[2], [path])
+        self.clock.now += 61
+        new, _, _ = self.load_all("k", [path])
+        self.assertEqual(list(new), [path])
+
+    def test_missing_files_are_forgotten(self):
+        old = self.write("old.png", "a", age=3600)
+        self.load_all("k", [old])
+        self.load_all("k", [])
+        new, _, _ = self.load_all("k", [old])
+        self.assertEqual(list(new), [old])
+
+    def test_settled_files_are_not_held_back(self):
+        """ files known to be complete skip the settle wait """
+        path = self.write("closed.png", "a")
+        new, _, unsettled = self.load_all("k", [path], settled={path})
+        self.assertEqual((list(new), unsettled), ([path], []))
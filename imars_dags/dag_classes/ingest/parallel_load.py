@@ -0,0 +1,187 @@
+"""
+Loads files on a bounded thread pool while limiting the load put on file
+servers:
+
+* at most `per_mount` files are loaded at once from each mounted filesystem
+    (eg: each NFS export), on top of the `max_workers` overall limit.
+* a `bytes_per_s` budget shared by all workers paces the start of each load
+    by the size of the file, so the average read rate stays under the cap.
+
+Usage:
+```
+results, summary = parallel_load(
+    filepaths, lambda fpath: imars_etl.load(filepath=fpath, **kwargs),
+    max_workers=8, per_mount=2, bytes_per_s=50e6
+)
+```
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+
+
+def get_mount(path):
+    """returns the mount point of the filesystem path is on"""
+    path = os.path.realpath(path)
+    while not os.path.ismount(path):
+        path = os.path.dirname(path)
+    return path
+
+
+class RateLimiter(object):
+    """
+    Paces work to an average of `rate` units (eg: bytes) per second across
+    all threads. Each acquire reserves the next free slot, so a large file
+    delays the loads after it rather than being split.
+    """
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.clock = clock
+        self.sleep = sleep
+        self._next_free = None
+        self._lock = threading.Lock()
+
+    def acquire(self, amount):
+        """blocks until amount fits in the budget; returns seconds waited"""
+        with self._lock:
+            now = self.clock()
+            start = now if self._next_free is None else max(
+                now, self._next_free
+            )
+            self._next_free = start + amount / self.rate
+        wait = start - now
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+
+class MountLimiter(object):
+    """per-mount semaphores limiting concurrent loads from each filesystem"""
+    def __init__(self, per_mount, get_mount=get_mount):
+        """
+        parameters:
+        -----------
+        per_mount : int or dict
+            max concurrent loads per mount point, or {mount: max} w/ the
+            key None as the default for mounts not listed.
+        """
+        if not isinstance(per_mount, dict):
+            per_mount = {None: per_mount}
+        self.per_mount = per_mount
+        self.get_mount = get_mount
+        self._semaphores = {}  # mount -> BoundedSemaphore
+        self._lock = threading.Lock()
+
+    def get_semaphore(self, path):
+        mount = self.get_mount(path)
+        with self._lock:
+            if mount not in self._semaphores:
+                self._semaphores[mount] = threading.BoundedSemaphore(
+                    self.per_mount.get(mount, self.per_mount.get(None, 1))
+                )
+            return self._semaphores[mount]
+
+
+def _load_one(load, filepath, mount_limiter, rate_limiter):
+    """returns stats dict for the load of one file"""
+    try:
+        n_bytes = os.path.getsize(filepath)
+    except OSError:
+        n_bytes = 0  # let load report the problem
+    stats = {'filepath': filepath, 'n_bytes': n_bytes, 'error': None}
+    stats['wait_s'] = 0
+    # paced before taking the mount's slot so other loads from the mount
+    # are not held up while this one waits for its budget.
+    if rate_limiter is not None:
+        stats['wait_s'] = rate_limiter.acquire(n_bytes)
+    with mount_limiter.get_semaphore(filepath):
+        t_start = time.monotonic()
+        try:
+            stats['result'] = load(filepath)
+        except Exception as err:
+            stats['result'] = None
+            stats['error'] = err
+        stats['seconds'] = time.monotonic() - t_start
+    return stats
+
+
+def _format_rate(n_bytes, seconds):
+    return "{:.2f} MB/s".format(n_bytes / 1e6 / max(seconds, 1e-6))
+
+
+def parallel_load(
+    filepaths, load, max_workers=4, per_mount=2, bytes_per_s=None,
+    on_loaded=None, get_mount=get_mount
+):
+    """
+    loads files concurrently w/ per-mount & byte-rate limits.
+
+    parameters:
+    -----------
+    filepaths : list of str
+        files to load.
+    load : function
+        loads one filepath; its return value is kept as the file's result.
+    max_workers : int
+        max files loaded at once overall.
+    per_mount : int or dict
+        max files loaded at once per mount point (see MountLimiter).
+    bytes_per_s : float
+        average read budget (file sizes) for all workers. None is no limit.
+    on_loaded : function
+        called w/ each filepath loaded without error (eg: to remove it).
+
+    returns
+    -------
+    (results, summary): list of load results in the order of filepaths &
+    dict of aggregate throughput. Failed files are counted in the summary
+    & their results are None.
+    """
+    mount_limiter = MountLimiter(per_mount, get_mount)
+    rate_limiter = None
+    if bytes_per_s is not None:
+        rate_limiter = RateLimiter(bytes_per_s)
+    t_start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                _load_one, load, filepath, mount_limiter, rate_limiter
+            )
+            for filepath in filepaths
+        ]
+        all_stats = []
+        for future in futures:
+            stats = future.result()
+            if stats['error'] is None:
+                print("loaded {} ({} bytes in {:.2f}s, {})".format(
+                    stats['filepath'], stats['n_bytes'], stats['seconds'],
+                    _format_rate(stats['n_bytes'], stats['seconds'])
+                ))
+                if on_loaded is not None:
+                    on_loaded(stats['filepath'])
+            else:
+                print("failed to load {}:\n\t{}".format(
+                    stats['filepath'], stats['error']
+                ))
+            all_stats.append(stats)
+    seconds = time.monotonic() - t_start
+    loaded = [stats for stats in all_stats if stats['error'] is None]
+    summary = {
+        'n_files': len(loaded),
+        'n_failed': len(all_stats) - len(loaded),
+        'n_bytes': sum(stats['n_bytes'] for stats in loaded),
+        'seconds': seconds,
+        'files_per_s': len(loaded) / max(seconds, 1e-6),
+        'bytes_per_s': sum(
+            stats['n_bytes'] for stats in loaded
+        ) / max(seconds, 1e-6),
+        'rate_wait_s': sum(stats['wait_s'] for stats in all_stats),
+    }
+    print(
+        "{n_files} files ({n_bytes} bytes) loaded in {seconds:.1f}s: "
+        "{files_per_s:.2f} files/s, {mb_per_s:.2f} MB/s; "
+        "{n_failed} failed; {rate_wait_s:.1f}s waited for byte budget."
+        .format(mb_per_s=summary['bytes_per_s'] / 1e6, **summary)
+    )
+    return [stats['result'] for stats in all_stats], summary
@@ -0,0 +1,139 @@
+# std modules:
+import os
+import tempfile
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import Mock
+
+from imars_dags.dag_classes.ingest.parallel_load import _load_one
+from imars_dags.dag_classes.ingest.parallel_load import MountLimiter
+from imars_dags.dag_classes.ingest.parallel_load import parallel_load
+from imars_dags.dag_classes.ingest.parallel_load import RateLimiter
+from imars_dags.util.testing import FakeClock
+
+
+class Test_RateLimiter(TestCase):
+    def test_paces_by_amount(self):
+        """ each acquire waits until the previous amounts are paid for """
+        clock = FakeClock(advance_on_sleep=False)
+        limiter = RateLimiter(100, clock=clock, sleep=clock.sleep)
+        self.assertEqual(limiter.acquire(200), 0)  # first goes at once
+        self.assertEqual(limiter.acquire(50), 2)
+        self.assertEqual(limiter.acquire(50), 2.5)
+        clock.now = 10  # idle time is not saved up
+        self.assertEqual(limiter.acquire(100), 0)
+        self.assertEqual(clock.waits, [2, 2.5])
+
+
+class Test_MountLimiter(TestCase):
+    def test_limits_per_mount(self):
+        limiter = MountLimiter(
+            {None: 2, '/nfs': 1}, get_mount=lambda path: path.split("_")[0]
+        )
+        self.assertIs(
+            limiter.get_semaphore("/nfs_a"), limiter.get_semaphore("/nfs_b")
+        )
+        self.assertTrue(limiter.get_semaphore("/nfs_a").acquire(False))
+        self.assertFalse(limiter.get_semaphore("/nfs_b").acquire(False))
+        self.assertTrue(limiter.get_semaphore("/srv_a").acquire(False))
+        self.assertTrue(limiter.get_semaphore("/srv_b").acquire(False))
+        self.assertFalse(limiter.get_semaphore("/srv_c").acquire(False))
+
+
+class Test_parallel_load(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filepaths = []
+        for i in range(8):
+            mount = "a" if i % 2 == 0 else "b"
+            filepath = os.path.join(
+                self.tmpdir.name, "{}_{}.dat".format(mount, i)
+            )
+            with open(filepath, "wb") as f_obj:
+                f_obj.write(b"x" * 100)
+            self.filepaths.append(filepath)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @staticmethod
+    def get_mount(path):
+        return os.path.basename(path).split("_")[0]
+
+    def test_per_mount_concurrency(self):
+        """ no more than per_mount loads run at once on each mount """
+        running = {}
+        max_running = {}
+        lock = threading.Lock()
+
+        def load(filepath):
+            mount = self.get_mount(filepath)
+            with lock:
+                running[mount] = running.get(mount, 0) + 1
+                max_running[mount] = max(
+                    max_running.get(mount, 0), running[mount]
+                )
+            time.sleep(0.01)
+            with lock:
+                running[mount] -= 1
+            return os.path.basename(filepath)
+
+        loaded = []
+        results, summary = parallel_load(
+            self.filepaths, load, max_workers=8, per_mount=2,
+            on_loaded=loaded.append, get_mount=self.get_mount
+        )
+        self.assertEqual(max_running, {'a': 2, 'b': 2})
+        self.assertEqual(
+            results, [os.path.basename(fpath) for fpath in self.filepaths]
+        )
+        self.assertEqual(loaded, self.filepaths)
+        self.assertEqual(summary['n_files'], 8)
+        self.assertEqual(summary['n_bytes'], 800)
+        self.assertEqual(summary['n_failed'], 0)
+
+    def test_failures_do_not_stop_others(self):
+        """ failed files are counted & not passed to on_loaded """
+        def load(filepath):
+            if filepath.endswith("_3.dat"):
+                raise ValueError("bad file")
+            return True
+
+        loaded = []
+        results, summary = parallel_load(
+            self.filepaths, load, max_workers=4, on_loaded=loaded.append,
+            get_mount=self.get_mount
+        )
+        self.assertEqual(summary['n_failed'], 1)
+        self.assertEqual(summary['n_files'], 7)
+        self.assertIsNone(results[3])
+        self.assertNotIn(self.filepaths[3], loaded)
+
+    def test_byte_budget(self):
+        """ 800 bytes at 4000 bytes/s takes at least ~0.175s """
+        t_start = time.monotonic()
+        _, summary = parallel_load(
+            self.filepaths, lambda filepath: None, max_workers=8,
+            per_mount=8, bytes_per_s=4000, get_mount=self.get_mount
+        )
+        self.assertGreaterEqual(time.monotonic() - t_start, 0.17)
+        self.assertGreater(summary['rate_wait_s'], 0)
+
+    def test_rate_wait_does_not_hold_mount(self):
+        """ loads wait for the byte budget before taking a mount slot """
+        mount_limiter = MountLimiter(1, get_mount=self.get_mount)
+        semaphore = mount_limiter.get_semaphore(self.filepaths[0])
+        free_while_waiting = []
+
+        def acquire(n_bytes):
+            free_while_waiting.append(semaphore.acquire(False))
+            if free_while_waiting[-1]:
+                semaphore.release()
+            return 0
+
+        _load_one(
+            lambda fpath: True, self.filepaths[0], mount_limiter,
+            Mock(acquire=acquire)
+        )
+        self.assertEqual(free_while_waiting, [True])
@@ -0,0 +1,251 @@
+"""
+Filename patterns of ingested products.
+
+A `load_format` (as passed to `imars_etl.load`) is a path template mixing
+strftime directives & `{field}`s w/ optional format specs, eg:
+`"S3{sat_id}_OL_1_EFR____%Y%m%dT%H%M%S_{end_date:08d}T{end_t:06d}.zip"`.
+Here it is compiled to a regex so files can be matched against it without
+asking imars_etl.
+
+PatternIndex compiles the load_formats of many products into one matcher:
+formats are placed in a prefix trie by their literal prefix & the formats
+sharing a trie node are joined into one regex union, so each file is
+classified (& its date_time & fields extracted) in a single pass no matter
+how many products are registered.
+"""
+from datetime import datetime
+import re
+
+# strftime directive -> regex
+STRFTIME_REGEXES = {
+    'Y': r"\d{4}",
+    'y': r"\d{2}",
+    'm': r"\d{2}",
+    'd': r"\d{2}",
+    'j': r"\d{3}",
+    'H': r"\d{2}",
+    'M': r"\d{2}",
+    'S': r"\d{2}",
+    'f': r"\d{1,6}",
+    '%': "%",
+}
+_TOKEN_RE = re.compile(r"%(.)|\{(\w+)(?::([^}]*))?\}")
+_INT_SPEC_RE = re.compile(r"0?(\d*)d")
+
+
+def _tokens(load_format):
+    """yields (literal, directive, field, spec) parts of a load_format"""
+    pos = 0
+    for token in _TOKEN_RE.finditer(load_format):
+        directive, field, spec = token.groups()
+        yield load_format[pos:token.start()], directive, field, spec
+        pos = token.end()
+    yield load_format[pos:], None, None, None
+
+
+def _field_regex(spec):
+    int_spec = _INT_SPEC_RE.fullmatch(spec or "")
+    if int_spec is None:
+        return r"[^/]+?"
+    width = int_spec.group(1)
+    return r"\d{%s}" % width if width else r"\d+"
+
+
+def load_format_to_regex(load_format, fields=None, group_prefix=None):
+    """
+    returns regex source matching paths of given load_format.
+
+    parameters:
+    -----------
+    fields : dict
+        known field values (eg: the load's `product_type_name`) that are
+        matched literally. Other fields match any text within a path
+        segment (or digits for `d` format specs).
+    group_prefix : str
+        if given, strftime directives & unknown fields are captured in
+        named groups `{group_prefix}d_{directive}` & `{group_prefix}f_{field}`.
+    """
+    fields = fields or {}
+    parts = []
+    groups = set()
+    for literal, directive, field, spec in _tokens(load_format):
+        parts.append(re.escape(literal))
+        if directive is not None:
+            if directive not in STRFTIME_REGEXES:
+                raise ValueError("unsupported strftime directive %{}".format(
+                    directive
+                ))
+            regex = STRFTIME_REGEXES[directive]
+            name = "{}d_{}".format(group_prefix, directive)
+            if directive == '%':
+                name = None
+        elif field is not None and field in fields:
+            regex = re.escape(format(fields[field], spec or ""))
+            name = None
+        elif field is not None:
+            regex = _field_regex(spec)
+            name = "{}f_{}".format(group_prefix, field)
+        else:
+            continue
+        if group_prefix is None or name is None:
+            parts.append(regex)
+        elif name in groups:  # repeated: must match the same text
+            parts.append("(?P={})".format(name))
+        else:
+            groups.add(name)
+            parts.append("(?P<{}>{})".format(name, regex))
+    return "".join(parts)
+
+
+def literal_prefix(load_format, fields=None):
+    """returns the fixed text every path matching load_format starts with"""
+    fields = fields or {}
+    prefix = ""
+    for literal, directive, field, spec in _tokens(load_format):
+        prefix += literal
+        if directive == '%':
+            prefix += "%"
+        elif field is not None and field in fields:
+            prefix += format(fields[field], spec or "")
+        elif directive is not None or field is not None:
+            break
+    return prefix
+
+
+class _TrieNode(object):
+    def __init__(self):
+        self.children = {}  # char -> _TrieNode
+        self.entries = []  # (n, key, load_format, fields) ending here
+        self.regex = None  # union of the entries' regexes
+
+    def compile(self):
+        self.regex = re.compile("|".join(
+            "(?P<k{n}>{regex})".format(
+                n=n, regex=load_format_to_regex(
+                    load_format, fields, group_prefix="k{}".format(n)
+                )
+            )
+            for n, _, load_format, fields in self.entries
+        ))
+        for child in self.children.values():
+            child.compile()
+
+
+class PatternIndex(object):
+    """
+    Usage:
+    ```
+    index = PatternIndex({
+        36: ("S3A_OL_1_EFR____%Y%m%dT%H%M%S_{rest}.zip", {}),
+        52: ("S3B_OL_1_EFR____%Y%m%dT%H%M%S_{rest}.zip", {}),
+    })
+    key, date_time, fields = index.match(relpath)
+    ```
+    Each path matches at most one key: the one w/ the longest literal
+    prefix, then the first given.
+    """
+    def __init__(self, load_formats):
+        """
+        parameters:
+        -----------
+        load_formats : dict
+            {key: (load_format, fields)}, where fields are the known field
+            values (see load_format_to_regex). Formats without a `/` are
+            matched against the basename only.
+        """
+        self._path_trie = _TrieNode()
+        self._name_trie = _TrieNode()
+        self._keys = {}  # n -> key
+        self._fields = {}  # n -> known fields
+        self._int_fields = {}  # n -> names of fields w/ `d` format specs
+        for n, (key, (load_format, fields)) in enumerate(
+            load_formats.items()
+        ):
+            fields = fields or {}
+            self._keys[n] = key
+            self._fields[n] = fields
+            self._int_fields[n] = set(
+                field for _, _, field, spec in _tokens(load_format)
+                if _INT_SPEC_RE.fullmatch(spec or "") is not None
+            )
+            node = self._path_trie if "/" in load_format else self._name_trie
+            for char in literal_prefix(load_format, fields):
+                node = node.children.setdefault(char, _TrieNode())
+            node.entries.append((n, key, load_format, fields))
+        self._path_trie.compile()
+        self._name_trie.compile()
+
+    @staticmethod
+    def _nodes_along(trie, text):
+        """returns trie nodes w/ entries on text's path, deepest first"""
+        nodes = []
+        node = trie
+        for char in text:
+            if len(node.entries) > 0:
+                nodes.append(node)
+            node = node.children.get(char)
+            if node is None:
+                break
+        else:
+            if len(node.entries) > 0:
+                nodes.append(node)
+        return reversed(nodes)
+
+    def _match_trie(self, trie, text):
+        for node in self._nodes_along(trie, text):
+            match = node.regex.fullmatch(text)
+            if match is not None:
+                return int(match.lastgroup[1:]), match
+        return None
+
+    def _find(self, relpath):
+        """returns (format n, regex match) for relpath or None"""
+        found = self._match_trie(self._path_trie, relpath)
+        if found is None:
+            found = self._match_trie(
+                self._name_trie, relpath.rsplit("/", 1)[-1]
+            )
+        return found
+
+    def match(self, relpath):
+        """
+        returns (key, date_time, fields) for a path relative to the ingest
+        directory, or None if no format matches. date_time is None if the
+        format has no date directives; fields includes the known fields.
+        """
+        found = self._find(relpath)
+        if found is None:
+            return None
+        n, match = found
+        fields = dict(self._fields[n])
+        dt_fmt = []
+        dt_values = []
+        prefix = "k{}".format(n)
+        for name, value in match.groupdict().items():
+            if value is None or not name.startswith(
+                (prefix + "d_", prefix + "f_")
+            ):
+                continue  # group of another format
+            kind, label = name[len(prefix)], name[len(prefix) + 2:]
+            if kind == "d":
+                dt_fmt.append("%" + label)
+                dt_values.append(value)
+            elif label in self._int_fields[n]:
+                fields[label] = int(value)
+            else:
+                fields[label] = value
+        date_time = None
+        if len(dt_fmt) > 0:
+            date_time = datetime.strptime(
+                " ".join(dt_values), " ".join(dt_fmt)
+            )
+        return self._keys[n], date_time, fields
+
+    def classify(self, relpaths):
+        """returns {key: [relpath, ...]} of the paths matching each key"""
+        classified = {key: [] for key in self._keys.values()}
+        for relpath in relpaths:
+            found = self._find(relpath)  # w/o extracting fields
+            if found is not None:
+                classified[self._keys[found[0]]].append(relpath)
+        return classified
@@ -0,0 +1,89 @@
+# std modules:
+from datetime import datetime
+from unittest import TestCase
+
+from imars_dags.dag_classes.ingest.patterns import literal_prefix
+from imars_dags.dag_classes.ingest.patterns import PatternIndex
+
+# from dags/ingest_s3/ingest_s3.sh
+S3_LOAD_FORMAT = (
+    "S3{sat_id}_OL_1_EFR____%Y%m%dT%H%M%S_{end_date:08d}T{end_t:06d}_"
+    "{ing_date:08d}T{ing_t:06d}_{duration:04d}_{cycle:03d}_{orbit:03d}_"
+    "{frame:04d}_{proc_location}_{platform}_{timeliness}_"
+    "{base_collection:03d}.zip"
+)
+S3_FILENAME = (
+    "S3A_OL_1_EFR____20191130T153045_20191130T153345_20191201T194001_"
+    "0179_052_011_2520_LN1_O_NT_002.zip"
+)
+
+
+class Test_literal_prefix(TestCase):
+    def test_literal_prefix(self):
+        self.assertEqual(literal_prefix(S3_LOAD_FORMAT), "S3")
+        self.assertEqual(
+            literal_prefix(S3_LOAD_FORMAT, {'sat_id': "A"}),
+            "S3A_OL_1_EFR____"
+        )
+        self.assertEqual(
+            literal_prefix("{n:03d}_%Y.png", {'n': 7}), "007_"
+        )
+
+
+class Test_PatternIndex(TestCase):
+    def test_classify_and_extract(self):
+        """ date_time & fields are extracted from the matching format """
+        index = PatternIndex({
+            36: (S3_LOAD_FORMAT, {'sat_id': "A"}),
+            52: (S3_LOAD_FORMAT, {'sat_id': "B"}),
+        })
+        key, date_time, fields = index.match("s3files/" + S3_FILENAME)
+        self.assertEqual(key, 36)
+        self.assertEqual(date_time, datetime(2019, 11, 30, 15, 30, 45))
+        self.assertEqual(fields['sat_id'], "A")
+        self.assertEqual(fields['orbit'], 11)
+        self.assertEqual(fields['proc_location'], "LN1")
+        self.assertEqual(
+            index.match(S3_FILENAME.replace("S3A", "S3B"))[0], 52
+        )
+        self.assertIsNone(index.match("S3C" + S3_FILENAME[3:]))
+        # `d` format specs set the number of digits
+        self.assertIsNone(index.match(S3_FILENAME.replace("0179", "179")))
+
+    def test_most_specific_prefix_wins(self):
+        index = PatternIndex({
+            'any': ("{name}_%Y%j.png", {}),
+            'chl': ("{name}_%Y%j.png", {'name': "chl"}),
+            'dir': ("png/{area}/{name}_%Y%j.png", {}),
+        })
+        self.assertEqual(index.match("chl_2018001.png")[0], 'chl')
+        self.assertEqual(
+            index.match("chl_2018032.png")[1], datetime(2018, 2, 1)
+        )
+        self.assertEqual(index.match("sst_2018001.png")[0], 'any')
+        self.assertEqual(
+            index.match("png/fgbnms/chl_2018001.png"),
+            ('dir', datetime(2018, 1, 1), {'area': "fgbnms", 'name': "chl"})
+        )
+        self.assertEqual(index.classify(
+            ["chl_2018001.png", "sst_2018001.png", "notes.txt"]
+        ), {
+            'any': ["sst_2018001.png"],
+            'chl': ["chl_2018001.png"],
+            'dir': [],
+        })
+
+    def test_many_products(self):
+        """ hundreds of formats each still match their own files """
+        index = PatternIndex({
+            product_id: (
+                "{product_type_name}_%Y%m%d.tif",
+                {'product_type_name': "prod{}".format(product_id)}
+            )
+            for product_id in range(500)
+        })
+        for product_id in [0, 1, 10, 499]:
+            self.assertEqual(
+                index.match("prod{}_20180101.tif".format(product_id))[0],
+                product_id
+            )
@@ -0,0 +1,42 @@
+"""
+One-pass scan of an ingest directory shared by all of its loads.
+
+The directory tree is walked once with `os.scandir` (entry types come from
+the directory listing, so files are not stat'ed) and each file is then
+classified against the filename patterns of every load, so the cost of
+walking the tree does not grow w/ the number of product types.
+
+get_index classifies each file into at most one load using one compiled
+matcher for all formats (see patterns.PatternIndex).
+"""
+import os
+
+from imars_dags.dag_classes.ingest.patterns import PatternIndex
+
+
+def scan_directory(directory):
+    """returns sorted paths (relative to directory) of all files under it"""
+    relpaths = []
+    to_scan = [""]
+    while len(to_scan) > 0:
+        reldir = to_scan.pop()
+        with os.scandir(os.path.join(directory, reldir)) as entries:
+            for entry in entries:
+                relpath = os.path.join(reldir, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    to_scan.append(relpath)
+                elif entry.is_file():
+                    relpaths.append(relpath)
+    return sorted(relpaths)
+
+
+def get_index(load_kwargs_by_key):
+    """
+    returns PatternIndex of the `load_format`s of given {key: load_kwargs}.
+    Other load_kwargs values fill in the formats' fields.
+    """
+    return PatternIndex({
+        key: (load_kwargs['load_format'], load_kwargs)
+        for key, load_kwargs in load_kwargs_by_key.items()
+        if load_kwargs.get('load_format') is not None
+    })
@@ -0,0 +1,70 @@
+# std modules:
+import os
+import tempfile
+from unittest import TestCase
+
+from imars_dags.dag_classes.ingest.scan import get_index
+from imars_dags.dag_classes.ingest.scan import scan_directory
+
+
+class Test_scan(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        for relpath in [
+            "a1km_chlor_a_7d_mean_png_20180101.png",
+            "a1km_chlor_a_7d_anom_png_20180101.png",
+            "sub/a1km_chlor_a_7d_mean_png_20180108.png",
+            "sub/deeper/notes.txt",
+        ]:
+            path = os.path.join(self.tmpdir.name, relpath)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "w").close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_scan_directory(self):
+        """ all files in the tree are listed relative to it """
+        self.assertEqual(scan_directory(self.tmpdir.name), [
+            "a1km_chlor_a_7d_anom_png_20180101.png",
+            "a1km_chlor_a_7d_mean_png_20180101.png",
+            "sub/a1km_chlor_a_7d_mean_png_20180108.png",
+            "sub/deeper/notes.txt",
+        ])
+
+    def test_classify_by_load_format(self):
+        """ each file goes to the load w/ the most specific format """
+        load_format = "{product_type_name}_%Y%m%d.png"
+        index = get_index({
+            'mean': {
+                'load_format': load_format,
+                'product_type_name': 'a1km_chlor_a_7d_mean_png',
+            },
+            'anom': {
+                'load_format': load_format,
+                'product_type_name': 'a1km_chlor_a_7d_anom_png',
+            },
+            'any_png': {'load_format': "{name}_%Y%m%d.png"},
+            'no_format': {'product_id': 43},
+        })
+        self.assertEqual(
+            index.classify(scan_directory(self.tmpdir.name)),
+            {
+                'mean': [
+                    "a1km_chlor_a_7d_mean_png_20180101.png",
+                    "sub/a1km_chlor_a_7d_mean_png_20180108.png",
+                ],
+                'anom': ["a1km_chlor_a_7d_anom_png_20180101.png"],
+                'any_png': [],
+            }
+        )
+
+    def test_format_with_dirs(self):
+        """ formats w/ a `/` match the whole relative path """
+        index = get_index({
+            'sub': {'load_format': "sub/{name}_%Y%m%d.png"},
+        })
+        self.assertEqual(
+            index.classify(scan_directory(self.tmpdir.name)),
+            {'sub': ["sub/a1km_chlor_a_7d_mean_png_20180108.png"]}
+        )
@@ -0,0 +1,325 @@
+"""
+Waits for files to finish landing in an ingest directory so loads can start
+within seconds instead of at the next scheduled scan.
+
+InotifyWatcher watches the directory tree w/ Linux inotify (through ctypes)
+& reports files when they are closed after writing or moved in. inotify
+does not see changes made by other hosts on network filesystems, so
+open_watcher falls back to a PollingWatcher that re-scans the tree every
+`poll_interval` & reports files once their size & mtime are unchanged for
+one interval.
+
+Usage:
+```
+watcher = open_watcher(directory)
+try:
+    relpaths = wait_for_files(watcher, timeout=3600, coalesce_seconds=10)
+finally:
+    watcher.close()
+```
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+from imars_dags.dag_classes.ingest.parallel_load import get_mount
+
+# from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+# filesystems whose changes from other hosts inotify does not report
+NETWORK_FS_TYPES = {
+    "nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "ceph", "glusterfs",
+    "lustre", "fuse.sshfs",
+}
+
+
+def _load_libc():
+    """returns libc w/ the inotify functions or None if unavailable"""
+    try:
+        libc = ctypes.CDLL(
+            ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+        )
+        for func in ["inotify_init1", "inotify_add_watch"]:
+            getattr(libc, func)
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+def get_fs_type(path, mounts_path="/proc/mounts"):
+    """returns type (eg: "nfs4") of the filesystem path is on or None"""
+    mount = get_mount(path)
+    fs_type = None
+    try:
+        with open(mounts_path) as mounts:
+            for line in mounts:
+                fields = line.split()
+                # octal escapes (eg: `\040` for space) are left as-is
+                if len(fields) > 2 and fields[1] == mount:
+                    fs_type = fields[2]  # last listed wins, like the kernel
+    except OSError as os_err:
+        print(os_err)
+    return fs_type
+
+
+def changed_since(directory, since):
+    """
+    returns {relpath: timestamp} of files modified or moved in (by ctime)
+    at or after the `since` timestamp.
+    """
+    changed = {}
+    to_scan = [""]
+    while len(to_scan) > 0:
+        reldir = to_scan.pop()
+        with os.scandir(os.path.join(directory, reldir)) as entries:
+            for entry in entries:
+                relpath = os.path.join(reldir, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    to_scan.append(relpath)
+                elif entry.is_file():
+                    f_stat = entry.stat()
+                    changed_at = max(f_stat.st_mtime, f_stat.st_ctime)
+                    if changed_at >= since:
+                        changed[relpath] = changed_at
+    return changed
+
+
+class InotifyWatcher(object):
+    """
+    Reports files closed after writing or moved into the directory tree.
+    New subdirectories are watched as they appear & the files in
+    directories moved in are reported.
+    """
+    def __init__(self, directory, libc=None):
+        self.directory = directory
+        self.overflowed = False  # events were lost; re-scan everything
+        self._libc = libc or _load_libc()
+        if self._libc is None:
+            raise OSError("inotify is not available")
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            self._raise_errno("inotify_init1")
+        self._reldirs = {}  # watch descriptor -> dir relative to directory
+        self._watch_tree("")
+
+    def _raise_errno(self, what):
+        errno = ctypes.get_errno()
+        raise OSError(errno, "{}: {}".format(what, os.strerror(errno)))
+
+    def _watch_tree(self, reldir):
+        """watches reldir & its subdirs; returns the files already in them"""
+        relpaths = []
+        to_scan = [reldir]
+        while len(to_scan) > 0:
+            reldir = to_scan.pop()
+            wd = self._libc.inotify_add_watch(
+                self._fd,
+                os.fsencode(os.path.join(self.directory, reldir)),
+                WATCH_MASK
+            )
+            if wd < 0:
+                self._raise_errno("inotify_add_watch '{}'".format(reldir))
+            self._reldirs[wd] = reldir
+            # listed after the watch is added so no file is missed
+            with os.scandir(os.path.join(self.directory, reldir)) as entries:
+                for entry in entries:
+                    relpath = os.path.join(reldir, entry.name)
+                    if entry.is_dir(follow_symlinks=False):
+                        to_scan.append(relpath)
+                    elif entry.is_file():
+                        relpaths.append(relpath)
+        return relpaths
+
+    def poll(self, timeout):
+        """
+        returns paths (relative to directory) of files completed since the
+        last poll, waiting up to timeout seconds for the first.
+        """
+        readable, _, _ = select.select([self._fd], [], [], max(timeout, 0))
+        if len(readable) == 0:
+            return []
+        relpaths = []
+        while True:
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            relpaths.extend(self._parse_events(buf))
+        return relpaths
+
+    def _parse_events(self, buf):
+        relpaths = []
+        offset = 0
+        while offset < len(buf):
+            wd, mask, _, name_len = _EVENT_HEADER.unpack_from(buf, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(buf[offset:offset + name_len].rstrip(b"\0"))
+            offset += name_len
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            if mask & IN_IGNORED:  # dir removed
+                self._reldirs.pop(wd, None)
+                continue
+            if wd not in self._reldirs:
+                continue
+            relpath = os.path.join(self._reldirs[wd], name)
+            if mask & IN_ISDIR:
+                try:
+                    in_dir = self._watch_tree(relpath)
+                except OSError as os_err:
+                    print(os_err)  # removed since created
+                    continue
+                # files written into a new dir before it was watched may be
+                # incomplete; those are left to the next scan.
+                if mask & IN_MOVED_TO:
+                    relpaths.extend(in_dir)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                relpaths.append(relpath)
+        return relpaths
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher(object):
+    """
+    Re-scans the directory tree every poll_interval seconds & reports files
+    that are new or changed & then unchanged for one interval. Files
+    present when the watcher starts are not reported.
+    """
+    def __init__(
+        self, directory, poll_interval=60, clock=time.monotonic,
+        sleep=time.sleep
+    ):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.overflowed = False
+        self.clock = clock
+        self.sleep = sleep
+        self._known = self._scan()  # relpath -> (size, mtime_ns)
+        self._changed = {}  # relpath -> (size, mtime_ns) at last scan
+        self._last_scan = self.clock()
+
+    def _scan(self):
+        signatures = {}
+        to_scan = [""]
+        while len(to_scan) > 0:
+            reldir = to_scan.pop()
+            try:
+                entries = os.scandir(os.path.join(self.directory, reldir))
+            except OSError as os_err:
+                print(os_err)  # removed since listed
+                continue
+            with entries:
+                for entry in entries:
+                    relpath = os.path.join(reldir, entry.name)
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            to_scan.append(relpath)
+                        elif entry.is_file():
+                            f_stat = entry.stat()
+                            signatures[relpath] = (
+                                f_stat.st_size, f_stat.st_mtime_ns
+                            )
+                    except OSError as os_err:
+                        print(os_err)
+        return signatures
+
+    def poll(self, timeout):
+        """
+        returns paths (relative to directory) of files completed since the
+        last poll, waiting up to timeout seconds for the next scan.
+        """
+        wait = self._last_scan + self.poll_interval - self.clock()
+        if wait > 0:
+            self.sleep(max(min(wait, timeout), 0))
+            if wait > timeout:
+                return []
+        self._last_scan = self.clock()
+        signatures = self._scan()
+        relpaths = []
+        for relpath, signature in signatures.items():
+            if self._known.get(relpath) == signature:
+                continue
+            if self._changed.get(relpath) == signature:
+                relpaths.append(relpath)
+                self._known[relpath] = signature
+                del self._changed[relpath]
+            else:
+                self._changed[relpath] = signature
+        for relpath in set(self._known).difference(signatures):
+            del self._known[relpath]
+        for relpath in set(self._changed).difference(signatures):
+            del self._changed[relpath]
+        return relpaths
+
+    def close(self):
+        pass
+
+
+def open_watcher(directory, poll_interval=60, use_inotify=None):
+    """
+    returns an InotifyWatcher for directory if inotify is available &
+    directory is not on a network filesystem, else a PollingWatcher.
+    `use_inotify` True or False forces the choice.
+    """
+    if use_inotify is None:
+        use_inotify = (
+            _load_libc() is not None and
+            get_fs_type(directory) not in NETWORK_FS_TYPES
+        )
+    if use_inotify:
+        return InotifyWatcher(directory)
+    return PollingWatcher(directory, poll_interval)
+
+
+def wait_for_files(
+    watcher, timeout, coalesce_seconds=10, max_coalesce_seconds=None,
+    clock=time.monotonic
+):
+    """
+    waits up to timeout seconds for a file to be completed, then keeps
+    collecting files until none is completed for coalesce_seconds (or
+    max_coalesce_seconds have passed) so a burst of files becomes one batch.
+
+    returns
+    -------
+    sorted paths (relative to the watched directory) of the files
+    completed; empty if none were before the timeout.
+    """
+    if max_coalesce_seconds is None:
+        max_coalesce_seconds = 10 * coalesce_seconds
+    relpaths = set()
+    deadline = clock() + timeout
+    while len(relpaths) == 0 and not watcher.overflowed:
+        remaining = deadline - clock()
+        if remaining <= 0:
+            return []
+        relpaths.update(watcher.poll(remaining))
+    quiet_at = clock() + coalesce_seconds
+    coalesce_deadline = clock() + max_coalesce_seconds
+    while not watcher.overflowed:
+        remaining = min(quiet_at, coalesce_deadline) - clock()
+        if remaining <= 0:
+            break
+        completed = watcher.poll(remaining)
+        if len(completed) > 0:
+            relpaths.update(completed)
+            quiet_at = clock() + coalesce_seconds
+    return sorted(relpaths)
@@ -0,0 +1,146 @@
+# std modules:
+import os
+import tempfile
+import threading
+import time
+from unittest import skipIf
+from unittest import TestCase
+
+from imars_dags.dag_classes.ingest import watch
+from imars_dags.dag_classes.ingest.parallel_load import get_mount
+from imars_dags.dag_classes.ingest.watch import changed_since
+from imars_dags.dag_classes.ingest.watch import get_fs_type
+from imars_dags.dag_classes.ingest.watch import open_watcher
+from imars_dags.dag_classes.ingest.watch import PollingWatcher
+from imars_dags.dag_classes.ingest.watch import wait_for_files
+
+HAS_INOTIFY = watch._load_libc() is not None
+
+
+class WatchTestCase(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.directory = self.tmpdir.name
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, relpath, content="data"):
+        path = os.path.join(self.directory, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f_obj:
+            f_obj.write(content)
+        return path
+
+
+@skipIf(not HAS_INOTIFY, "inotify not available")
+class Test_InotifyWatcher(WatchTestCase):
+    def setUp(self):
+        super(Test_InotifyWatcher, self).setUp()
+        self.write("old.png")
+        self.watcher = open_watcher(self.directory, use_inotify=True)
+
+    def tearDown(self):
+        self.watcher.close()
+        super(Test_InotifyWatcher, self).tearDown()
+
+    def test_closed_files_are_reported(self):
+        """ files are reported on close, not while being written """
+        self.assertEqual(self.watcher.poll(0), [])
+        path = os.path.join(self.directory, "new.png")
+        with open(path, "w") as f_obj:
+            f_obj.write("partial")
+            f_obj.flush()
+            self.assertEqual(self.watcher.poll(0.05), [])
+        self.assertEqual(self.watcher.poll(1), ["new.png"])
+
+    def test_moved_in_files_and_dirs(self):
+        with tempfile.TemporaryDirectory() as staging:
+            with open(os.path.join(staging, "moved.png"), "w") as f_obj:
+                f_obj.write("data")
+            os.makedirs(os.path.join(staging, "sub"))
+            with open(os.path.join(staging, "sub", "a.png"), "w") as f_obj:
+                f_obj.write("data")
+            os.rename(
+                os.path.join(staging, "moved.png"),
+                os.path.join(self.directory, "moved.png")
+            )
+            os.rename(
+                os.path.join(staging, "sub"),
+                os.path.join(self.directory, "sub")
+            )
+        self.assertEqual(
+            sorted(self.watcher.poll(1)), ["moved.png", "sub/a.png"]
+        )
+        # the moved-in dir is watched too
+        self.write("sub/b.png")
+        self.assertEqual(self.watcher.poll(1), ["sub/b.png"])
+
+    def test_new_subdirs_are_watched(self):
+        os.makedirs(os.path.join(self.directory, "png_chl_7d"))
+        self.assertEqual(self.watcher.poll(1), [])
+        self.write("png_chl_7d/chl_2018001.png")
+        self.assertEqual(self.watcher.poll(1), ["png_chl_7d/chl_2018001.png"])
+
+    def test_burst_is_coalesced(self):
+        """ files written close together come back as one batch """
+        def write_burst():
+            for i in range(5):
+                self.write("burst_{}.png".format(i))
+                time.sleep(0.02)
+        writer = threading.Thread(target=write_burst)
+        t_start = time.monotonic()
+        writer.start()
+        relpaths = wait_for_files(
+            self.watcher, timeout=5, coalesce_seconds=0.2
+        )
+        writer.join()
+        self.assertEqual(
+            relpaths, ["burst_{}.png".format(i) for i in range(5)]
+        )
+        self.assertLess(time.monotonic() - t_start, 2)
+
+    def test_timeout(self):
+        self.assertEqual(wait_for_files(self.watcher, timeout=0.05), [])
+
+
+class Test_PollingWatcher(WatchTestCase):
+    def test_changed_files_are_reported_once_stable(self):
+        self.write("old.png")
+        watcher = PollingWatcher(self.directory, poll_interval=0.01)
+        self.assertEqual(watcher.poll(1), [])
+        self.write("sub/new.png")
+        self.assertEqual(watcher.poll(1), [])  # seen changing
+        self.assertEqual(watcher.poll(1), ["sub/new.png"])  # then stable
+        self.assertEqual(watcher.poll(1), [])
+        self.write("old.png", "changed")
+        watcher.poll(1)
+        self.assertEqual(watcher.poll(1), ["old.png"])
+
+    def test_short_timeout_does_not_scan(self):
+        watcher = PollingWatcher(self.directory, poll_interval=60)
+        self.write("new.png")
+        self.assertEqual(wait_for_files(watcher, timeout=0.01), [])
+
+    def test_network_fs_falls_back_to_polling(self):
+        mounts_path = os.path.join(self.directory, "mounts")
+        with open(mounts_path, "w") as mounts:
+            mount = get_mount(self.directory)
+            mounts.write("/dev/sda1 {} ext4 rw 0 0\n".format(mount))
+            mounts.write("server:/export {} nfs4 rw 0 0\n".format(mount))
+        self.assertEqual(get_fs_type(self.directory, mounts_path), "nfs4")
+        watcher = open_watcher(self.directory, use_inotify=False)
+        self.assertIsInstance(watcher, PollingWatcher)
+
+
+class Test_changed_since(WatchTestCase):
+    def test_changed_since(self):
+        old = self.write("old.png")
+        os.utime(old, (1000, 1000))
+        since = time.time() - 1
+        self.write("a/new.png")
+        # ctime of the old file is recent too
+        changed = changed_since(self.directory, since)
+        self.assertEqual(sorted(changed), ["a/new.png", "old.png"])
+        self.assertGreaterEqual(changed["old.png"], since)
+        self.assertEqual(changed_since(self.directory, time.time() + 60), {})
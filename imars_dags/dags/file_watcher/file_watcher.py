@@ -3,10 +3,11 @@
 Sets up a file watcher that catches a whole bunch of products
 and triggers DAGs and changes their status in the metadata db.
 ---------------------------------------------------------------------------
-Tasks in this DAG watch the imars metadata db for `status_id=="to_load"`
-files of a certain `product` type. The `product.short_name` is used in the
-name of the DAG in the form `file_trigger_{short_name}.py`. The
-`last_processed` column is used to prioritize DAG triggering.
+The `file_trigger` task in this DAG watches the imars metadata db for
+`status_id=="to_load"` files of the `product` types in `ROUTES`, which
+maps each product to the DAGs & areas it triggers. The
+`last_processed` column is used to prioritize DAG triggering within each
+product; products take turns within each batch.
 
 A file_trigger DAG only triggers external processing DAGs and updates
 `file.status_id`.
@@ -43,12 +44,34 @@ The following diagram illustrates the relationship between this DAG and
     ["status"]
 ```
 """
+from datetime import timedelta
+
 from airflow import DAG
 
 from imars_dags.operators.FileWatcher.FileWatcherOperator \
     import FileWatcherOperator
 
 
+# files drained per batch (shared fairly between products). The time
+# budget keeps each run short.
+BATCH_SIZE = 100
+TIME_BUDGET = timedelta(seconds=50)
+# The task can stay up listening for new files (see
+# FileWatcher/changelog.py) instead of launching every minute. That needs
+# the table & triggers in changelog.CHANGELOG_DDL_MYSQL, so it stays off
+# until those are applied to the imars_metadata db; then set this to eg
+# `timedelta(minutes=9)` & the schedule_interval below to "*/10 * * * *".
+LISTEN_FOR = None
+# how often backlog gauges are sent to graphite
+METRICS_INTERVAL = timedelta(minutes=1)
+# Files can be revisited less & less often & quarantined after failing
+# repeatedly (see FileWatcher/retry_policy.py) so already-handled files do
+# not fill the batches. That needs the columns in
+# retry_policy.RETRY_DDL_MYSQL, so it stays off until those are applied to
+# the imars_metadata db; then set this to
+# `retry_policy.RetryPolicy()`.
+RETRY_POLICY = None
+
 this_dag = DAG(
     dag_id="file_watcher",
     catchup=False,  # latest only
@@ -57,57 +80,75 @@ this_dag = DAG(
 )
 this_dag.doc_md = __doc__
 
-with this_dag as dag:
-    claimed_ids = []  # used to help prevent unwanted duplicate id claims
-    # ======================================================================
-    # === incoming wv2 .ntf files (already unzipped)
-    # pid=11, short_name=ntf_wv2_m1bs
-    assert 11 not in claimed_ids
-    from imars_dags.dags.wv2_classification import wv_classification
-    file_trigger_ntf_wv2_m1bs = FileWatcherOperator(
-        task_id="file_trigger_ntf_wv2_m1bs",
-        product_ids=[11],
-        dags_to_trigger=[
-            wv_classification.DAG_NAME,
-        ],
-        area_names=wv_classification.AREAS,
+# routing table of {product_id: (dags_to_trigger, area_names)}.
+# All products are watched by one task so the number of task instances
+# does not grow with the number of products.
+ROUTES = {}
+claimed_ids = []  # used to help prevent unwanted duplicate id claims
+# ==========================================================================
+# === incoming wv2 .ntf files (already unzipped)
+# pid=11, short_name=ntf_wv2_m1bs
+assert 11 not in claimed_ids
+from imars_dags.dags.wv2_classification import wv_classification  # noqa E402
+ROUTES[11] = (
+    [
+        wv_classification.DAG_NAME,
+    ],
+    wv_classification.AREAS
+)
+claimed_ids.append(11)
+
+# === incoming zipped wv2 files
+# id 6 == zip_wv3_ftp_ingest
+# assert 6 not in claimed_ids
+# from imars_dags.dags.processing import wv2_unzip
+# ROUTES[6] = (
+#     [
+#         wv2_unzip.DAG_NAME
+#     ],
+#     wv2_unzip.AREAS
+# )
+# claimed_ids.append(6)
+
+# === incoming Sentinel 3 zipped EFR files
+assert 36 not in claimed_ids
+from imars_dags.dags.s3_chloro_a import s3_chloro_a  # noqa E402
+ROUTES[36] = (
+    [
+        s3_chloro_a.DAG_NAME
+    ],
+    s3_chloro_a.AREAS
+)
+claimed_ids.append(36)
+
+# ==========================================================================
+# ids cannot be claimed more than once; that would cause missing DAGRuns.
+# (To drain one product w/ several tasks, use FileWatcherOperator's
+# `lease` & `shard` args instead.)
+# assert no duplicates in claimed_ids
+# (https://stackoverflow.com/a/1541827/1483986)
+if len(claimed_ids) != len(set(claimed_ids)):
+    raise AssertionError(
+        "too many claims on product #s {}".format(
+            set([x for x in claimed_ids if claimed_ids.count(x) > 1])
+            )
     )
-    claimed_ids.append(11)
-
-    # === incoming zipped wv2 files
-    # id 6 == zip_wv3_ftp_ingest
-    # assert 6 not in claimed_ids
-    # from imars_dags.dags.processing import wv2_unzip
-    # file_trigger_zip_wv2_ftp_ingest = FileWatcherOperator(
-    #     task_id="file_trigger_zip_wv2_ftp_ingest",
-    #     product_ids=[6],
-    #     dags_to_trigger=[
-    #         wv2_unzip.DAG_NAME
-    #     ],
-    #     area_names=wv2_unzip.AREAS
-    # )
-    # claimed_ids.append(6)
-
-    # === incoming Sentinel 3 zipped EFR files
-    assert 36 not in claimed_ids
-    from imars_dags.dags.s3_chloro_a import s3_chloro_a
-    file_trigger_s3a_zipped_ol_1_efr = FileWatcherOperator(
-        task_id="file_trigger_s3a_zipped_ol_1_efr",
-        product_ids=[36],
-        dags_to_trigger=[
-            s3_chloro_a.DAG_NAME
-        ],
-        area_names=s3_chloro_a.AREAS
+
+# relative share of each batch per (product, area) stream while streams
+# have backlogs. Near-real-time Sentinel-3 passes go ahead of bulk WV2
+# deliveries; see FileWatcher/fair_scheduler.py.
+WEIGHTS = {
+    36: 4,  # s3a_ol_1_efr
+}
+
+with this_dag as dag:
+    file_trigger = FileWatcherOperator(
+        task_id="file_trigger",
+        routes=ROUTES,
+        weights=WEIGHTS,
+        batch_size=BATCH_SIZE,
+        time_budget=TIME_BUDGET,
+        listen_for=LISTEN_FOR,
+        metrics_interval=METRICS_INTERVAL,
+        retry_policy=RETRY_POLICY,
     )
-    claimed_ids.append(36)
-
-    # ======================================================================
-    # ids cannot be claimed more than once; that would cause missing DAGRuns.
-    # assert no duplicates in claimed_ids
-    # (https://stackoverflow.com/a/1541827/1483986)
-    if len(claimed_ids) != len(set(claimed_ids)):
-        raise AssertionError(
-            "too many claims on product #s {}".format(
-                set([x for x in claimed_ids if claimed_ids.count(x) > 1])
-                )
-        )
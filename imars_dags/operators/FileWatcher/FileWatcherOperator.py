@@ -1,38 +1,133 @@
 """
-Sets up a watch for a product file type in the metadata db.
+Sets up a watch for product file types in the metadata db.
 """
 from datetime import datetime
+from datetime import timedelta
 from datetime import timezone
+import time
 
-from airflow import settings
-from airflow.models import DagBag
 from airflow.hooks.mysql_hook import MySqlHook
 from airflow.operators.python_operator import PythonOperator
-from airflow.utils.state import State
 from airflow.exceptions import AirflowSkipException
 
-import imars_etl
-
-# from imars_dags.operators.FileWatcher.check_ipfs_accessible \
-#     import check_ipfs_accessible
-from imars_dags.operators.FileWatcher.check_locally_accessible \
-    import check_locally_accessible
+from imars_dags.dags.bouys_to_graphite.GraphiteInterface \
+    import GraphiteInterface
+from imars_dags.operators.FileWatcher.backlog_metrics \
+    import query_backlog
+from imars_dags.operators.FileWatcher.backlog_metrics \
+    import send_backlog_metrics
+from imars_dags.operators.FileWatcher.changelog import AdaptivePoller
+from imars_dags.operators.FileWatcher.changelog import ChangeLogListener
+from imars_dags.operators.FileWatcher.changelog import prune_changelog
+from imars_dags.operators.FileWatcher.changelog import run_event_loop
+from imars_dags.operators.FileWatcher.check_for_duplicates \
+    import prepare_fingerprints
 from imars_dags.operators.FileWatcher.check_for_duplicates \
-    import check_for_duplicates
-from imars_dags.operators.FileWatcher.check_filesize_match \
-    import check_filesize_match
+    import store_fingerprints
+from imars_dags.operators.FileWatcher.claim import claim_files
+from imars_dags.operators.FileWatcher.claim import release_claims
+from imars_dags.operators.FileWatcher.create_dagruns import create_dagruns
+from imars_dags.operators.FileWatcher.duplicate_index \
+    import DuplicateGroupIndex
+from imars_dags.operators.FileWatcher.fair_scheduler \
+    import DeficitRoundRobin
+from imars_dags.operators.FileWatcher.metadata_writer import MetadataWriter
+from imars_dags.operators.FileWatcher.retry_policy import ELIGIBLE_SQL
+from imars_dags.operators.FileWatcher.retry_policy import QUARANTINE_UNTIL
+from imars_dags.operators.FileWatcher.retry_policy import RETRY_COLS
+from imars_dags.operators.FileWatcher.routing import get_routes
+from imars_dags.operators.FileWatcher.routing import select_round_robin
+from imars_dags.operators.FileWatcher.validate_files import validate_files
+from imars_dags.util.Area import Area
+from imars_dags.util.globals import GRAPHITE
+from imars_dags.util import registry
+from imars_dags.util.timing import PhaseTimer
 
 DAWN_OF_TIME = datetime(2018, 5, 5, 5, 5)  # any date in past is fine
 VALID_STATUS_IDS = [1, 2, 3]  # += NULL
+METADATA_CONN_ID = 'imars_metadata'
+CLAIM_COLS = [
+    'id', 'area_id', 'date_time', 'filepath', 'multihash', 'product_id',
+    'n_bytes', 'proc_counter', 'status_id',
+]
+# bounds (seconds) of the adaptive polling interval used by `listen_for`
+POLL_MIN_INTERVAL = 5
+POLL_MAX_INTERVAL = 60
+# kept between runs in the same process so refreshes are incremental
+_DUPLICATE_INDEXES = {}  # tuple(product_ids) -> DuplicateGroupIndex
+
 
+def _in_list(column, values):
+    """returns sql `column IN (values)`; never true if values is empty"""
+    if len(values) < 1:
+        return "1=0"  # `IN ()` is a syntax error
+    return "{} IN ({})".format(column, ",".join(map(str, values)))
 
-def get_sql_selection(product_ids):
+
+def get_sql_selection(product_ids, area_ids=None):
     # 1=std, 2=external, 3=to_load
-    return (
-        "(status_id IN ({}) OR status_id IS NULL) AND product_id IN ({})"
-    ).format(
-        ",".join(map(str, VALID_STATUS_IDS)),
-        ",".join(map(str, product_ids))
+    selection = "({} OR status_id IS NULL) AND {}".format(
+        _in_list("status_id", VALID_STATUS_IDS),
+        _in_list("product_id", product_ids)
+    )
+    if area_ids is not None:
+        selection += " AND " + _in_list("area_id", area_ids)
+    return selection
+
+
+def get_area_ids(area_names):
+    """returns list of area ids for given list of area short_names"""
+    return [Area(area_name).id for area_name in area_names]
+
+
+def get_area_ids_by_product(routes):
+    """returns {product_id: area_ids} for given routing table"""
+    return {
+        product_id: get_area_ids(area_names)
+        for product_id, (_, area_names) in routes.items()
+    }
+
+
+def get_route_selections(area_ids_by_product):
+    """returns list of sql selections; one per routed product"""
+    return [
+        get_sql_selection([product_id], area_ids)
+        for product_id, area_ids in sorted(area_ids_by_product.items())
+    ]
+
+
+def get_stream_selections(routes, area_ids_by_product, weights):
+    """
+    returns (keys, selections, stream_weights) w/ one sql selection per
+    (product_id, area_id) stream. weights are looked up by
+    (product_id, area_name), then product_id; default is 1.
+    """
+    stream_weights = {}
+    for product_id, (_, area_names) in routes.items():
+        for area_name, area_id in zip(
+            area_names, area_ids_by_product[product_id]
+        ):
+            stream_weights[(product_id, area_id)] = weights.get(
+                (product_id, area_name), weights.get(product_id, 1)
+            )
+    keys = sorted(stream_weights)
+    selections = [
+        get_sql_selection([product_id], [area_id])
+        for product_id, area_id in keys
+    ]
+    return keys, selections, stream_weights
+
+
+def _count_out_of_area(backlog_rows, area_ids_by_product):
+    """
+    counts files excluded from the claim query by area filtering, from the
+    rows of backlog_metrics.query_backlog (no extra query is made).
+    """
+    return sum(
+        count for product_id, area_id, status_id, count, _ in backlog_rows
+        if product_id in area_ids_by_product and
+        (status_id is None or status_id in VALID_STATUS_IDS) and
+        area_id not in area_ids_by_product[product_id]
     )
 
 
@@ -40,9 +135,21 @@ class FileWatcherOperator(PythonOperator):
     def __init__(
         self,
         *args,
-        product_ids,
-        dags_to_trigger,
+        product_ids=None,
+        dags_to_trigger=None,
         area_names=['na'],
+        routes=None,
+        batch_size=1,
+        time_budget=None,
+        validation_workers=8,
+        check_hash=False,
+        listen_for=None,
+        lease=None,
+        shard=None,
+        retry_policy=None,
+        weights=None,
+        metrics_interval=None,
+        metrics_prefix=GRAPHITE.PREFIX + ".file_watcher",
         provide_context=True,
         start_date=DAWN_OF_TIME,
         retries=0,
@@ -59,14 +166,81 @@ class FileWatcherOperator(PythonOperator):
         area_names: str[]
             list of RoIs that we should consider triggering
             example: ['na', 'gom', 'fgbnms']
-
+        routes: dict
+            routing table {product_id: (dags_to_trigger, area_names)} to
+            watch many products with one task (see routing.py).
+            Used instead of product_ids, dags_to_trigger & area_names.
+        batch_size: int
+            max number of files claimed & processed in one batch.
+            Shared fairly between routed products.
+        time_budget: datetime.timedelta
+            stop processing the batch once this much time has been spent.
+            Files not reached are left as-is for the next run.
+            None means no limit.
+        validation_workers: int
+            max number of files validated concurrently.
+        check_hash: bool
+            compute IPFS-compatible multihashes in-process & store them in
+            the db. Hashes are cached on disk per (device, inode, size,
+            mtime) so unchanged files are only read once. Hashing stops at
+            the time_budget & resumes where it stopped the next time the
+            file is claimed, so files that take longer to read than the
+            budget are validated after several runs.
+        listen_for: datetime.timedelta
+            keep the task running this long, processing a batch whenever
+            the `file_changelog` table shows new files (see changelog.py)
+            and polling at an adaptive interval otherwise.
+            None processes one batch and exits.
+        lease: datetime.timedelta
+            claim files with a lease of this length (see claim.py) so that
+            several watchers can process the same products concurrently.
+            Should be longer than time_budget. None reads files without
+            claiming them; only one watcher per product may run then.
+        shard: (int, int)
+            (shard_n, n_shards): only process files with
+            `id % n_shards == shard_n`. Requires a lease.
+        retry_policy: retry_policy.RetryPolicy
+            back off files each time they are processed & quarantine files
+            that keep failing. Requires the columns added by
+            retry_policy.RETRY_DDL_MYSQL. Backed-off & quarantined files
+            are excluded from the claim query. None revisits files in
+            proc_counter order without delay.
+        weights: dict
+            share files between (product_id, area) streams by weighted
+            deficit round-robin (see fair_scheduler.py). Keys are
+            (product_id, area_name) or product_id (for all of a product's
+            areas); values are relative weights per stream. Streams not
+            listed get weight 1. None takes turns between products only.
+        metrics_interval: datetime.timedelta
+            send backlog gauges (queue depth, oldest pending age & counts
+            per status for each product & area; see backlog_metrics.py)
+            to graphite at most this often, and once per task run.
+            Phase timings (see util/timing.py) are sent after each batch
+            as `{metrics_prefix}.phases.*`. The files skipped by the
+            claim query's area filter are counted from the backlog query.
+            None sends no metrics.
+        metrics_prefix: str
+            root of the graphite metric names.
         """
+        if shard is not None and lease is None:
+            raise ValueError("sharded FileWatcher requires a lease")
         super(FileWatcherOperator, self).__init__(
             python_callable=_trigger_dags,
             op_kwargs={
-                'product_ids': product_ids,
-                'dags_to_trigger': dags_to_trigger,
-                'area_names': area_names,
+                'routes': get_routes(
+                    routes, product_ids, dags_to_trigger, area_names
+                ),
+                'batch_size': batch_size,
+                'time_budget': time_budget,
+                'validation_workers': validation_workers,
+                'check_hash': check_hash,
+                'listen_for': listen_for,
+                'lease': lease,
+                'shard': shard,
+                'retry_policy': retry_policy,
+                'weights': weights,
+                'metrics_interval': metrics_interval,
+                'metrics_prefix': metrics_prefix,
             },
             templates_dict={
                 'metadata_file_filepath': 'metadata_file_filepath',
@@ -79,180 +253,372 @@ class FileWatcherOperator(PythonOperator):
         )
 
 
-def update_metadata_db(file_metadata, validation_meta):
-    mysql_hook = MySqlHook(
-        mysql_conn_id='imars_metadata'  # TODO: rm hardcoded value
-    )
-    dt_now = str(datetime.now())
-    sql_update = (
-        'UPDATE file SET '
-        'status_id={},last_processed="{}",proc_counter=proc_counter+1,'
-        'last_ipfs_host="{}",multihash="{}" '
-        'WHERE id={}'
-    ).format(
-        validation_meta['status_id'], dt_now,
-        validation_meta['last_ipfs_host'], validation_meta['multihash'],
-        file_metadata['id'],
-        # expected date format: 2018-12-19 23:34:08.256244
-    )
-    print("updating metadata db:\n\t" + sql_update)
-    mysql_hook.run(
-        sql_update
-    )
+def _send_metrics(graphite, metrics):
+    """sends metrics to graphite; failures are printed, not raised"""
+    try:
+        graphite.send_data(metrics)
+    except OSError as os_err:
+        print("cannot send metrics to graphite: {}".format(os_err))
 
 
-def _validate_file(f_meta):
-    """performs validation on file row before triggering"""
-    fpath = f_meta['filepath']
-    new_status = int(f_meta.get("status_id", 1))
-    print("validating fpath:\n\t{}".format(fpath))
-    try:
-        check_locally_accessible(f_meta)
-    except AssertionError as a_err:
-        print(a_err)
-        new_status = 8  # status_id.lost
+def _get_metadata_conn():
+    return MySqlHook(
+        mysql_conn_id=METADATA_CONN_ID
+    ).get_conn()
 
-    # TODO: make available on ipfs
-    # hash, ipfs_host = check_ipfs_accessible(f_meta)
-    hash, ipfs_host = (f_meta['filepath'], "NA")  # temporary disable
 
-    try:
-        check_filesize_match(f_meta)
-    except RuntimeError as r_err:
-        print(r_err)
-        new_status = 6  # status_id.wrong_size
+def _get_duplicate_index(product_ids):
+    """returns refreshed duplicate group index for given products"""
+    key = tuple(sorted(product_ids))
+    if key not in _DUPLICATE_INDEXES:
+        _DUPLICATE_INDEXES[key] = DuplicateGroupIndex(
+            _get_metadata_conn, product_ids=product_ids
+        )
+    _DUPLICATE_INDEXES[key].refresh()
+    return _DUPLICATE_INDEXES[key]
+
 
+def _claim_files(
+    selections, batch_size, lease=None, shard=None, params=(),
+    scheduler=None, keys=None, cols=CLAIM_COLS
+):
+    """
+    returns (claim_token, list of file metadata dicts) for the next files
+    to process, taken round-robin (or by scheduler) from each selection.
+    claim_token is None unless a lease is used.
+    """
+    if lease is not None:
+        return claim_files(
+            _get_metadata_conn, selections, cols, batch_size,
+            lease, shard=shard, params=params, scheduler=scheduler, keys=keys
+        )
+    print('SELECT {} FROM file WHERE {} LIMIT {} (per selection)'.format(
+        '*',
+        " | ".join(selections),
+        batch_size
+    ))
+    conn = _get_metadata_conn()
     try:
-        check_for_duplicates(f_meta)
-    except NotImplementedError:
-        print('this file found to be a duplicate of another in db.')
-        new_status = 7  # status_id.duplicate
+        cursor = conn.cursor()
+        result = select_round_robin(
+            cursor, selections, cols, batch_size, params,
+            scheduler=scheduler, keys=keys
+        )
+        cursor.close()
+    finally:
+        conn.close()
+    return None, result
 
-    return {
-        "last_ipfs_host": ipfs_host,
-        "multihash": hash,
-        "status_id": new_status,
-    }
+
+def _get_targets(file_metadata, validation_meta, dags_to_trigger):
+    """
+    returns list of (dag_id, execution_date) tuples to trigger for a
+    validated file.
+    """
+    if (
+        validation_meta['failed'] or
+        validation_meta['status_id'] not in VALID_STATUS_IDS
+    ):
+        print(
+            "File failed an integrity check. "
+            "Skipping DAG triggers:\n\t{}".format(file_metadata['filepath'])
+        )
+        return []
+    roi_name = file_metadata['area_name']
+    trigger_dt = file_metadata['date_time']
+    # "fix" for "ValueError: naive datetime is disallowed":
+    # (assumes tz is UTC)
+    trigger_dt = trigger_dt.replace(tzinfo=timezone.utc)
+    # processing_dag_name is root dag,
+    # but each region has a dag
+    return [
+        ("{}_{}".format(processing_dag_name, roi_name), trigger_dt)
+        for processing_dag_name in dags_to_trigger
+    ]
 
 
 def _trigger_dags(
     ds,
     *args,
-    product_ids,
-    dags_to_trigger,
-    area_names,
+    routes,
+    batch_size=1,
+    time_budget=None,
+    validation_workers=8,
+    check_hash=False,
+    listen_for=None,
+    lease=None,
+    shard=None,
+    retry_policy=None,
+    weights=None,
+    metrics_interval=None,
+    metrics_prefix=GRAPHITE.PREFIX + ".file_watcher",
     templates_dict={},
     **kwargs
 ):
-    # === get file metadata
-    sql_selection = get_sql_selection(product_ids)
-    post_where_str = "ORDER BY proc_counter,last_processed ASC LIMIT 1"
-    # SELECT {cols} FROM file WHERE {sql} {post_where}
-    print('SELECT {} FROM file WHERE {} {}'.format(
-        '*',
-        sql_selection,
-        post_where_str
+    if isinstance(time_budget, timedelta):
+        time_budget = time_budget.total_seconds()
+    if isinstance(lease, timedelta):
+        lease = lease.total_seconds()
+    product_ids = sorted(routes)
+    area_ids_by_product = get_area_ids_by_product(routes)
+    if weights is None:
+        keys = None
+        selections = get_route_selections(area_ids_by_product)
+        scheduler = None
+    else:
+        # one scheduler for all batches so credit carries between them
+        keys, selections, stream_weights = get_stream_selections(
+            routes, area_ids_by_product, weights
+        )
+        scheduler = DeficitRoundRobin(stream_weights)
+    if isinstance(metrics_interval, timedelta):
+        metrics_interval = metrics_interval.total_seconds()
+    graphite = GraphiteInterface(GRAPHITE.HOST, GRAPHITE.PORT)
+    totals = {
+        'dags_triggered': 0, 'python_out_of_area': 0,
+        'sql_out_of_area': None,  # as of the last backlog query
+    }
+    metrics_sent_at = [None]  # monotonic time of last metrics tick
+
+    def process_batch():
+        if metrics_interval is not None and (
+            metrics_sent_at[0] is None or
+            time.monotonic() - metrics_sent_at[0] >= metrics_interval
+        ):
+            backlog_rows = query_backlog(_get_metadata_conn, product_ids)
+            send_backlog_metrics(
+                _get_metadata_conn, product_ids, graphite, metrics_prefix,
+                rows=backlog_rows
+            )
+            totals['sql_out_of_area'] = _count_out_of_area(
+                backlog_rows, area_ids_by_product
+            )
+            metrics_sent_at[0] = time.monotonic()
+        timer = PhaseTimer()
+        (
+            n_claimed, n_changed, n_dags_triggered, n_out_of_area
+        ) = _process_batch(
+            routes, selections, batch_size, time_budget,
+            validation_workers, check_hash, lease, shard, retry_policy,
+            scheduler, keys, timer
+        )
+        print(timer.log_line(
+            "file_watcher_batch", n_claimed=n_claimed, n_changed=n_changed,
+            n_dags_triggered=n_dags_triggered
+        ))
+        if metrics_interval is not None:
+            _send_metrics(
+                graphite, timer.to_graphite(metrics_prefix + ".phases")
+            )
+        totals['dags_triggered'] += n_dags_triggered
+        totals['python_out_of_area'] += n_out_of_area
+        return n_claimed, n_changed
+
+    if listen_for is None:
+        process_batch()
+    else:
+        if isinstance(listen_for, timedelta):
+            listen_for = listen_for.total_seconds()
+        listener = ChangeLogListener(_get_metadata_conn, product_ids)
+        n_batches, n_files = run_event_loop(
+            process_batch, listener,
+            AdaptivePoller(POLL_MIN_INTERVAL, POLL_MAX_INTERVAL),
+            duration=listen_for, batch_size=batch_size
+        )
+        print("{} batches, {} files processed while listening.".format(
+            n_batches, n_files
+        ))
+        if listener.available:
+            print("{} change-log rows pruned.".format(
+                prune_changelog(_get_metadata_conn)
+            ))
+    # counted in SQL only w/ the backlog metrics, to not add a query
+    print("out-of-area files skipped: {} in SQL, {} in python.".format(
+        "?" if totals['sql_out_of_area'] is None
+        else totals['sql_out_of_area'],
+        totals['python_out_of_area']
     ))
-    result = imars_etl.select(
-        cols="id,area_id,date_time,filepath,multihash,product_id,n_bytes",
-        sql=sql_selection,
-        post_where=post_where_str,
-    )[0]
-    file_metadata = dict(
-        id=result[0],
-        area_id=result[1],
-        date_time=result[2],
-        filepath=result[3],
-        multihash=result[4],
-        product_id=result[5],
-        n_bytes=result[6],
-    )
-    # print("\n\tmeta:\n\t{}\n".format(file_metadata))
-    # logging.info("\n\n\tmeta:\n\t{}".format(file_metadata))
+    if totals['dags_triggered'] < 1:
+        raise AirflowSkipException(
+            'No DAGs triggered for the claimed files. '
+            'DAGRuns may already exist.'
+        )
+
 
-    # convert area_id to area_name
-    file_metadata['area_name'] = imars_etl.id_lookup(
-        table='area',
-        value=file_metadata['area_id']
+def _process_batch(
+    routes, selections, batch_size, time_budget,
+    validation_workers, check_hash, lease=None, shard=None,
+    retry_policy=None, scheduler=None, keys=None, timer=None
+):
+    """
+    claims, validates & triggers DAGs for one batch of files.
+    Time spent in each phase is added to timer.
+    Files stay claimable after processing so a file counts as changed only
+    if its status_id changed or DAGs were triggered for it.
+    returns (
+        n_files_claimed, n_files_changed, n_dags_triggered,
+        n_files_out_of_area
     )
-    validation_meta = _validate_file(file_metadata)
-    n_dags_triggered = 0
-    if file_metadata['area_name'] not in area_names:
-        print((
-            "File area '{}' not included in DAG AREAS list. "
-            "Skipping DAG triggers."
-        ).format(file_metadata['area_name']))
-    elif validation_meta['status_id'] not in VALID_STATUS_IDS:
-        print(
-            "Non-normal status id; file failed an integrity check. "
-            "Skipping DAG triggers."
+    """
+    t_start = time.monotonic()
+    timer = timer or PhaseTimer()
+    # === get file metadata
+    params = ()
+    cols = CLAIM_COLS
+    if retry_policy is not None:
+        cols = CLAIM_COLS + RETRY_COLS
+        selections = [
+            "{} AND {}".format(selection, ELIGIBLE_SQL)
+            for selection in selections
+        ]
+        params = (datetime.now(),)
+    with timer.phase("claim"):
+        claim_token, to_process = _claim_files(
+            selections, batch_size, lease, shard, params, scheduler, keys,
+            cols
         )
-    else:
-        # trigger the dags
-        roi_name = file_metadata['area_name']
-        trigger_dt = file_metadata['date_time']
-        # "fix" for "ValueError: naive datetime is disallowed":
-        # (assumes tz is UTC)
-        trigger_dt = trigger_dt.replace(tzinfo=timezone.utc)
-        trigger_date = trigger_dt.strftime('%Y-%m-%d %H:%M:%S.%f')
-        print("triggering dags for ds={}...".format(trigger_date))
-        for processing_dag_name in dags_to_trigger:
-            # processing_dag_name is root dag,
-            # but each region has a dag
-            dag_to_trigger = "{}_{}".format(
-                processing_dag_name, roi_name
+    print("{} files claimed.".format(len(to_process)))
+    if len(to_process) < 1:
+        return 0, 0, 0, 0
+    try:
+        return _process_files(
+            to_process, routes, time_budget, validation_workers, check_hash,
+            t_start, retry_policy, timer
+        )
+    finally:
+        if claim_token is not None:
+            # incl. files not reached within the time budget
+            with timer.phase("claim_release"):
+                release_claims(_get_metadata_conn, claim_token)
+
+
+def _process_files(
+    to_process, routes, time_budget, validation_workers, check_hash, t_start,
+    retry_policy=None, timer=None
+):
+    """validates & triggers DAGs for claimed files. See _process_batch."""
+    timer = timer or PhaseTimer()
+    # refreshed after claiming so claimed rows are included
+    with timer.phase("duplicate_index_refresh"):
+        duplicate_index = _get_duplicate_index(sorted(routes))
+    # === validate files & collect DagRuns wanted
+    prepared = []  # (file_metadata, validation_meta, targets)
+    in_area = []
+    file_timers = {}  # file id -> PhaseTimer
+    old_status_ids = {}  # file id -> status_id before processing
+    for file_metadata in to_process:
+        # popped so validation starts from status_id.std
+        old_status_ids[file_metadata['id']] = file_metadata.pop(
+            'status_id', None
+        )
+        file_timers[file_metadata['id']] = PhaseTimer()
+        # convert area_id to area_name
+        with file_timers[file_metadata['id']].phase("id_lookup"):
+            file_metadata['area_name'] = registry.id_lookup(
+                table='area',
+                value=file_metadata['area_id']
             )
-            print("triggering " + dag_to_trigger + "...")
-
-            try:
-                session = settings.Session()
-                dbag = DagBag(settings.DAGS_FOLDER)
-                trigger_dag = dbag.get_dag(dag_to_trigger)
-                dr = trigger_dag.create_dagrun(
-                    run_id='trig__' + trigger_dt.isoformat(),
-                    state=State.RUNNING,
-                    execution_date=trigger_dt,
-                    # conf=dro.payload,  # ? docs say: user defined dictionary
-                    #                    #          passed from CLI :type: dict
-                    external_trigger=True
-                )
-                # logging.info("Creating DagRun {}".format(dr))
-                session.add(dr)
-                session.commit()
-                n_dags_triggered += 1
-            except Exception as err:
-                if (any([
-                    substr in str(err) for substr in [
-                        'uplicate',  # duplicates are fine
-                        # "no row" also means duplicate. see:
-                        # https://issues.apache.org/jira/browse/AIRFLOW-2319
-                        'No row was found for one'
-                    ]
-                ])):
-                    # NOTE: yes, this is a terrible way to check but it's the
-                    #      best I can do in this circumstance.
-                    # we need to update even if skipping
-                    print(
-                        'DagRun already exists for this (file + DAG) combo.'
-                    )
-                    pass
-                else:
-                    print(
-                        'Non-duplicate error while triggering DAGRun ' +
-                        '#{} {} @ {}'.format(
-                            n_dags_triggered, dag_to_trigger, trigger_date
-                        )
-                    )
-                    print("Stringified exception: {}".format(str(err)))
-                    raise
-            finally:
-                session.close()
-        print("...done. {} DAGs triggered.".format(n_dags_triggered))
+        _, area_names = routes[file_metadata['product_id']]
+        if file_metadata['area_name'] in area_names:
+            in_area.append(file_metadata)
+        else:
+            # should be filtered out by the claim query already
+            print((
+                "File area '{}' not included in DAG AREAS list. "
+                "Skipping validation & DAG triggers."
+            ).format(file_metadata['area_name']))
+            prepared.append((file_metadata, None, []))
+    deadline = None
+    if time_budget is not None:
+        deadline = t_start + time_budget
+    with timer.phase("nitf_fingerprint_lookup"):
+        fingerprints = prepare_fingerprints(in_area, duplicate_index)
+    with timer.phase("validate_files"):
+        validated = validate_files(
+            in_area, max_workers=validation_workers, deadline=deadline,
+            check_hash=check_hash, duplicate_index=duplicate_index,
+            fingerprints=fingerprints
+        )
+    with timer.phase("nitf_fingerprint_store"):
+        store_fingerprints(fingerprints)
+    for file_metadata, validation_meta in validated:
+        file_timers[file_metadata['id']].merge(
+            validation_meta.pop('phase_timer')
+        )
+        dags_to_trigger, _ = routes[file_metadata['product_id']]
+        prepared.append((
+            file_metadata,
+            validation_meta,
+            _get_targets(file_metadata, validation_meta, dags_to_trigger)
+        ))
+    # === trigger the dags
+    all_targets = [
+        target for _, _, targets in prepared for target in targets
+    ]
+    print("triggering {} DAGs...".format(len(all_targets)))
+    created = set(create_dagruns(all_targets, timer=timer))
+    n_dags_triggered = len(created)
     # === update status and/or last_processed:
     # TODO: use something like imars_etl.update() ???
-    update_metadata_db(file_metadata, validation_meta)
-    if n_dags_triggered < 1:
-        raise AirflowSkipException(
-            'No DAGs triggered for this file. '
-            'DAGRuns may already exist.'
+    n_quarantined = 0
+    n_changed = 0
+    with MetadataWriter(_get_metadata_conn, timer=timer) as metadata_writer:
+        for file_metadata, validation_meta, targets in prepared:
+            file_timer = file_timers[file_metadata['id']]
+            timer.merge(file_timer)
+            print(file_timer.log_line(
+                "file_watcher_file",
+                file_id=file_metadata['id'],
+                filepath=file_metadata['filepath'],
+                product_id=file_metadata['product_id'],
+                area_name=file_metadata['area_name'],
+                status_id=(
+                    None if validation_meta is None
+                    else validation_meta['status_id']
+                ),
+                n_dags_triggered=len(created.intersection(targets)),
+                n_dags_wanted=len(targets),
+            ))
+            if len(created.intersection(targets)) > 0 or (
+                validation_meta is not None and
+                validation_meta['status_id'] !=
+                old_status_ids[file_metadata['id']]
+            ):
+                n_changed += 1
+            next_eligible_at = None
+            fail_count = None
+            if retry_policy is not None:
+                fail_count = retry_policy.get_fail_count(
+                    file_metadata['fail_count'],
+                    failed=(
+                        validation_meta is None or
+                        validation_meta['failed'] or
+                        validation_meta['status_id'] not in VALID_STATUS_IDS
+                    )
+                )
+                next_eligible_at = retry_policy.next_eligible_at(
+                    file_metadata['proc_counter'], fail_count
+                )
+                if next_eligible_at == QUARANTINE_UNTIL:
+                    print("quarantined after {} failures:\n\t{}".format(
+                        fail_count, file_metadata['filepath']
+                    ))
+                    n_quarantined += 1
+            metadata_writer.add(
+                file_metadata['id'], validation_meta,
+                next_eligible_at=next_eligible_at, fail_count=fail_count
+            )
+    print(
+        "{} files processed, {} DAGs triggered, {} quarantined in {:.1f}s."
+        .format(
+            len(prepared), n_dags_triggered, n_quarantined,
+            time.monotonic() - t_start
         )
+    )
+    print("duplicates: {duplicate_groups} groups, {duplicate_files} files."
+          .format(**duplicate_index.stats()))
+    n_out_of_area = len([
+        validation_meta for _, validation_meta, _ in prepared
+        if validation_meta is None
+    ])
+    return len(to_process), n_changed, n_dags_triggered, n_out_of_area
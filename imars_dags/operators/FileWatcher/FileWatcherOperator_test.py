@@ -0,0 +1,233 @@
+# std modules:
+from datetime import datetime
+from datetime import timezone
+import os
+import tempfile
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from imars_dags.operators.FileWatcher import FileWatcherOperator
+from imars_dags.operators.FileWatcher.backlog_metrics import query_backlog
+from imars_dags.operators.FileWatcher.FileWatcherOperator \
+    import _count_out_of_area
+from imars_dags.operators.FileWatcher.FileWatcherOperator \
+    import _process_batch
+from imars_dags.operators.FileWatcher.FileWatcherOperator \
+    import _process_files
+from imars_dags.operators.FileWatcher.FileWatcherOperator import CLAIM_COLS
+from imars_dags.operators.FileWatcher.FileWatcherOperator \
+    import get_route_selections
+from imars_dags.operators.FileWatcher.FileWatcherOperator \
+    import get_sql_selection
+from imars_dags.operators.FileWatcher.FileWatcherOperator \
+    import get_stream_selections
+from imars_dags.operators.FileWatcher.retry_policy import QUARANTINE_UNTIL
+from imars_dags.operators.FileWatcher.retry_policy import RETRY_COLS
+from imars_dags.operators.FileWatcher.retry_policy import RetryPolicy
+from imars_dags.util import registry
+from imars_dags.util.registry import Registry
+from imars_dags.util.testing import MetadataDBTestCase
+
+DT = datetime(2019, 11, 30, 15, 30)
+DT_2 = datetime(2019, 11, 30, 15, 31)
+AREAS = [{'id': 1, 'short_name': "na"}, {'id': 2, 'short_name': "gom"}]
+
+
+class Test_get_sql_selection(MetadataDBTestCase):
+    def setUp(self):
+        super(Test_get_sql_selection, self).setUp()
+        self.insert_rows("file", [
+            {'filepath': "/a", 'product_id': 36, 'area_id': 1},
+            {'filepath': "/b", 'product_id': 36, 'area_id': 2,
+             'status_id': 3},
+            {'filepath': "/c", 'product_id': 36, 'area_id': 1,
+             'status_id': 7},
+            {'filepath': "/d", 'product_id': 24, 'area_id': 1,
+             'status_id': 1},
+        ])
+
+    def select_paths(self, selection):
+        return [row[0] for row in self.select(
+            "SELECT filepath FROM file WHERE {} ORDER BY filepath".format(
+                selection
+            )
+        )]
+
+    def test_valid_status_and_product(self):
+        self.assertEqual(
+            self.select_paths(get_sql_selection([36])), ["/a", "/b"]
+        )
+        self.assertEqual(
+            self.select_paths(get_sql_selection([24, 36])), ["/a", "/b", "/d"]
+        )
+
+    def test_area_ids(self):
+        self.assertEqual(
+            self.select_paths(get_sql_selection([36, 24], [1])), ["/a", "/d"]
+        )
+
+    def test_no_area_ids_selects_nothing(self):
+        self.assertEqual(self.select_paths(get_sql_selection([36], [])), [])
+
+
+class Test_get_stream_selections(TestCase):
+    def test_one_stream_per_product_area(self):
+        routes = {
+            36: (["proc_s3"], ["na", "gom"]),
+            24: (["proc_wv2"], ["gom"]),
+        }
+        keys, selections, weights = get_stream_selections(
+            routes, {36: [1, 2], 24: [2]}, {(36, "gom"): 3, 24: 2}
+        )
+        self.assertEqual(keys, [(24, 2), (36, 1), (36, 2)])
+        self.assertEqual(selections, [
+            get_sql_selection([24], [2]),
+            get_sql_selection([36], [1]),
+            get_sql_selection([36], [2]),
+        ])
+        self.assertEqual(weights, {(24, 2): 2, (36, 1): 1, (36, 2): 3})
+
+
+class Test_count_out_of_area(MetadataDBTestCase):
+    def test_count(self):
+        self.insert_rows("file", [
+            {'filepath': "/in", 'product_id': 36, 'area_id': 1},
+            {'filepath': "/out", 'product_id': 36, 'area_id': 2},
+            {'filepath': "/no_area", 'product_id': 36},
+            {'filepath': "/failed", 'product_id': 36, 'area_id': 2,
+             'status_id': 7},
+            {'filepath': "/unrouted", 'product_id': 24, 'area_id': 2},
+            {'filepath': "/other", 'product_id': 11, 'area_id': 2},
+        ])
+        rows = query_backlog(self.get_conn, [11, 24, 36])
+        self.assertEqual(_count_out_of_area(rows, {36: [1]}), 2)
+        self.assertEqual(_count_out_of_area(rows, {36: [1], 24: []}), 3)
+
+
+class Test_process_files(MetadataDBTestCase):
+    def setUp(self):
+        super(Test_process_files, self).setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.insert_rows("area", AREAS)
+        paths = [os.path.join(self.tmpdir.name, "f{}".format(i)) + ".png"
+                 for i in range(3)]
+        for path in paths[:2]:
+            with open(path, "w") as f_obj:
+                f_obj.write("data")
+        self.insert_rows("file", [
+            {'filepath': paths[0], 'date_time': DT, 'product_id': 36,
+             'area_id': 1, 'status_id': 3, 'n_bytes': 4},
+            {'filepath': paths[1], 'date_time': DT, 'product_id': 36,
+             'area_id': 2, 'status_id': 3, 'n_bytes': 4},
+            # not on disk:
+            {'filepath': paths[2], 'date_time': DT_2, 'product_id': 36,
+             'area_id': 1, 'status_id': 3, 'n_bytes': 4},
+        ])
+        self.routes = {36: (["proc_s3"], ["na"])}
+        self.created = []
+        for patcher in [
+            patch.object(
+                FileWatcherOperator, '_get_metadata_conn', self.get_conn
+            ),
+            patch.object(
+                FileWatcherOperator, 'create_dagruns', self.create_dagruns
+            ),
+            patch.object(
+                registry, '_REGISTRY',
+                Registry(self.get_conn, snapshot_path=None)
+            ),
+            patch.dict(FileWatcherOperator._DUPLICATE_INDEXES, clear=True),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        super(Test_process_files, self).tearDown()
+
+    def create_dagruns(self, targets, timer=None):
+        """like create_dagruns; existing DagRuns are skipped"""
+        targets = [target for target in targets if target not in self.created]
+        self.created.extend(targets)
+        return targets
+
+    def get_claimed(self):
+        cols = CLAIM_COLS + RETRY_COLS
+        rows = self.select(
+            "SELECT {} FROM file ORDER BY id".format(",".join(cols))
+        )
+        return [dict(zip(cols, row)) for row in rows]
+
+    def get_results(self):
+        return self.select(
+            "SELECT id, status_id, proc_counter, next_eligible_at "
+            "FROM file ORDER BY id"
+        )
+
+    def test_valid_files_trigger_dags(self):
+        """ in-area files on disk trigger; all files are updated """
+        self.assertEqual(
+            _process_files(
+                self.get_claimed(), self.routes, None, 2, False,
+                time.monotonic()
+            ),
+            (3, 2, 1, 1)  # lost & triggered files changed
+        )
+        self.assertEqual(
+            self.created, [("proc_s3_na", DT.replace(tzinfo=timezone.utc))]
+        )
+        self.assertEqual(self.get_results(), [
+            (1, 1, 1, None),
+            (2, 3, 1, None),  # out of area; status untouched
+            (3, 8, 1, None),  # lost
+        ])
+
+    def test_retry_policy_backs_off(self):
+        _process_files(
+            self.get_claimed(), self.routes, None, 2, False,
+            time.monotonic(), retry_policy=RetryPolicy()
+        )
+        for _, _, _, next_eligible_at in self.get_results():
+            self.assertGreater(next_eligible_at, datetime.now())
+        self.assertEqual(
+            self.select("SELECT fail_count FROM file ORDER BY id"),
+            [(0,), (1,), (1,)]
+        )
+
+    def test_retry_policy_quarantines_repeated_failures(self):
+        """ files failing quarantine_after times in a row """
+        policy = RetryPolicy(quarantine_after=2)
+        for _ in range(2):
+            _process_files(
+                self.get_claimed(), self.routes, None, 2, False,
+                time.monotonic(), retry_policy=policy
+            )
+        self.assertEqual(
+            [row[3] == QUARANTINE_UNTIL for row in self.get_results()],
+            [False, True, True]
+        )
+
+    def test_process_batch_claims_routed_files(self):
+        selections = get_route_selections({36: [1]})
+        self.assertEqual(
+            _process_batch(self.routes, selections, 10, None, 2, False),
+            (2, 2, 1, 0)
+        )
+        self.assertEqual(
+            [row[:3] for row in self.get_results()],
+            [(1, 1, 1), (2, 3, 0), (3, 8, 1)]
+        )
+
+    def test_unchanged_files_are_counted(self):
+        """ re-processing files w/o new DagRuns changes nothing """
+        _process_files(
+            self.get_claimed(), self.routes, None, 2, False, time.monotonic()
+        )
+        self.assertEqual(
+            _process_files(
+                self.get_claimed(), self.routes, None, 2, False,
+                time.monotonic()
+            )[:2],
+            (3, 0)
+        )
@@ -0,0 +1,93 @@
+"""
+Backlog gauges for the FileWatcher queue, sent to graphite.
+
+One aggregate query per tick counts the `file` rows of the watched
+products by (product_id, area_id, status_id). From that the following
+gauges are sent for each product & area, named
+`{prefix}.product_{product_id}.area_{area_id}.{gauge}`:
+
+* `queue_depth` : rows waiting to be loaded (status_id=3, to_load).
+* `oldest_pending_age_s` : seconds since the `date_time` of the oldest
+    to_load row, ie: data latency. The `file` table has no insert time.
+* `status_{status_id}` : rows per status (`status_null` for NULL).
+
+Drain rate & capacity can be derived from these in grafana, eg:
+`derivative(*.queue_depth)`.
+"""
+from datetime import datetime
+import time
+
+TO_LOAD_STATUS_ID = 3
+BACKLOG_SQL = """
+    SELECT product_id, area_id, status_id, COUNT(*),
+        MIN(CASE WHEN status_id = {to_load} THEN date_time END)
+    FROM file
+    WHERE product_id IN ({product_ids})
+    GROUP BY product_id, area_id, status_id
+"""
+
+
+def _to_datetime(value):
+    """sqlite returns aggregates of TIMESTAMP columns as strings"""
+    if value is None or isinstance(value, datetime):
+        return value
+    value = str(value)
+    fmt = "%Y-%m-%d %H:%M:%S.%f" if "." in value else "%Y-%m-%d %H:%M:%S"
+    return datetime.strptime(value, fmt)
+
+
+def get_backlog_metrics(rows, prefix, now=None, ts=None):
+    """
+    returns list of graphite (metric, (timestamp, value)) tuples for rows
+    of (product_id, area_id, status_id, count, oldest_to_load_date_time).
+    """
+    now = now or datetime.utcnow()  # date_time is UTC
+    ts = ts or time.time()
+    gauges = {}  # metric path -> value
+    for product_id, area_id, status_id, count, oldest in rows:
+        path = "{}.product_{}.area_{}.".format(prefix, product_id, area_id)
+        gauges.setdefault(path + "queue_depth", 0)
+        gauges[path + "status_{}".format(
+            "null" if status_id is None else status_id
+        )] = count
+        if status_id == TO_LOAD_STATUS_ID:
+            gauges[path + "queue_depth"] = count
+            oldest = _to_datetime(oldest)
+            if oldest is not None:
+                gauges[path + "oldest_pending_age_s"] = max(
+                    0, (now - oldest).total_seconds()
+                )
+    return [(metric, (ts, value)) for metric, value in sorted(gauges.items())]
+
+
+def query_backlog(get_conn, product_ids):
+    """returns backlog rows for given products (see get_backlog_metrics)"""
+    conn = get_conn()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(BACKLOG_SQL.format(
+            to_load=TO_LOAD_STATUS_ID,
+            product_ids=",".join(map(str, product_ids))
+        ))
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+    return rows
+
+
+def send_backlog_metrics(get_conn, product_ids, graphite, prefix, rows=None):
+    """
+    queries the backlog of given products (unless its rows are given) &
+    sends the gauges using a GraphiteInterface. Failures to send are
+    printed, not raised, so they do not stop the watcher. Returns the
+    metrics.
+    """
+    if rows is None:
+        rows = query_backlog(get_conn, product_ids)
+    metrics = get_backlog_metrics(rows, prefix)
+    try:
+        graphite.send_data(metrics)
+    except OSError as os_err:
+        print("cannot send backlog metrics to graphite: {}".format(os_err))
+    return metrics
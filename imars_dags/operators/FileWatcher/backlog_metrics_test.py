@@ -0,0 +1,63 @@
+# std modules:
+from datetime import datetime
+from unittest import TestCase
+
+from imars_dags.operators.FileWatcher import sqlite_standin
+from imars_dags.operators.FileWatcher.backlog_metrics \
+    import send_backlog_metrics
+
+NOW = datetime(2019, 3, 1, 12)
+
+
+class FakeGraphite(object):
+    def __init__(self, error=None):
+        self.sent = []
+        self.error = error
+
+    def send_data(self, data):
+        if self.error is not None:
+            raise self.error
+        self.sent.extend(data)
+
+
+class Test_send_backlog_metrics(TestCase):
+    def setUp(self):
+        self.conn = sqlite_standin.connect()
+        sqlite_standin.insert_rows(self.conn, "file", [
+            {"filepath": "/a", "product_id": 11, "area_id": 1,
+             "status_id": 3, "date_time": datetime(2019, 3, 1, 11)},
+            {"filepath": "/b", "product_id": 11, "area_id": 1,
+             "status_id": 3, "date_time": datetime(2019, 3, 1, 10)},
+            {"filepath": "/c", "product_id": 11, "area_id": 1,
+             "status_id": 1, "date_time": datetime(2019, 1, 1)},
+            {"filepath": "/d", "product_id": 11, "area_id": 2,
+             "status_id": None},
+            {"filepath": "/e", "product_id": 36, "area_id": 1,
+             "status_id": 3},
+        ])
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_gauges(self):
+        """ depth, age & status counts per product & area are sent """
+        graphite = FakeGraphite()
+        send_backlog_metrics(lambda: self.conn, [11], graphite, "fw")
+        gauges = {metric: value for metric, (_, value) in graphite.sent}
+        self.assertEqual(gauges["fw.product_11.area_1.queue_depth"], 2)
+        self.assertEqual(gauges["fw.product_11.area_1.status_1"], 1)
+        self.assertEqual(gauges["fw.product_11.area_2.queue_depth"], 0)
+        self.assertEqual(gauges["fw.product_11.area_2.status_null"], 1)
+        self.assertGreaterEqual(
+            gauges["fw.product_11.area_1.oldest_pending_age_s"],
+            (NOW - datetime(2019, 3, 1, 10)).total_seconds()
+        )
+        self.assertFalse(any("product_36" in metric for metric in gauges))
+
+    def test_send_errors_not_raised(self):
+        """ unreachable graphite does not raise """
+        metrics = send_backlog_metrics(
+            lambda: self.conn, [11], FakeGraphite(ConnectionRefusedError()),
+            "fw"
+        )
+        self.assertEqual(len(metrics), 6)
@@ -0,0 +1,70 @@
+"""
+Benchmarks DAG resolution in the FileWatcher trigger path.
+
+Compares building a fresh `DagBag(settings.DAGS_FOLDER)` for every trigger
+(the old behaviour) against the one `dag` table (DagModel) query per batch
+done by `create_dagruns`.
+Must be run on a host with airflow configured (eg: an airflow worker).
+
+example usage:
+python3 -m imars_dags.operators.FileWatcher.bench_dag_resolution \
+    -n 20 wv_classification_big_bend s3_chloro_a_florida
+"""
+import argparse
+import time
+
+from airflow import settings
+from airflow.models import DagBag
+
+from imars_dags.operators.FileWatcher.create_dagruns \
+    import _get_known_dag_ids
+
+
+def _get_trigger_dag_ids(dag_ids, n_triggers):
+    """returns dag_id of each of n_triggers triggers, cycling dag_ids"""
+    return [dag_ids[i % len(dag_ids)] for i in range(n_triggers)]
+
+
+def _time_batch(resolve, trigger_dag_ids):
+    """returns triggers/second for resolving one batch of triggers"""
+    t_start = time.monotonic()
+    known = resolve(trigger_dag_ids)
+    seconds = time.monotonic() - t_start
+    missing = set(trigger_dag_ids) - known
+    assert len(missing) < 1, "DAGs not found: {}".format(sorted(missing))
+    return len(trigger_dag_ids) / seconds
+
+
+def _resolve_with_dagbags(trigger_dag_ids):
+    """parses DAGS_FOLDER for each trigger"""
+    return set(
+        dag_id for dag_id in trigger_dag_ids
+        if DagBag(settings.DAGS_FOLDER).get_dag(dag_id) is not None
+    )
+
+
+def _resolve_with_dagmodel(trigger_dag_ids):
+    """one `dag` table query for the batch, as in create_dagruns"""
+    session = settings.Session()
+    try:
+        return _get_known_dag_ids(session, trigger_dag_ids)
+    finally:
+        session.close()
+
+
+def main(dag_ids, n_triggers):
+    print("resolving {} triggers over DAGs {}".format(n_triggers, dag_ids))
+    trigger_dag_ids = _get_trigger_dag_ids(dag_ids, n_triggers)
+    before = _time_batch(_resolve_with_dagbags, trigger_dag_ids)
+    print("DagBag per trigger : {:10.2f} triggers/s".format(before))
+    after = _time_batch(_resolve_with_dagmodel, trigger_dag_ids)
+    print("DagModel per batch : {:10.2f} triggers/s".format(after))
+    print("speedup            : {:10.1f}x".format(after / before))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("dag_ids", nargs="+")
+    parser.add_argument("-n", "--n_triggers", type=int, default=10)
+    args = parser.parse_args()
+    main(args.dag_ids, args.n_triggers)
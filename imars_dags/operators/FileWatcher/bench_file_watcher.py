@@ -0,0 +1,312 @@
+"""
+Offline benchmark & replay harness for the FileWatcher trigger path.
+
+Runs FileWatcherOperator's `_trigger_dags` batch after batch against an
+in-memory sqlite_standin metadata db, a fake airflow session and
+either a synthetic file tree or a replayed snapshot of production `file`
+rows (see bench_support.py). No metadata db, airflow db or graphite is
+used, but airflow & imars_etl must be importable (eg: on an airflow worker).
+
+Reports files/s, latency percentiles of each timed phase (see
+util/timing.py) and db round-trips. Save a report with --save and pass it
+as --baseline on a later run to exit 1 if files/s drops (or round-trips
+per file rise) by more than --max_slowdown.
+
+Synthetic files are random bytes, so use non-NITF product_ids (see
+check_for_duplicates.NITF_PRODUCT_IDS) unless replaying real NITF files.
+
+example usage:
+python3 -m imars_dags.operators.FileWatcher.bench_file_watcher \
+    -n 5000 --batch_size 500 --duplicate_ratio 0.02 --save bench.json
+python3 -m imars_dags.operators.FileWatcher.bench_file_watcher \
+    --replay snapshot.tsv --materialize --baseline bench.json
+"""
+import argparse
+from contextlib import ExitStack
+from contextlib import redirect_stdout
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from airflow.exceptions import AirflowSkipException
+from airflow.models import DagModel
+
+from imars_dags.operators.FileWatcher import bench_support
+from imars_dags.operators.FileWatcher import check_for_duplicates
+from imars_dags.operators.FileWatcher import create_dagruns
+from imars_dags.operators.FileWatcher import FileWatcherOperator
+from imars_dags.operators.FileWatcher import validate_files
+from imars_dags.util import registry
+from imars_dags.util.timing import PhaseTimer
+
+
+class FakeEtl(object):
+    """the parts of imars_etl used by the FileWatcher, on a MetadataDB"""
+    def __init__(self, metadata_db):
+        self.metadata_db = metadata_db
+
+    def select(self, cols, sql, **kwargs):
+        sql = sql.strip()
+        if not sql.upper().startswith("WHERE"):
+            sql = "WHERE " + sql
+        self.metadata_db.counter.count("imars_etl")
+        return self.metadata_db.query(
+            "SELECT {} FROM file {}".format(cols, sql)
+        )
+
+
+class FakeAirflowDB(object):
+    """
+    DAGs known to the scheduler & DagRuns (dag_id, execution_date) created
+    during the benchmark
+    """
+    def __init__(self, counter, dag_ids=()):
+        self.counter = counter
+        self.dag_ids = set(dag_ids)
+        self.dagruns = set()
+        self._lock = threading.Lock()
+
+    def Session(self):
+        return FakeSession(self)
+
+
+class FakeSession(object):
+    """the parts of `settings.Session()` used by create_dagruns"""
+    def __init__(self, airflow_db):
+        self.airflow_db = airflow_db
+        self._pending = []
+        self._cols = ()
+
+    def query(self, *cols):
+        self.airflow_db.counter.count("airflow")
+        self._cols = cols
+        return self
+
+    def filter(self, *criteria):
+        # create_dagruns only keeps the DAGs & DagRuns it asked for
+        return self
+
+    def all(self):
+        if self._cols[0] is DagModel.dag_id:
+            return [(dag_id,) for dag_id in self.airflow_db.dag_ids]
+        with self.airflow_db._lock:
+            return list(self.airflow_db.dagruns)
+
+    def add(self, dagrun):
+        self._pending.append((dagrun.dag_id, dagrun.execution_date))
+
+    def commit(self):
+        self.airflow_db.counter.count("airflow")
+        with self.airflow_db._lock:
+            self.airflow_db.dagruns.update(self._pending)
+        self._pending = []
+
+    def rollback(self):
+        self._pending = []
+
+    def close(self):
+        pass
+
+
+class _PhaseSamples(object):
+    """every phase timing made during the benchmark: {phase: [seconds]}"""
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    def get_timer_class(self):
+        phase_samples = self
+
+        class RecordingPhaseTimer(PhaseTimer):
+            def add(self, name, seconds):
+                super(RecordingPhaseTimer, self).add(name, seconds)
+                phase_samples.record(name, seconds)
+        return RecordingPhaseTimer
+
+
+def run_benchmark(
+    rows, batch_size=100, n_passes=1, n_dags=1,
+    verbose=False, **watcher_kwargs
+):
+    """
+    runs the FileWatcher over the given `file` rows until each has been
+    processed n_passes times (on average) & returns a report dict.
+
+    parameters:
+    -----------
+    rows : list of dict
+        `file` rows; see bench_support.make_file_tree & load_snapshot.
+    n_dags : int
+        number of DAGs triggered per file.
+    verbose : bool
+        show the FileWatcher's output.
+    watcher_kwargs :
+        other FileWatcherOperator params, eg: validation_workers, lease.
+    """
+    counter = bench_support.RoundTripCounter()
+    metadata_db = bench_support.MetadataDB(rows, counter)
+    phase_samples = _PhaseSamples()
+    dags_to_trigger = ["bench_dag_{}".format(i) for i in range(n_dags)]
+    product_areas = {}
+    for row in rows:
+        product_areas.setdefault(row['product_id'], set()).add(row['area_id'])
+    routes = {
+        product_id: (dags_to_trigger, [
+            bench_support.get_area_name(area_id)
+            for area_id in sorted(area_ids) if area_id is not None
+        ])
+        for product_id, area_ids in product_areas.items()
+    }
+    airflow_db = FakeAirflowDB(counter, [
+        "{}_{}".format(dag_id, area_name)
+        for dag_id in dags_to_trigger
+        for _, area_names in routes.values()
+        for area_name in area_names
+    ])
+    fake_etl = FakeEtl(metadata_db)
+    timer_class = phase_samples.get_timer_class()
+    n_runs = int(math.ceil(len(rows) * n_passes / batch_size))
+    FileWatcherOperator._DUPLICATE_INDEXES.clear()
+    with ExitStack() as stack:
+        for module, name, value in [
+            (FileWatcherOperator, '_get_metadata_conn', metadata_db.connect),
+            (FileWatcherOperator, 'PhaseTimer', timer_class),
+            (registry, '_REGISTRY', registry.Registry(
+                metadata_db.connect, snapshot_path=None
+            )),
+            (check_for_duplicates, 'imars_etl', fake_etl),
+            (create_dagruns, 'settings', airflow_db),
+            (validate_files, 'PhaseTimer', timer_class),
+        ]:
+            stack.enter_context(mock.patch.object(module, name, value))
+        if not verbose:
+            devnull = stack.enter_context(open(os.devnull, "w"))
+            stack.enter_context(redirect_stdout(devnull))
+        t_start = time.perf_counter()
+        for _ in range(n_runs):
+            try:
+                FileWatcherOperator._trigger_dags(
+                    None, routes=routes, batch_size=batch_size,
+                    **watcher_kwargs
+                )
+            except AirflowSkipException:
+                pass
+        elapsed = time.perf_counter() - t_start
+    FileWatcherOperator._DUPLICATE_INDEXES.clear()
+    # proc_counter is incremented each time a file's results are written
+    n_files = metadata_db.query("SELECT SUM(proc_counter) FROM file")[0][0]
+    n_files -= sum(row.get('proc_counter') or 0 for row in rows)
+    return {
+        'n_rows': len(rows),
+        'n_runs': n_runs,
+        'n_files': n_files,
+        'seconds': elapsed,
+        'files_per_s': n_files / elapsed,
+        'n_dagruns': len(airflow_db.dagruns),
+        'status_counts': dict(metadata_db.query(
+            "SELECT status_id, COUNT(*) FROM file GROUP BY status_id"
+        )),
+        'round_trips': dict(counter.counts),
+        'round_trips_per_file': counter.total / max(1, n_files),
+        'phases': bench_support.summarize_phases(phase_samples.samples),
+    }
+
+
+def format_report(report):
+    lines = [
+        "files processed : {n_files} in {seconds:.2f}s over {n_runs} runs "
+        "= {files_per_s:.1f} files/s".format(**report),
+        "DagRuns created : {n_dagruns}".format(**report),
+        "status counts   : {}".format(report['status_counts']),
+        "db round-trips  : {} ({:.2f}/file) {}".format(
+            sum(report['round_trips'].values()),
+            report['round_trips_per_file'], report['round_trips']
+        ),
+        "{:<24}{:>8}{:>10}{:>10}{:>10}{:>10}".format(
+            "phase", "n", "p50 ms", "p90 ms", "p99 ms", "max ms"
+        ),
+    ]
+    for name, stats in sorted(report['phases'].items()):
+        lines.append(
+            "{:<24}{n:>8}{p50_ms:>10.2f}{p90_ms:>10.2f}{p99_ms:>10.2f}"
+            "{max_ms:>10.2f}".format(name, **stats)
+        )
+    return "\n".join(lines)
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as root:
+        if args.replay is not None:
+            rows = bench_support.load_snapshot(args.replay)
+            if args.materialize:
+                rows = bench_support.materialize_snapshot(rows, root)
+        else:
+            rows = bench_support.make_file_tree(
+                root, args.n_files,
+                product_ids=args.product_ids, area_ids=args.area_ids,
+                min_bytes=args.min_bytes, max_bytes=args.max_bytes,
+                duplicate_ratio=args.duplicate_ratio, seed=args.seed
+            )
+        report = run_benchmark(
+            rows, batch_size=args.batch_size, n_passes=args.n_passes,
+            n_dags=args.n_dags,
+            verbose=args.verbose,
+            validation_workers=args.validation_workers,
+            check_hash=args.check_hash,
+            lease=args.lease,
+        )
+    print(format_report(report))
+    if args.save is not None:
+        with open(args.save, "w") as f_obj:
+            json.dump(report, f_obj, indent=2, default=str)
+    if args.baseline is not None:
+        with open(args.baseline) as f_obj:
+            regressions = bench_support.compare_reports(
+                report, json.load(f_obj), args.max_slowdown
+            )
+        for regression in regressions:
+            print("REGRESSION: " + regression)
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("-n", "--n_files", type=int, default=1000)
+    parser.add_argument("--product_ids", type=int, nargs="+", default=[36])
+    parser.add_argument("--area_ids", type=int, nargs="+", default=[1])
+    parser.add_argument("--min_bytes", type=int, default=1024)
+    parser.add_argument("--max_bytes", type=int, default=64*1024)
+    parser.add_argument("--duplicate_ratio", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--replay", help="tab-separated snapshot of `file` rows to replay"
+    )
+    parser.add_argument(
+        "--materialize", action="store_true",
+        help="create sparse files for the replayed rows"
+    )
+    parser.add_argument("--batch_size", type=int, default=100)
+    parser.add_argument("--n_passes", type=float, default=1)
+    parser.add_argument("--n_dags", type=int, default=1)
+    parser.add_argument("--validation_workers", type=int, default=8)
+    parser.add_argument("--check_hash", action="store_true")
+    parser.add_argument(
+        "--lease", type=float, help="claim w/ a lease of this many seconds"
+    )
+    parser.add_argument("--save", help="write the report to this json file")
+    parser.add_argument("--baseline", help="report json to compare against")
+    parser.add_argument("--max_slowdown", type=float, default=0.2)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    main(parser.parse_args())
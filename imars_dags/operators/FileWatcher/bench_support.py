@@ -0,0 +1,244 @@
+"""
+Fixtures & report helpers for the offline FileWatcher benchmark (see
+bench_file_watcher.py). Nothing here needs airflow or imars_etl.
+
+* synthetic file trees w/ matching `file` rows (sizes & duplicate ratio
+    are configurable), or rows replayed from a snapshot of the production
+    `file` table.
+* a sqlite_standin metadata db loaded w/ those rows, whose connections
+    count the db round-trips made through them.
+* latency percentiles & comparison of reports against a baseline.
+"""
+import csv
+from datetime import datetime
+from datetime import timedelta
+import os
+import random
+import shutil
+import threading
+
+from imars_dags.operators.FileWatcher import sqlite_standin
+
+# columns read from snapshots; others are ignored
+SNAPSHOT_COLS = [
+    'id', 'filepath', 'date_time', 'product_id', 'area_id', 'status_id',
+    'n_bytes', 'multihash', 'last_processed', 'proc_counter',
+]
+_INT_COLS = ['id', 'product_id', 'area_id', 'status_id', 'n_bytes',
+             'proc_counter']
+_DATETIME_COLS = ['date_time', 'last_processed']
+TO_LOAD_STATUS_ID = 3
+
+
+def make_file_tree(
+    root, n_files, product_ids=(36,), area_ids=(1,), min_bytes=1024,
+    max_bytes=64*1024, duplicate_ratio=0.0, seed=0,
+    start=datetime(2018, 1, 1)
+):
+    """
+    writes n_files of random bytes under root & returns their `file` rows.
+
+    parameters:
+    -----------
+    duplicate_ratio : float
+        fraction of files that are copies of an earlier file w/ the same
+        product, area, date_time & multihash, ie: duplicates to be caught
+        by check_for_duplicates.
+    seed : int
+        seed for reproducible trees.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_files):
+        filepath = os.path.join(root, "{:08d}.dat".format(i))
+        if len(rows) > 0 and rng.random() < duplicate_ratio:
+            row = dict(rng.choice(rows))
+            shutil.copyfile(row['filepath'], filepath)
+        else:
+            row = {
+                'product_id': rng.choice(product_ids),
+                'area_id': rng.choice(area_ids),
+                'date_time': start + timedelta(minutes=i),
+                'n_bytes': rng.randint(min_bytes, max_bytes),
+                'multihash': "synthetic{:08d}".format(i),
+            }
+            with open(filepath, "wb") as f_obj:
+                f_obj.write(os.urandom(row['n_bytes']))
+        row.update(
+            filepath=filepath, status_id=TO_LOAD_STATUS_ID, proc_counter=0
+        )
+        rows.append(row)
+    return rows
+
+
+def _parse_value(col, value):
+    if value in (None, "NULL", "\\N", ""):
+        return None
+    if col in _INT_COLS:
+        return int(value)
+    if col in _DATETIME_COLS:
+        fmt = "%Y-%m-%d %H:%M:%S.%f" if "." in value else "%Y-%m-%d %H:%M:%S"
+        return datetime.strptime(value, fmt)
+    return value
+
+
+def load_snapshot(path):
+    """
+    returns `file` rows read from a tab-separated snapshot w/ a header row,
+    as written by `mysql --batch`, eg:
+    ```
+    mysql --batch -e "SELECT * FROM file WHERE product_id=36 LIMIT 10000" \
+        imars_metadata > snapshot.tsv
+    ```
+    """
+    with open(path, newline="") as f_obj:
+        return [
+            {
+                col: _parse_value(col, value)
+                for col, value in row.items() if col in SNAPSHOT_COLS
+            }
+            for row in csv.DictReader(f_obj, delimiter="\t")
+        ]
+
+
+def materialize_snapshot(rows, root):
+    """
+    returns copies of rows w/ filepaths moved under root, where sparse
+    files of each row's n_bytes are created so the files can be validated
+    offline.
+    """
+    materialized = []
+    for row in rows:
+        row = dict(row)
+        row['filepath'] = os.path.join(root, row['filepath'].lstrip("/"))
+        os.makedirs(os.path.dirname(row['filepath']), exist_ok=True)
+        with open(row['filepath'], "wb") as f_obj:
+            f_obj.truncate(row['n_bytes'] or 0)
+        materialized.append(row)
+    return materialized
+
+
+def get_area_name(area_id):
+    """short_name given to areas in the benchmark db"""
+    return "area_{}".format(area_id)
+
+
+class RoundTripCounter(object):
+    """thread-safe count of db round-trips by kind"""
+    def __init__(self):
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def count(self, kind, n=1):
+        with self._lock:
+            self.counts[kind] = self.counts.get(kind, 0) + n
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+
+class _CountingCursor(object):
+    def __init__(self, cursor, counter):
+        self._cursor = cursor
+        self._counter = counter
+
+    def execute(self, sql, params=None):
+        self._counter.count("metadata_query")
+        return self._cursor.execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        self._counter.count("metadata_query")
+        return self._cursor.executemany(sql, seq_of_params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class MetadataDB(object):
+    """
+    in-memory sqlite_standin metadata db loaded w/ `file` rows & an `area`
+    row for each area_id. `connect()` stands in for the MySqlHook
+    connection: every call & every query is counted as a round-trip.
+    """
+    def __init__(self, rows, counter=None):
+        self.counter = counter or RoundTripCounter()
+        self._conn = sqlite_standin.connect()
+        sqlite_standin.insert_rows(self._conn, "area", [
+            {'id': area_id, 'short_name': get_area_name(area_id)}
+            for area_id in sorted(set(
+                row['area_id'] for row in rows if row['area_id'] is not None
+            ))
+        ])
+        sqlite_standin.insert_rows(self._conn, "file", rows)
+
+    def connect(self):
+        self.counter.count("metadata_connect")
+        return self
+
+    def cursor(self):
+        return _CountingCursor(self._conn.cursor(), self.counter)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        """the connection is shared by all `connect()` callers"""
+
+    def query(self, sql, params=None):
+        """returns all rows for sql w/o counting a round-trip"""
+        cursor = self._conn.cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+
+
+def percentile(samples, pct):
+    """nearest-rank percentile of samples (0 < pct <= 100)"""
+    ordered = sorted(samples)
+    if len(ordered) < 1:
+        return None
+    rank = max(1, -(-len(ordered) * pct // 100))  # ceil
+    return ordered[int(rank) - 1]
+
+
+def summarize_phases(samples, pcts=(50, 90, 99)):
+    """
+    returns {phase: {'n': count, 'p50_ms': ..., 'max_ms': ...}} for given
+    {phase: [seconds, ...]}.
+    """
+    summary = {}
+    for name, seconds in samples.items():
+        stats = {'n': len(seconds)}
+        for pct in pcts:
+            stats['p{}_ms'.format(pct)] = percentile(seconds, pct) * 1000
+        stats['max_ms'] = max(seconds) * 1000
+        summary[name] = stats
+    return summary
+
+
+def compare_reports(report, baseline, max_slowdown=0.2):
+    """
+    returns list of regressions of report vs baseline (both as returned by
+    bench_file_watcher.run_benchmark): files/s down or db round-trips per
+    file up by more than max_slowdown (a fraction).
+    """
+    regressions = []
+    if report['files_per_s'] < baseline['files_per_s'] * (1 - max_slowdown):
+        regressions.append("files/s dropped from {:.1f} to {:.1f}".format(
+            baseline['files_per_s'], report['files_per_s']
+        ))
+    if report['round_trips_per_file'] > (
+        baseline['round_trips_per_file'] * (1 + max_slowdown)
+    ):
+        regressions.append(
+            "db round-trips per file rose from {:.2f} to {:.2f}".format(
+                baseline['round_trips_per_file'],
+                report['round_trips_per_file']
+            )
+        )
+    return regressions
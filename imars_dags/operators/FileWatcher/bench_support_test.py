@@ -0,0 +1,106 @@
+# std modules:
+from datetime import datetime
+import os
+import tempfile
+from unittest import TestCase
+
+from imars_dags.operators.FileWatcher import bench_support
+
+
+class Test_make_file_tree(TestCase):
+    def test_sizes_and_duplicates(self):
+        """ files match their rows & duplicates share the group key """
+        with tempfile.TemporaryDirectory() as root:
+            rows = bench_support.make_file_tree(
+                root, 50, area_ids=(1, 2), min_bytes=10, max_bytes=20,
+                duplicate_ratio=0.5
+            )
+            self.assertEqual(len(rows), 50)
+            for row in rows:
+                self.assertEqual(
+                    os.path.getsize(row['filepath']), row['n_bytes']
+                )
+            keys = set(
+                (row['product_id'], row['area_id'], row['date_time'])
+                for row in rows
+            )
+            self.assertLess(len(keys), 40)
+
+    def test_reproducible(self):
+        """ same seed gives the same rows """
+        with tempfile.TemporaryDirectory() as root:
+            rows_a = bench_support.make_file_tree(root, 10, seed=3)
+            rows_b = bench_support.make_file_tree(root, 10, seed=3)
+            self.assertEqual(rows_a, rows_b)
+
+
+class Test_snapshot(TestCase):
+    def test_load_and_materialize(self):
+        """ mysql --batch output is parsed & can be made into files """
+        with tempfile.TemporaryDirectory() as root:
+            snapshot = os.path.join(root, "snapshot.tsv")
+            with open(snapshot, "w") as f_obj:
+                f_obj.write(
+                    "id\tfilepath\tdate_time\tproduct_id\tarea_id\t"
+                    "status_id\tn_bytes\tprovenance\n"
+                    "7\t/srv/a.nc\t2018-01-02 03:04:05\t36\t1\tNULL\t100\tx\n"
+                )
+            rows = bench_support.load_snapshot(snapshot)
+            self.assertEqual(rows, [{
+                'id': 7, 'filepath': "/srv/a.nc",
+                'date_time': datetime(2018, 1, 2, 3, 4, 5),
+                'product_id': 36, 'area_id': 1, 'status_id': None,
+                'n_bytes': 100,
+            }])
+            rows = bench_support.materialize_snapshot(
+                rows, os.path.join(root, "files")
+            )
+            self.assertEqual(
+                rows[0]['filepath'], os.path.join(root, "files/srv/a.nc")
+            )
+            self.assertEqual(os.path.getsize(rows[0]['filepath']), 100)
+
+
+class Test_MetadataDB(TestCase):
+    def test_counts_round_trips(self):
+        """ connections & queries are counted; areas are created """
+        metadata_db = bench_support.MetadataDB([
+            {'filepath': "/a", 'product_id': 36, 'area_id': 5},
+        ])
+        conn = metadata_db.connect()
+        cursor = conn.cursor()
+        cursor.execute("SELECT short_name FROM area WHERE id=%s", [5])
+        self.assertEqual(cursor.fetchall(), [("area_5",)])
+        conn.close()
+        self.assertEqual(metadata_db.counter.counts, {
+            'metadata_connect': 1, 'metadata_query': 1,
+        })
+        self.assertEqual(metadata_db.query("SELECT COUNT(*) FROM file"),
+                         [(1,)])
+        self.assertEqual(metadata_db.counter.total, 2)
+
+
+class Test_stats(TestCase):
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual(bench_support.percentile(samples, 50), 50)
+        self.assertEqual(bench_support.percentile(samples, 99), 99)
+        self.assertEqual(bench_support.percentile(samples, 100), 100)
+        self.assertEqual(bench_support.percentile([3], 90), 3)
+        self.assertIsNone(bench_support.percentile([], 50))
+
+    def test_summarize_phases(self):
+        summary = bench_support.summarize_phases({'claim': [0.001, 0.003]})
+        self.assertEqual(summary['claim']['n'], 2)
+        self.assertAlmostEqual(summary['claim']['p50_ms'], 1)
+        self.assertAlmostEqual(summary['claim']['max_ms'], 3)
+
+    def test_compare_reports(self):
+        """ only slowdowns beyond the threshold are regressions """
+        baseline = {'files_per_s': 100, 'round_trips_per_file': 1.0}
+        self.assertEqual(bench_support.compare_reports(
+            {'files_per_s': 90, 'round_trips_per_file': 1.1}, baseline
+        ), [])
+        self.assertEqual(len(bench_support.compare_reports(
+            {'files_per_s': 50, 'round_trips_per_file': 2.0}, baseline
+        )), 2)
@@ -0,0 +1,242 @@
+"""
+Event-driven wake-ups for the FileWatcher.
+
+Rows added to the `file` table (by `imars_etl.load` or anything else) are
+appended to a small `file_changelog` table by db triggers. A long-running
+watcher waits on that log with a cheap indexed `MAX(id)` query every few
+seconds and only runs its (much heavier) claim query when something new
+arrives.
+When the change-log is not installed the watcher falls back to adaptive
+polling: the claim query is re-run at an interval that grows while idle
+and resets when files are found.
+Only the latest id is ever read, so rows older than CHANGELOG_KEEP are
+deleted by prune_changelog at the end of each listen period.
+
+The change-log is installed on the imars_metadata db once, eg:
+```
+python3 -c "from imars_dags.operators.FileWatcher.changelog import *; \
+    print(CHANGELOG_DDL_MYSQL)" | mysql imars_metadata
+```
+"""
+from datetime import datetime
+from datetime import timedelta
+import time
+
+CHANGELOG_TABLE = 'file_changelog'
+# age of change-log rows kept by prune_changelog. Much longer than a listen
+# period so a clock offset between db & worker cannot drop unseen rows.
+CHANGELOG_KEEP = timedelta(days=1)
+# MySQL DDL for the change-log table & triggers filling it.
+# The delimiter is `;;` because the trigger bodies use `;`.
+CHANGELOG_DDL_MYSQL = """
+DELIMITER ;;
+CREATE TABLE IF NOT EXISTS file_changelog (
+    id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    file_id INT NOT NULL,
+    product_id INT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX product_id_idx (product_id, id),
+    INDEX created_at_idx (created_at)
+);;
+CREATE TRIGGER file_changelog_insert AFTER INSERT ON file
+FOR EACH ROW
+    INSERT INTO file_changelog (file_id, product_id)
+    VALUES (NEW.id, NEW.product_id);;
+CREATE TRIGGER file_changelog_to_load AFTER UPDATE ON file
+FOR EACH ROW
+    IF NEW.status_id = 3 AND NOT (OLD.status_id <=> 3) THEN
+        INSERT INTO file_changelog (file_id, product_id)
+        VALUES (NEW.id, NEW.product_id);
+    END IF;;
+DELIMITER ;
+"""
+
+
+def prune_changelog(get_conn, keep=CHANGELOG_KEEP, now=None):
+    """
+    deletes change-log rows older than `keep`. returns number deleted.
+
+    parameters:
+    -----------
+    get_conn : function
+        returns a new DB-API connection to the metadata db (using the
+        `%s` paramstyle).
+    keep : datetime.timedelta
+        age of the rows to keep.
+    now : datetime.datetime
+        current time of the db clock; defaults to the local clock.
+    """
+    if now is None:
+        now = datetime.now()
+    conn = get_conn()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM {} WHERE created_at < %s".format(CHANGELOG_TABLE),
+            (now - keep,)
+        )
+        n_deleted = cursor.rowcount
+        cursor.close()
+        conn.commit()
+    finally:
+        conn.close()
+    return n_deleted
+
+
+class AdaptivePoller(object):
+    """
+    Polling interval that doubles (up to max_interval) each time a poll
+    finds nothing and resets to min_interval when it finds something.
+    """
+    def __init__(self, min_interval=5, max_interval=60, factor=2):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.interval = min_interval
+
+    def record(self, found_work):
+        """updates & returns the interval to wait before the next poll"""
+        if found_work:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(
+                self.interval * self.factor, self.max_interval
+            )
+        return self.interval
+
+
+class ChangeLogListener(object):
+    """
+    Waits for new `file_changelog` rows of given products.
+    If the change-log table cannot be read, `available` is set False and
+    `wait` only sleeps (so callers fall back to plain polling).
+    """
+    def __init__(
+        self, get_conn, product_ids, check_interval=2,
+        clock=time.monotonic, sleep=time.sleep
+    ):
+        """
+        parameters:
+        -----------
+        get_conn : function
+            returns a new DB-API connection to the metadata db (using the
+            `%s` paramstyle). One connection is kept open while waiting.
+        product_ids : int[]
+            products whose changes wake the listener.
+        check_interval : float
+            seconds between reads of the change-log while waiting.
+        """
+        self.get_conn = get_conn
+        self.product_ids = product_ids
+        self.check_interval = check_interval
+        self.clock = clock
+        self.sleep = sleep
+        self.available = True
+        self.last_id = None
+        self._conn = None
+
+    def _latest_id(self):
+        """returns latest change-log id for our products (0 if none)"""
+        if self._conn is None:
+            self._conn = self.get_conn()
+        cursor = self._conn.cursor()
+        try:
+            cursor.execute(
+                "SELECT MAX(id) FROM {} WHERE product_id IN ({})".format(
+                    CHANGELOG_TABLE, ",".join(["%s"] * len(self.product_ids))
+                ),
+                list(self.product_ids)
+            )
+            latest = cursor.fetchone()[0] or 0
+        finally:
+            cursor.close()
+        # end the read transaction so the next read sees new rows
+        self._conn.commit()
+        return latest
+
+    def _check(self):
+        """returns True if there are changes not yet seen"""
+        if not self.available:
+            return False
+        try:
+            latest = self._latest_id()
+        except Exception as err:
+            print("change-log unavailable; polling instead: {}".format(err))
+            self.available = False
+            self.close()
+            return False
+        changed = self.last_id is not None and latest > self.last_id
+        self.last_id = latest
+        return changed
+
+    def start(self):
+        """marks all changes logged so far as seen"""
+        self._check()
+
+    def wait(self, timeout):
+        """
+        blocks until changes not yet seen are logged or timeout seconds
+        pass. Returns True if woken by a change.
+        """
+        end = self.clock() + timeout
+        if self._check():  # logged while we were busy
+            return True
+        while self.clock() < end:
+            self.sleep(max(0, min(self.check_interval, end - self.clock())))
+            if self._check():
+                return True
+        return False
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def run_event_loop(
+    process_batch, listener, poller, duration, batch_size,
+    clock=time.monotonic
+):
+    """
+    Calls process_batch until duration seconds have passed. A full batch
+    that changed some files means more files are waiting so the next batch
+    starts right away; otherwise waits on listener for up to the poller's
+    interval. (Files that were only re-checked stay claimable, so a full
+    batch of them is not a backlog.)
+
+    parameters:
+    -----------
+    process_batch : function
+        processes one batch of files; returns (number of files claimed,
+        number of those whose state changed).
+    listener : ChangeLogListener
+    poller : AdaptivePoller
+    duration : float
+        seconds to run for. No batch is started after this.
+    batch_size : int
+        max files claimed by one call of process_batch.
+
+    returns
+    -------
+    (number of batches run, total files claimed)
+    """
+    end = clock() + duration
+    n_batches = 0
+    n_files = 0
+    listener.start()
+    try:
+        while clock() < end:
+            n_claimed, n_changed = process_batch()
+            n_batches += 1
+            n_files += n_claimed
+            if n_claimed >= batch_size and n_changed > 0:
+                continue
+            interval = poller.record(n_changed > 0)
+            remaining = end - clock()
+            if remaining <= 0:
+                break
+            if listener.wait(min(interval, remaining)):
+                poller.record(True)
+    finally:
+        listener.close()
+    return n_batches, n_files
@@ -0,0 +1,143 @@
+# std modules:
+from datetime import datetime
+from datetime import timedelta
+import sqlite3
+from unittest import TestCase
+
+from imars_dags.operators.FileWatcher.changelog import AdaptivePoller
+from imars_dags.operators.FileWatcher.changelog import ChangeLogListener
+from imars_dags.operators.FileWatcher.changelog import prune_changelog
+from imars_dags.operators.FileWatcher.changelog import run_event_loop
+from imars_dags.util.testing import FakeClock
+from imars_dags.util.testing import MetadataDBTestCase
+
+
+class Test_AdaptivePoller(TestCase):
+    def test_backoff_and_reset(self):
+        """ interval grows while idle up to max & resets on work """
+        poller = AdaptivePoller(min_interval=1, max_interval=5)
+        self.assertEqual(
+            [poller.record(False) for _ in range(4)], [2, 4, 5, 5]
+        )
+        self.assertEqual(poller.record(True), 1)
+
+
+class Test_ChangeLogListener(MetadataDBTestCase):
+    def insert_file(self, product_id, status_id=3):
+        self.insert_rows("file", [{
+            "filepath": "/f", "product_id": product_id,
+            "status_id": status_id,
+        }])
+
+    def get_listener(self, clock):
+        return ChangeLogListener(
+            self.get_conn, [11], check_interval=1,
+            clock=clock.clock, sleep=clock.sleep
+        )
+
+    def test_wakes_on_insert(self):
+        """ wait returns soon after a file of our product is added """
+        self.insert_file(11)  # before start; already seen
+        clock = FakeClock(
+            on_sleep=lambda n: n == 3 and self.insert_file(11)
+        )
+        listener = self.get_listener(clock)
+        listener.start()
+        self.assertTrue(listener.wait(60))
+        self.assertEqual(clock.now, 3)
+
+    def test_ignores_other_products(self):
+        """ wait times out if only other products change """
+        clock = FakeClock(on_sleep=lambda n: self.insert_file(36))
+        listener = self.get_listener(clock)
+        listener.start()
+        self.assertFalse(listener.wait(10))
+        self.assertEqual(clock.now, 10)
+
+    def test_status_reset_to_load(self):
+        """ files set back to to_load are logged """
+        self.insert_file(11, status_id=1)
+        listener = self.get_listener(FakeClock())
+        listener.start()
+        cursor = self.conn.cursor()
+        cursor.execute("UPDATE file SET status_id=3 WHERE id=1")
+        self.conn.commit()
+        self.assertTrue(listener.wait(0))
+
+    def test_falls_back_to_sleep(self):
+        """ missing change-log table means waits just sleep """
+        clock = FakeClock()
+        listener = ChangeLogListener(
+            lambda: sqlite3.connect(":memory:"), [11],
+            clock=clock.clock, sleep=clock.sleep
+        )
+        listener.start()
+        self.assertFalse(listener.available)
+        self.assertFalse(listener.wait(30))
+        self.assertEqual(clock.now, 30)
+
+
+class Test_run_event_loop(TestCase):
+    def test_backlog_then_idle(self):
+        """ full batches run back-to-back; idle batches back off """
+        clock = FakeClock()
+        claims = iter([(10, 10), (10, 1), (3, 3)] + [(0, 0)] * 100)
+
+        class FakeListener(object):
+            def start(self):
+                pass
+
+            def wait(self, timeout):
+                clock.sleep(timeout)
+                return False
+
+            def close(self):
+                pass
+
+        n_batches, n_files = run_event_loop(
+            lambda: next(claims), FakeListener(),
+            AdaptivePoller(min_interval=1, max_interval=8), duration=30,
+            batch_size=10, clock=clock.clock
+        )
+        self.assertEqual(n_files, 23)
+        # 3 w/o waits, then waits of 1 (3 files), 2, 4, 8, 8, 8 ...
+        self.assertEqual(n_batches, 8)
+
+    def test_unchanged_full_batches_wait(self):
+        """ re-checking files that stay claimable is not a backlog """
+        clock = FakeClock()
+
+        class FakeListener(object):
+            def start(self):
+                pass
+
+            def wait(self, timeout):
+                clock.sleep(timeout)
+                return False
+
+            def close(self):
+                pass
+
+        n_batches, _ = run_event_loop(
+            lambda: (10, 0), FakeListener(),
+            AdaptivePoller(min_interval=1, max_interval=8), duration=30,
+            batch_size=10, clock=clock.clock
+        )
+        # waits of 2, 4, 8, 8, 8 instead of back-to-back batches
+        self.assertEqual(n_batches, 5)
+
+
+class Test_prune_changelog(MetadataDBTestCase):
+    def test_prunes_old_rows(self):
+        """ only rows older than `keep` are deleted """
+        self.insert_rows("file", [{"filepath": "/f", "product_id": 11}] * 2)
+        self.conn.execute(
+            "UPDATE file_changelog SET created_at='2019-01-01 00:00:00' "
+            "WHERE id=1"
+        )
+        self.conn.commit()
+        self.assertEqual(prune_changelog(
+            self.get_conn, keep=timedelta(days=1),
+            now=datetime(2019, 1, 2, 12)
+        ), 1)
+        self.assertEqual(self.select("SELECT id FROM file_changelog"), [(2,)])
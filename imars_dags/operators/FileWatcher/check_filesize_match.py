@@ -1,12 +1,18 @@
 from os import stat
 
 
-def check_filesize_match(f_meta):
-    """ verify filesize matches size in DB """
+def check_filesize_match(f_meta, f_stat=None):
+    """
+    verify filesize matches size in DB.
+    f_stat is an optional `os.stat` result for the file to avoid another
+    stat call.
+    """
     NONE_VALUES = [None, 'None', "NA", ""]
     try:
         db_size = f_meta['n_bytes']
-        f_size = stat(f_meta['filepath']).st_size
+        if f_stat is None:
+            f_stat = stat(f_meta['filepath'])
+        f_size = f_stat.st_size
         DIFF_THRESHOLD = 0.05 * int(db_size)  # assume +/- 5%
         if db_size in NONE_VALUES or f_size in NONE_VALUES:
             print(
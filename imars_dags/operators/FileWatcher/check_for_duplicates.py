@@ -4,10 +4,83 @@ import difflib
 
 import imars_etl
 
+from imars_dags.operators.FileWatcher.nitf_fingerprint \
+    import IndexUnavailable
+from imars_dags.operators.FileWatcher.nitf_fingerprint \
+    import nitf_fingerprint
+from imars_dags.operators.FileWatcher.nitf_fingerprint \
+    import NitfFingerprintIndex
+from imars_dags.operators.FileWatcher.nitf_header import VOLATILE_FIELDS
+
 NITF_PRODUCT_IDS = [11, 24]  # TODO: add wv3 products
+# header fields that may differ between NITF-synonyms
+NITF_SYNONYM_DIFFS = VOLATILE_FIELDS
+_FINGERPRINT_INDEX = None  # opened on first use & shared by all threads
+
+
+def _get_fingerprint_index():
+    global _FINGERPRINT_INDEX
+    if _FINGERPRINT_INDEX is None:
+        _FINGERPRINT_INDEX = NitfFingerprintIndex()
+    return _FINGERPRINT_INDEX
+
+
+def prepare_fingerprints(f_metas, duplicate_index=None):
+    """
+    returns FingerprintBatch w/ the indexed fingerprints of the NITF files
+    in f_metas & of the files in their duplicate groups, read w/ a single
+    query. None if there are no NITF files or the index cannot be read;
+    check_for_duplicates then fingerprints the files directly.
+    """
+    file_ids = set()
+    for file_meta in f_metas:
+        if not _is_nitf_prod_id(file_meta['product_id']):
+            continue
+        file_ids.add(file_meta['id'])
+        if duplicate_index is not None:
+            file_ids.update(
+                row[2] for row in duplicate_index.get_group(file_meta)
+            )
+    if len(file_ids) < 1:
+        return None
+    try:
+        return _get_fingerprint_index().get_batch(sorted(file_ids))
+    except IndexUnavailable as err:
+        print("NITF fingerprint index unavailable: {}".format(err))
+        return None
+
+
+def store_fingerprints(fingerprints):
+    """
+    stores the fingerprints computed during a batch.
+    returns the number stored.
+    """
+    if fingerprints is None:
+        return 0
+    try:
+        return fingerprints.flush()
+    except IndexUnavailable as err:
+        print("cannot store NITF fingerprints: {}".format(err))
+        return 0
+
+
+def _get_fingerprint(fingerprints, file_id, filepath, f_stat=None):
+    """
+    returns fingerprint of a file from the batch or, w/o a batch, from the
+    file itself. None if it cannot be fingerprinted.
+    """
+    try:
+        if fingerprints is None:
+            return nitf_fingerprint(filepath)
+        return fingerprints.get_fingerprint(file_id, filepath, f_stat)
+    except (OSError, ValueError) as err:
+        print("cannot fingerprint NITF: {}".format(err))
+        return None
 
 
-def check_for_duplicates(file_meta):
+def check_for_duplicates(
+    file_meta, duplicate_index=None, f_stat=None, fingerprints=None
+):
     """
     Checks for duplicate entries files in the database
     and tries to resolve the conflict.
@@ -15,31 +88,44 @@ def check_for_duplicates(file_meta):
     Duplicate entries is defined as files with identical
     area_d, date_time, and product_id.
 
+    parameters:
+    -----------
+    file_meta : dict
+        file row to check.
+    duplicate_index : DuplicateGroupIndex
+        refreshed index of duplicate groups. If given, files not in a
+        duplicate group are cleared without querying the db.
+    f_stat : os.stat_result
+        stat of the file if already known.
+    fingerprints : FingerprintBatch
+        NITF fingerprints of the batch (see prepare_fingerprints). If None
+        NITF files are fingerprinted directly.
+
     returns
     -------
     True if duplicate is successfully removed,
     False if no duplication found.
     """
-    # use the query from the airflow extract
-    #   and compare the (two) results?
-    sql_selection = """
-        WHERE
-        product_id={pid} AND
-            date_time='{dt}' AND
-            area_id={aid}
-        ORDER BY last_processed
-    """.format(
-        pid=file_meta['product_id'],  # 30
-        dt=file_meta['date_time'],  # 2016-07-27T16:00:59.016650+00:00
-        aid=file_meta['area_id']  # 9
-    )
+    fingerprint = None
+    if _is_nitf_prod_id(file_meta['product_id']) and fingerprints is not None:
+        # index the fingerprint on first validation so it is ready for
+        # later duplicate checks & archive-wide reports.
+        fingerprint = _get_fingerprint(
+            fingerprints, file_meta['id'], file_meta['filepath'], f_stat
+        )
 
-    result = imars_etl.select(
-        cols="filepath,multihash",
-        sql=sql_selection
-    )
     fpath_i = 0
     mhash_i = 1
+    id_i = 2
+    result = []
+    if duplicate_index is not None:
+        result = duplicate_index.get_group(file_meta)
+        if len(result) < 1:
+            print("No duplicate group in index and all is well.")
+            return False
+    if file_meta['filepath'] not in [row[fpath_i] for row in result]:
+        # no index or index is stale: use the query from the airflow extract
+        result = _select_duplicates(file_meta)
 
     print("--- result " + "-"*50)
     print(result)
@@ -50,38 +136,24 @@ def check_for_duplicates(file_meta):
     elif len(result) == 1:
         print("One result and all is well.")
         return False
-
-    result = list(result)  # convert tuple to list so it is mutable
-
-    # remove results until we get down to 2
-    row_n = 0
-    while len(result) > 2:
+    elif len(result) > 2:
         print("WARN: {} identical files!".format(len(result)))
-        if file_meta['filepath'] != result[row_n][fpath_i]:
-            del result[row_n]
-            # row_n was implicitly incremented b/c we deleted an item
-        else:
-            row_n += 1
-
-    keepfile_meta, delfile_meta = result
-    keepfile_path = keepfile_meta[fpath_i]
-    delfile_path = delfile_meta[fpath_i]
 
-    if file_meta['filepath'] == delfile_path:
-        pass
-    elif file_meta['filepath'] == keepfile_path:
-        # swap this file is always delfile
-        delfile_meta, keepfile_meta = result
-        keepfile_path = keepfile_meta[fpath_i]
-        delfile_path = delfile_meta[fpath_i]
-    else:
+    # this file is always delfile; keep the most recently processed other
+    others = [row for row in result if row[fpath_i] != file_meta['filepath']]
+    if len(others) == len(result):
         raise AssertionError(
             "This fpath should be in result!\n" +
-            "!!! fpath '{}' not in ['{}', '{}']".format(
-                file_meta['filepath'],
-                keepfile_path, delfile_path
+            "!!! fpath '{}' not in {}".format(
+                file_meta['filepath'], [row[fpath_i] for row in result]
             )
         )
+    keepfile_meta = others[-1]
+    delfile_meta = [
+        row for row in result if row[fpath_i] == file_meta['filepath']
+    ][0]
+    keepfile_path = keepfile_meta[fpath_i]
+    delfile_path = delfile_meta[fpath_i]
 
     if (keepfile_meta[mhash_i] == delfile_meta[mhash_i]):
         print("duplicate entries are an exact match.")
@@ -89,7 +161,13 @@ def check_for_duplicates(file_meta):
         return True
     elif (
         _is_nitf_prod_id(file_meta['product_id']) and
-        _nitf_files_are_synonyms(keepfile_path, delfile_path)
+        _nitf_files_are_synonyms(
+            keepfile_path, delfile_path,
+            _get_fingerprint(fingerprints, keepfile_meta[id_i], keepfile_path),
+            fingerprint or _get_fingerprint(
+                fingerprints, file_meta['id'], delfile_path, f_stat
+            )
+        )
     ):
         print("duplicate entries are NITF-synonyms")
         _handle_duplicate_entries(keepfile_path, delfile_path)
@@ -102,14 +180,40 @@ def check_for_duplicates(file_meta):
         return False
 
 
+def _select_duplicates(file_meta):
+    """returns (filepath, multihash, id) of rows sharing file_meta's key"""
+    sql_selection = """
+        WHERE
+        product_id={pid} AND
+            date_time='{dt}' AND
+            area_id={aid}
+        ORDER BY last_processed
+    """.format(
+        pid=file_meta['product_id'],  # 30
+        dt=file_meta['date_time'],  # 2016-07-27T16:00:59.016650+00:00
+        aid=file_meta['area_id']  # 9
+    )
+    return list(imars_etl.select(
+        cols="filepath,multihash,id",
+        sql=sql_selection
+    ))
+
+
 def _is_nitf_prod_id(prod_id):
     return prod_id in NITF_PRODUCT_IDS
 
 
 def gdalinfo(filepath):
-    res = subprocess.check_output("gdalinfo {}".format(filepath), shell=True)
-    if type(res) != str:
-        print("ERROR: gdalinfo output is not string:\n\t{}".format(res))
+    """
+    !!! DEPRECATED !!!
+    use nitf_header.read_nitf_header instead
+
+    returns gdalinfo output for the file as str.
+    Raises subprocess.CalledProcessError if gdalinfo fails.
+    """
+    return subprocess.check_output(
+        ["gdalinfo", filepath]
+    ).decode("utf-8", errors="replace")
 
 
 def same_filesize(filepath1, filepath2):
@@ -122,18 +226,23 @@ def same_filesize(filepath1, filepath2):
 
 
 def synonymous_gdalinfo(filepath1, filepath2):
-    """ returns true if files have "synonymous" gdalinfo output """
+    """
+    !!! DEPRECATED !!!
+    returns true if files have "synonymous" gdalinfo output.
+    Used only for NITF versions that nitf_fingerprint cannot read.
+    """
     print("comparing gdalinfo on files:\n\t{}\n\t{}".format(
         filepath1, filepath2
     ))
     info_1 = gdalinfo(filepath1)
     info_2 = gdalinfo(filepath2)
+    if len(info_1.strip()) < 1 or len(info_2.strip()) < 1:
+        print("no gdalinfo output to compare")
+        return False
 
-    ACCEPTABLE_DIFFS = [
-        'NITF_FDT', 'NITF_FTITLE', 'NITF_IID2'
-    ]
+    ACCEPTABLE_DIFFS = NITF_SYNONYM_DIFFS
     n = 0
-    for s in difflib.ndiff([info_1], [info_2]):
+    for s in difflib.ndiff(info_1.splitlines(), info_2.splitlines()):
         print("{} | {}".format(n, s))
         n += 1
         if s[0] == ' ':  # skip blank lines
@@ -156,7 +265,9 @@ def synonymous_gdalinfo(filepath1, filepath2):
         return True
 
 
-def _nitf_files_are_synonyms(filepath1, filepath2):
+def _nitf_files_are_synonyms(
+    filepath1, filepath2, fingerprint1=None, fingerprint2=None
+):
     """
     returns true if the two files have "synonymous" content.
 
@@ -165,10 +276,13 @@ def _nitf_files_are_synonyms(filepath1, filepath2):
     hash.
     So we define "NITF-synonyms" by the criteria:
         1. files are (very nearly) the same size
-        2. metadata dumped using `gdalinfo` differs only in the following vars:
+        2. file & image subheaders differ only in the following fields:
             * NITF_FDT
             * NITF_FTITLE
             * NITF_IID2
+    (2) is checked by comparing the files' indexed fingerprints (see
+    nitf_fingerprint) or, if either could not be fingerprinted, their
+    gdalinfo output.
 
     assumptions:
     ------------
@@ -179,10 +293,15 @@ def _nitf_files_are_synonyms(filepath1, filepath2):
     if not same_filesize(filepath1, filepath2):
         return False
 
-    # gdalinfo the files
-    if synonymous_gdalinfo(filepath1, filepath2):
-        return True
-    else:
+    # compare the header fingerprints
+    if fingerprint1 is not None and fingerprint2 is not None:
+        return fingerprint1 == fingerprint2
+    try:
+        return synonymous_gdalinfo(filepath1, filepath2)
+    except (OSError, subprocess.CalledProcessError) as err:
+        print("cannot compare w/ gdalinfo; assuming not synonyms: {}".format(
+            err
+        ))
         return False
 
 
@@ -1,9 +1,19 @@
 # std modules:
+import os
+import subprocess
 from unittest import TestCase
 from unittest.mock import patch
 
+from imars_dags.operators.FileWatcher import check_for_duplicates
+from imars_dags.operators.FileWatcher import nitf_fingerprint
+from imars_dags.operators.FileWatcher.check_for_duplicates \
+    import _nitf_files_are_synonyms
 from imars_dags.operators.FileWatcher.check_for_duplicates \
     import synonymous_gdalinfo
+from imars_dags.operators.FileWatcher.duplicate_index \
+    import DuplicateGroupIndex
+from imars_dags.operators.FileWatcher.nitf_fingerprint_test \
+    import NitfTestCase
 
 
 class Test_synonymous_gdalinfo(TestCase):
@@ -35,3 +45,111 @@ class Test_synonymous_gdalinfo(TestCase):
             'a different string w/ multiple\n    lines'
         ]
         self.assertEqual(synonymous_gdalinfo('f1', 'f2'), False)
+
+
+@patch.object(check_for_duplicates, 'same_filesize', lambda f1, f2: True)
+class Test_nitf_files_are_synonyms(TestCase):
+    def test_fingerprints(self):
+        self.assertEqual(_nitf_files_are_synonyms('f1', 'f2', 'a', 'a'), True)
+        self.assertEqual(
+            _nitf_files_are_synonyms('f1', 'f2', 'a', 'b'), False
+        )
+
+    @patch('imars_dags.operators.FileWatcher.check_for_duplicates.gdalinfo')
+    def test_gdalinfo_fails(self, mock_gdalinfo):
+        """ files no tool can read are not synonyms """
+        mock_gdalinfo.side_effect = subprocess.CalledProcessError(
+            1, ["gdalinfo", "f1"]
+        )
+        self.assertEqual(_nitf_files_are_synonyms('f1', 'f2'), False)
+
+    @patch('imars_dags.operators.FileWatcher.check_for_duplicates.gdalinfo')
+    def test_no_gdalinfo_output(self, mock_gdalinfo):
+        mock_gdalinfo.return_value = ''
+        self.assertEqual(_nitf_files_are_synonyms('f1', 'f2'), False)
+
+    @patch('imars_dags.operators.FileWatcher.check_for_duplicates.gdalinfo')
+    def test_gdalinfo_synonyms(self, mock_gdalinfo):
+        mock_gdalinfo.side_effect = [
+            'Driver: NITF\n  NITF_FDT=20190207231221\n  NITF_IREP=MULTI',
+            'Driver: NITF\n  NITF_FDT=20190103163752\n  NITF_IREP=MULTI',
+        ]
+        self.assertEqual(_nitf_files_are_synonyms('f1', 'f2'), True)
+
+
+class Test_check_for_duplicates(NitfTestCase):
+    def setUp(self):
+        super(Test_check_for_duplicates, self).setUp()
+        patcher = patch.object(
+            check_for_duplicates, '_FINGERPRINT_INDEX', self.index
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def check(self, row, f_stat=None):
+        duplicate_index = DuplicateGroupIndex(self.get_conn)
+        duplicate_index.refresh()
+        fingerprints = check_for_duplicates.prepare_fingerprints(
+            [row], duplicate_index
+        )
+        try:
+            return check_for_duplicates.check_for_duplicates(
+                row, duplicate_index, f_stat, fingerprints
+            )
+        finally:
+            check_for_duplicates.store_fingerprints(fingerprints)
+
+    def test_synonyms_use_indexed_fingerprints(self):
+        """ the kept file's fingerprint is read from the index """
+        keep = self.write_nitf("a.ntf")
+        self.assertEqual(self.check(keep), False)
+        delete = self.write_nitf(
+            "b.ntf", fdt="20190103163752", ftitle="other.NTF", iid2="other"
+        )
+        with patch.object(
+            nitf_fingerprint, 'nitf_fingerprint',
+            wraps=nitf_fingerprint.nitf_fingerprint
+        ) as mock_fingerprint:
+            with self.assertRaises(NotImplementedError):  # handled manually
+                self.check(delete)
+        mock_fingerprint.assert_called_once_with(delete['filepath'])
+
+    def test_different_images(self):
+        self.write_nitf("a.ntf")
+        different = self.write_nitf("b.ntf", ostaid="other")
+        self.assertEqual(self.check(different), False)
+
+    def test_batch_uses_two_connections(self):
+        """ fingerprints are read & written once per batch """
+        rows = [self.write_nitf("{}.ntf".format(i)) for i in range(3)]
+        n_conns = self.n_conns
+        fingerprints = check_for_duplicates.prepare_fingerprints(rows)
+        for row in rows:
+            fingerprints.get_fingerprint(row['id'], row['filepath'])
+        self.assertEqual(check_for_duplicates.store_fingerprints(
+            fingerprints
+        ), 3)
+        self.assertEqual(self.n_conns - n_conns, 2)
+        self.assertEqual(len(self.index.get_indexed([1, 2, 3])), 3)
+
+    def test_f_stat_is_used(self):
+        keep = self.write_nitf("a.ntf")
+        self.check(keep)
+        f_stat = os.stat(keep['filepath'])
+        with patch.object(nitf_fingerprint.os, 'stat') as mock_stat:
+            self.check(keep, f_stat)
+        mock_stat.assert_not_called()
+
+    def test_missing_index_falls_back(self):
+        """ w/o the fingerprint table files are fingerprinted directly """
+        self.conn.execute("DROP TABLE nitf_fingerprint")
+        self.write_nitf("a.ntf")
+        delete = self.write_nitf(
+            "b.ntf", fdt="20190103163752", ftitle="other.NTF", iid2="other"
+        )
+        with patch.object(
+            check_for_duplicates, 'synonymous_gdalinfo'
+        ) as mock_gdalinfo:
+            with self.assertRaises(NotImplementedError):
+                self.check(delete)
+        mock_gdalinfo.assert_not_called()
@@ -1,6 +1,14 @@
 import os
+import stat
 
 
-def check_locally_accessible(file_meta):
-    # ensure accessible at local
-    assert os.path.isfile(file_meta['filepath'])
+def check_locally_accessible(file_meta, f_stat=None):
+    """
+    ensure accessible at local.
+    f_stat is an optional `os.stat` result for the file to avoid another
+    stat call; None means stat the file here.
+    """
+    if f_stat is None:
+        assert os.path.isfile(file_meta['filepath'])
+    else:
+        assert stat.S_ISREG(f_stat.st_mode)
@@ -0,0 +1,47 @@
+import threading
+
+from imars_dags.operators.FileWatcher.multihash import get_multihash
+from imars_dags.operators.FileWatcher.multihash import MultihashCache
+
+_CACHE = None  # opened on first use & shared by all threads
+_CACHE_LOCK = threading.Lock()
+
+
+def _is_multihash(value):
+    """True if value looks like a CIDv0 multihash (not a placeholder)"""
+    return (
+        isinstance(value, str) and len(value) == 46 and value.startswith("Qm")
+    )
+
+
+def _get_cache():
+    global _CACHE
+    with _CACHE_LOCK:  # validations run on a thread pool
+        if _CACHE is None:
+            _CACHE = MultihashCache()
+    return _CACHE
+
+
+def check_multihash(file_meta, f_stat=None, deadline=None):
+    """
+    Computes IPFS-compatible multihash of the file & verifies it matches
+    the one in the DB (if the DB has one).
+    This does not add the file to IPFS.
+    Raises ValueError if the hashes differ & TimeoutError if the file is
+    still being hashed at deadline (a `time.monotonic()` value).
+
+    returns
+    -------
+    the multihash of the file
+    """
+    old_hash = file_meta["multihash"]
+    new_hash = get_multihash(
+        file_meta['filepath'], f_stat, cache=_get_cache(), deadline=deadline
+    )
+    if _is_multihash(old_hash) and old_hash != new_hash:
+        raise ValueError(
+            "file hash does not match db!\n\tdb_hash:{}\n\tactual:{}".format(
+                old_hash, new_hash
+            )
+        )
+    return new_hash
@@ -0,0 +1,39 @@
+# std modules:
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from imars_dags.operators.FileWatcher import check_multihash as module
+from imars_dags.operators.FileWatcher.check_multihash import check_multihash
+from imars_dags.operators.FileWatcher.multihash import MultihashCache
+
+HELLO_HASH = 'QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o'
+
+
+class Test_check_multihash(TestCase):
+    def setUp(self):
+        self.tmp_file = tempfile.NamedTemporaryFile()
+        self.addCleanup(self.tmp_file.close)
+        self.tmp_file.write(b'hello world\n')
+        self.tmp_file.flush()
+        patcher = patch.object(module, '_CACHE', MultihashCache(":memory:"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def check(self, db_hash):
+        return check_multihash({
+            'filepath': self.tmp_file.name, 'multihash': db_hash
+        })
+
+    def test_matching_hash(self):
+        self.assertEqual(self.check(HELLO_HASH), HELLO_HASH)
+
+    def test_placeholder_is_replaced(self):
+        """ values that are not multihashes (eg: the filepath) are not
+        compared """
+        self.assertEqual(self.check(None), HELLO_HASH)
+        self.assertEqual(self.check(self.tmp_file.name), HELLO_HASH)
+
+    def test_mismatch(self):
+        with self.assertRaises(ValueError):
+            self.check('QmbFMke1KXqnYyBBWxB74N4c5SBnJMVAiMNRcGu6x1AwQH')
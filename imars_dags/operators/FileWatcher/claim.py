@@ -0,0 +1,146 @@
+"""
+Lease-based claiming of `file` rows so several FileWatcher tasks can work
+on the same products at once without triggering DAGs twice.
+
+A claim sets `claimed_by` to a random token and `claim_expires` to the end
+of the lease. Candidate rows are selected without locks, then claimed with
+a conditional UPDATE that only succeeds for rows whose lease is free or
+expired; the rows that UPDATE won are read back by token. The operator
+releases all rows of a token w/ `release_claims` once the batch is done
+(incl. rows not reached within the time budget); if the task is killed
+first they are released when the lease runs out.
+
+Watchers can also be sharded by id (`id % n_shards = shard`) so parallel
+watchers rarely compete for the same candidates.
+
+The lease columns are added to the imars_metadata db once, eg:
+```
+python3 -c "from imars_dags.operators.FileWatcher.claim import *; \
+    print(CLAIM_DDL_MYSQL)" | mysql imars_metadata
+```
+"""
+from datetime import datetime
+import uuid
+
+from imars_dags.operators.FileWatcher.routing import DEFAULT_ORDER_BY
+from imars_dags.operators.FileWatcher.routing import select_round_robin
+
+CLAIM_DDL_MYSQL = """
+ALTER TABLE file
+    ADD COLUMN claimed_by CHAR(32) NULL DEFAULT NULL,
+    ADD COLUMN claim_expires DATETIME NULL DEFAULT NULL,
+    ADD INDEX claimed_by_idx (claimed_by);
+"""
+# lease is free when never claimed, released or expired
+_LEASE_FREE_SQL = "(claim_expires IS NULL OR claim_expires < %s)"
+
+
+def get_shard_selection(shard):
+    """
+    returns sql selecting rows of given (shard_n, n_shards) or "" if shard
+    is None.
+    """
+    if shard is None:
+        return ""
+    shard_n, n_shards = shard
+    if not 0 <= shard_n < n_shards:
+        raise ValueError("invalid shard {}".format(shard))
+    return " AND id %% {} = {}".format(int(n_shards), int(shard_n))
+
+
+def claim_files(
+    get_conn, selections, cols, batch_size, lease_seconds, shard=None,
+    order_by=DEFAULT_ORDER_BY, now=None, params=(), scheduler=None,
+    keys=None
+):
+    """
+    Claims up to batch_size rows matching selections for lease_seconds.
+    Candidates are taken round-robin from each selection (see routing.py).
+
+    parameters:
+    -----------
+    get_conn : function
+        returns a new DB-API connection to the metadata db (using the `%s`
+        paramstyle).
+    selections : str[]
+        WHERE clauses (without "WHERE") selecting rows to process, eg: one
+        per product. Must not contain `%` except as `%%`.
+    cols : str[]
+        columns to return for each claimed row; must include `id`.
+    shard : (int, int)
+        (shard_n, n_shards) to only claim rows w/ `id % n_shards = shard_n`.
+    params : tuple
+        parameters of each selection (the same for all).
+    scheduler, keys :
+        order candidates w/ a scheduler instead of round-robin.
+        See routing.interleave.
+
+    returns
+    -------
+    (token, rows) where rows is a list of dicts of cols for each row
+    claimed, in round-robin order.
+    """
+    now = now or datetime.now()
+    expires = datetime.fromtimestamp(now.timestamp() + lease_seconds)
+    token = uuid.uuid4().hex
+    selections = [
+        "({}) AND {}{}".format(
+            selection, _LEASE_FREE_SQL, get_shard_selection(shard)
+        )
+        for selection in selections
+    ]
+    conn = get_conn()
+    try:
+        cursor = conn.cursor()
+        candidate_ids = [
+            row['id'] for row in select_round_robin(
+                cursor, selections, ['id'], batch_size,
+                tuple(params) + (now,), order_by, scheduler, keys
+            )
+        ]
+        rows = []
+        if len(candidate_ids) > 0:
+            # the lease condition is re-checked on the locked rows, so only
+            # one of several concurrent claims on a row can succeed.
+            cursor.execute(
+                "UPDATE file SET claimed_by=%s, claim_expires=%s "
+                "WHERE id IN ({}) AND {}".format(
+                    ",".join(["%s"] * len(candidate_ids)), _LEASE_FREE_SQL
+                ),
+                [token, expires] + candidate_ids + [now]
+            )
+            conn.commit()
+            cursor.execute(
+                "SELECT {} FROM file WHERE claimed_by=%s".format(
+                    ",".join(cols)
+                ),
+                (token,)
+            )
+            rows = [dict(zip(cols, row)) for row in cursor.fetchall()]
+            rows.sort(key=lambda row: candidate_ids.index(row['id']))
+        cursor.close()
+    finally:
+        conn.close()
+    if len(rows) < len(candidate_ids):
+        print("{} of {} candidate files were claimed by others.".format(
+            len(candidate_ids) - len(rows), len(candidate_ids)
+        ))
+    return token, rows
+
+
+def release_claims(get_conn, token):
+    """releases all rows still claimed w/ token. returns number released."""
+    conn = get_conn()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE file SET claimed_by=NULL, claim_expires=NULL "
+            "WHERE claimed_by=%s",
+            (token,)
+        )
+        n_released = cursor.rowcount
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+    return n_released
@@ -0,0 +1,58 @@
+# std modules:
+from datetime import datetime
+
+from imars_dags.operators.FileWatcher.claim import claim_files
+from imars_dags.operators.FileWatcher.claim import release_claims
+from imars_dags.util.testing import MetadataDBTestCase
+
+NOW = datetime(2019, 3, 1, 12)
+COLS = ['id', 'filepath']
+
+
+class Test_claim_files(MetadataDBTestCase):
+    def setUp(self):
+        super(Test_claim_files, self).setUp()
+        self.insert_rows("file", [
+            {"filepath": "/f/{}".format(i), "status_id": 3,
+             "proc_counter": i}
+            for i in range(1, 7)
+        ])
+
+    def claim(self, batch_size=3, now=NOW, **kwargs):
+        return claim_files(
+            self.get_conn, ["status_id=3"], COLS, batch_size, 60, now=now,
+            **kwargs
+        )
+
+    def ids(self, rows):
+        return [row['id'] for row in rows]
+
+    def test_concurrent_claims_do_not_overlap(self):
+        """ a second watcher gets the next rows, not the claimed ones """
+        _, rows_1 = self.claim()
+        _, rows_2 = self.claim()
+        _, rows_3 = self.claim()
+        self.assertEqual(self.ids(rows_1), [1, 2, 3])
+        self.assertEqual(self.ids(rows_2), [4, 5, 6])
+        self.assertEqual(rows_3, [])
+
+    def test_release_and_expiry(self):
+        """ rows can be claimed again once released or expired """
+        token, _ = self.claim()
+        self.claim()
+        self.assertEqual(release_claims(self.get_conn, token), 3)
+        _, rows = self.claim(batch_size=10)
+        self.assertEqual(self.ids(rows), [1, 2, 3])
+        _, rows = self.claim(
+            batch_size=10, now=datetime(2019, 3, 1, 12, 1, 1)
+        )
+        self.assertEqual(self.ids(rows), [1, 2, 3, 4, 5, 6])
+
+    def test_shards(self):
+        """ shards split rows by id """
+        _, rows_0 = self.claim(batch_size=10, shard=(0, 2))
+        _, rows_1 = self.claim(batch_size=10, shard=(1, 2))
+        self.assertEqual(self.ids(rows_0), [2, 4, 6])
+        self.assertEqual(self.ids(rows_1), [1, 3, 5])
+        with self.assertRaises(ValueError):
+            self.claim(shard=(2, 2))
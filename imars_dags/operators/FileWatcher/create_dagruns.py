@@ -0,0 +1,115 @@
+"""
+Bulk DagRun creation for the FileWatcher.
+
+All (dag_id, execution_date) pairs for a batch of files are checked against
+the `dag_run` table with one query and the missing DagRuns are inserted in
+one transaction.
+DAGs are looked up in the `dag` table (DagModel) with one more query, so no
+DAG file is parsed here; targets of DAGs the scheduler does not know are
+skipped.
+Task instances are not created here; the scheduler adds them when it
+verifies the integrity of each running DagRun.
+"""
+from airflow import settings
+from airflow.models import DagModel
+from airflow.models import DagRun
+from airflow.utils import timezone
+from airflow.utils.state import State
+from sqlalchemy.exc import IntegrityError
+
+from imars_dags.util.timing import PhaseTimer
+
+
+def get_run_id(execution_date):
+    return 'trig__' + execution_date.isoformat()
+
+
+def _get_existing_dagruns(session, targets):
+    """returns set of (dag_id, execution_date) in targets that exist already"""
+    existing = session.query(
+        DagRun.dag_id, DagRun.execution_date
+    ).filter(
+        DagRun.dag_id.in_(set(dag_id for dag_id, _ in targets)),
+        DagRun.execution_date.in_(set(exe_date for _, exe_date in targets)),
+    ).all()
+    return set(targets).intersection(
+        (dag_id, exe_date) for dag_id, exe_date in existing
+    )
+
+
+def _get_known_dag_ids(session, dag_ids):
+    """returns set of given dag_ids that have a row in the `dag` table"""
+    if len(dag_ids) < 1:
+        return set()
+    known = session.query(DagModel.dag_id).filter(
+        DagModel.dag_id.in_(set(dag_ids))
+    ).all()
+    return set(dag_id for dag_id, in known)
+
+
+def create_dagruns(targets, retries=1, timer=None):
+    """
+    Creates a running, externally triggered DagRun for each target that does
+    not already have one.
+
+    parameters:
+    -----------
+    targets : list of (str, datetime.datetime)
+        (dag_id, execution_date) of each DagRun wanted.
+        execution_date must be timezone-aware.
+    retries : int
+        number of times to re-check and retry if another process inserts
+        one of the DagRuns between our check and our commit.
+    timer : imars_dags.util.timing.PhaseTimer
+        times the `dagrun_query`, `dag_resolution` & `dagrun_commit`
+        phases.
+
+    returns
+    -------
+    list of (dag_id, execution_date) for the DagRuns created. Targets of
+    unknown DAGs are left out.
+    """
+    targets = list(dict.fromkeys(targets))  # rm duplicates, keep order
+    if len(targets) < 1:
+        return []
+    timer = timer or PhaseTimer()
+    session = settings.Session()
+    try:
+        with timer.phase("dagrun_query"):
+            existing = _get_existing_dagruns(session, targets)
+        print("{} of {} DagRuns already exist.".format(
+            len(existing), len(targets)
+        ))
+        to_create = [target for target in targets if target not in existing]
+        with timer.phase("dag_resolution"):
+            known_dag_ids = _get_known_dag_ids(
+                session, [dag_id for dag_id, _ in to_create]
+            )
+        for dag_id in sorted(set(
+            dag_id for dag_id, _ in to_create if dag_id not in known_dag_ids
+        )):
+            print("DAG '{}' not found; skipping its DagRuns.".format(dag_id))
+        to_create = [
+            target for target in to_create if target[0] in known_dag_ids
+        ]
+        now = timezone.utcnow()
+        for dag_id, execution_date in to_create:
+            session.add(DagRun(
+                dag_id=dag_id,
+                run_id=get_run_id(execution_date),
+                execution_date=execution_date,
+                start_date=now,
+                external_trigger=True,
+                state=State.RUNNING,
+            ))
+        with timer.phase("dagrun_commit"):
+            session.commit()
+        return to_create
+    except IntegrityError as err:
+        session.rollback()
+        if retries < 1:
+            raise
+        print("DagRun inserted by someone else; retrying:\n\t{}".format(err))
+    finally:
+        session.close()
+    return create_dagruns(targets, retries=retries-1, timer=timer)
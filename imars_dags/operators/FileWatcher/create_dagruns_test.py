@@ -0,0 +1,82 @@
+# std modules:
+from datetime import datetime
+from datetime import timezone
+from unittest.mock import patch
+
+from airflow.models import DagModel
+from airflow.models import DagRun
+
+from imars_dags.operators.FileWatcher import create_dagruns as module
+from imars_dags.operators.FileWatcher.create_dagruns import create_dagruns
+from imars_dags.operators.FileWatcher.create_dagruns import get_run_id
+from imars_dags.util.testing import AirflowDBTestCase
+
+DT_1 = datetime(2019, 11, 30, 15, 30, tzinfo=timezone.utc)
+DT_2 = datetime(2019, 11, 30, 15, 31, tzinfo=timezone.utc)
+
+
+class Test_create_dagruns(AirflowDBTestCase):
+    def setUp(self):
+        super(Test_create_dagruns, self).setUp()
+        for dag_id in ["proc_na", "proc_gom"]:
+            self.session.add(DagModel(dag_id=dag_id))
+        self.session.commit()
+
+    def add_dagrun(self, dag_id, execution_date):
+        self.session.add(DagRun(
+            dag_id=dag_id, run_id=get_run_id(execution_date),
+            execution_date=execution_date, external_trigger=True,
+        ))
+        self.session.commit()
+
+    def get_dagruns(self):
+        return sorted(
+            (dagrun.dag_id, dagrun.execution_date, dagrun.state)
+            for dagrun in self.session.query(DagRun).all()
+        )
+
+    def test_existing_are_skipped(self):
+        """ one DagRun per unique target not already in dag_run """
+        self.add_dagrun("proc_na", DT_1)
+        created = create_dagruns([
+            ("proc_na", DT_1), ("proc_na", DT_2), ("proc_gom", DT_1),
+            ("proc_na", DT_2),
+        ])
+        self.assertEqual(created, [("proc_na", DT_2), ("proc_gom", DT_1)])
+        self.assertEqual(self.get_dagruns(), [
+            ("proc_gom", DT_1, "running"),
+            ("proc_na", DT_1, None),
+            ("proc_na", DT_2, "running"),
+        ])
+
+    def test_unknown_dags_are_skipped(self):
+        """ DagRuns of known DAGs are created despite an unknown one """
+        created = create_dagruns([
+            ("proc_na", DT_1), ("proc_fgbnms", DT_1), ("proc_gom", DT_1),
+        ])
+        self.assertEqual(created, [("proc_na", DT_1), ("proc_gom", DT_1)])
+        self.assertEqual(
+            [dag_id for dag_id, _, _ in self.get_dagruns()],
+            ["proc_gom", "proc_na"]
+        )
+
+    def test_no_targets(self):
+        self.assertEqual(create_dagruns([]), [])
+
+    def test_concurrent_insert_is_retried(self):
+        """ DagRuns inserted between our query & commit are re-checked """
+        self.add_dagrun("proc_na", DT_1)
+        get_existing = module._get_existing_dagruns
+        calls = []
+
+        def miss_first(session, targets):
+            calls.append(targets)
+            if len(calls) == 1:
+                return set()  # missed the other process' insert
+            return get_existing(session, targets)
+
+        with patch.object(module, '_get_existing_dagruns', miss_first):
+            created = create_dagruns([("proc_na", DT_1), ("proc_na", DT_2)])
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(created, [("proc_na", DT_2)])
+        self.assertEqual(len(self.get_dagruns()), 2)
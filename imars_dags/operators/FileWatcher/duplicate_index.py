@@ -0,0 +1,206 @@
+"""
+In-memory index of duplicate groups in the `file` table of the
+imars_metadata db.
+
+A duplicate group is a set of rows sharing (product_id, date_time, area_id).
+The index is built with one `GROUP BY ... HAVING COUNT(*) > 1` scan and
+refreshed incrementally: later refreshes only re-read the keys touched
+since the previous refresh. Those are the keys of rows inserted (id >
+highest id seen) or processed (last_processed >= last refresh), the
+groups those rows were in before & the groups that lost a member to a
+delete. Groups left w/ a single member are dropped.
+Files whose key is not in the index need no per-file db query to be
+cleared of duplication.
+"""
+import threading
+import time
+
+# members of each duplicate group, optionally restricted to a key subset.
+# {key_filter} is replaced w/ a WHERE clause on the inner file table.
+_GROUP_MEMBERS_SQL = """
+    SELECT f.product_id, f.date_time, f.area_id, f.filepath, f.multihash, f.id
+    FROM file f JOIN (
+        SELECT product_id, date_time, area_id FROM file
+        {key_filter}
+        GROUP BY product_id, date_time, area_id
+        HAVING COUNT(*) > 1
+    ) dup
+        ON f.product_id = dup.product_id
+        AND f.date_time = dup.date_time
+        AND f.area_id = dup.area_id
+    ORDER BY f.last_processed, f.id
+"""
+# rows changed since given (id, last_processed) watermarks
+_CHANGED_ROWS_SQL = "(id > %s OR last_processed >= %s)"
+_MAX_PARAMS = 900  # per query; sqlite allows 999
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class DuplicateGroupIndex(object):
+    """
+    Usage:
+    ```
+    dup_index = DuplicateGroupIndex(get_conn, product_ids=[11])
+    dup_index.refresh()
+    members = dup_index.get_group(file_meta)
+    ```
+    Reads are safe from multiple threads between refreshes.
+    """
+    def __init__(self, get_conn, product_ids=None, full_refresh_interval=3600):
+        """
+        parameters:
+        -----------
+        get_conn : function
+            returns a new DB-API connection to the metadata db (using the
+            `%s` paramstyle).
+        product_ids : int[]
+            only index rows of these products. None indexes all products.
+        full_refresh_interval : float
+            seconds between full rebuilds of the index.
+        """
+        self.get_conn = get_conn
+        self.product_ids = product_ids
+        self.full_refresh_interval = full_refresh_interval
+        self._groups = {}  # (product_id, date_time, area_id) -> [rows]
+        self._lock = threading.Lock()
+        self._max_id = None
+        self._since = None
+        self._last_full_refresh = None
+
+    def _product_filter(self):
+        if self.product_ids is None:
+            return ""
+        return "product_id IN ({})".format(
+            ",".join(map(str, self.product_ids))
+        )
+
+    def _where(self, *conditions):
+        conditions = [cond for cond in conditions if cond]
+        if len(conditions) < 1:
+            return ""
+        return "WHERE " + " AND ".join(conditions)
+
+    def refresh(self, force_full=False):
+        """
+        updates the index from the db. returns number of groups re-read.
+        The first refresh (and any after full_refresh_interval) rebuilds
+        the whole index.
+        """
+        full = (
+            force_full or self._last_full_refresh is None or
+            time.monotonic() - self._last_full_refresh >=
+            self.full_refresh_interval
+        )
+        conn = self.get_conn()
+        try:
+            cursor = conn.cursor()
+            # watermarks are read first so rows changed during the
+            # refresh are picked up again by the next one.
+            cursor.execute(
+                "SELECT MAX(id), MAX(last_processed) FROM file " +
+                self._where(self._product_filter())
+            )
+            max_id, since = cursor.fetchone()
+            if full:
+                cursor.execute(_GROUP_MEMBERS_SQL.format(
+                    key_filter=self._where(self._product_filter())
+                ))
+                rows = cursor.fetchall()
+            else:
+                touched = list(self._get_touched_keys(cursor))
+                rows = []
+                for keys in _chunks(touched, _MAX_PARAMS // 3):
+                    cursor.execute(
+                        _GROUP_MEMBERS_SQL.format(key_filter=self._where(
+                            self._product_filter(), "(" + " OR ".join(
+                                ["(product_id=%s AND date_time=%s AND "
+                                 "area_id=%s)"] * len(keys)
+                            ) + ")"
+                        )),
+                        tuple(value for key in keys for value in key)
+                    )
+                    rows.extend(cursor.fetchall())
+            cursor.close()
+        finally:
+            conn.close()
+
+        groups = {}
+        for product_id, date_time, area_id, filepath, mhash, file_id in rows:
+            groups.setdefault((product_id, date_time, area_id), []).append(
+                (filepath, mhash, file_id)
+            )
+        with self._lock:
+            if full:
+                self._groups = groups
+                self._last_full_refresh = time.monotonic()
+            else:
+                for key in touched:
+                    self._groups.pop(key, None)
+                self._groups.update(groups)
+            self._max_id = max_id
+            self._since = since
+        print("duplicate index {} refresh: {} groups read, {} indexed".format(
+            "full" if full else "incremental", len(groups), len(self._groups)
+        ))
+        return len(groups)
+
+    def _get_touched_keys(self, cursor):
+        """
+        returns set of keys whose groups may have changed since the last
+        refresh.
+        """
+        cursor.execute(
+            "SELECT id, product_id, date_time, area_id FROM file " +
+            self._where(self._product_filter(), _CHANGED_ROWS_SQL),
+            (self._max_id or 0, self._since or "1970-01-01")
+        )
+        changed = cursor.fetchall()
+        keys = set(tuple(row[1:]) for row in changed)
+        with self._lock:
+            indexed = {
+                file_id: key for key, members in self._groups.items()
+                for _, _, file_id in members
+            }
+        # groups changed rows were in before (eg their key was updated)
+        keys.update(indexed[row[0]] for row in changed if row[0] in indexed)
+        # groups that lost a member to a delete
+        existing = set()
+        for file_ids in _chunks(list(indexed), _MAX_PARAMS):
+            cursor.execute(
+                "SELECT id FROM file WHERE id IN ({})".format(
+                    ",".join(["%s"] * len(file_ids))
+                ),
+                tuple(file_ids)
+            )
+            existing.update(row[0] for row in cursor.fetchall())
+        keys.update(
+            key for file_id, key in indexed.items() if file_id not in existing
+        )
+        return keys
+
+    def get_group(self, file_meta):
+        """
+        returns list of (filepath, multihash, id) rows sharing the key of
+        given file row, ordered by last_processed. Returns an empty list if
+        the file has no duplicates.
+        """
+        key = (
+            file_meta['product_id'], file_meta['date_time'],
+            file_meta['area_id']
+        )
+        with self._lock:
+            return list(self._groups.get(key, []))
+
+    def stats(self):
+        """returns dict of duplicate counts for use as metrics"""
+        with self._lock:
+            return {
+                "duplicate_groups": len(self._groups),
+                "duplicate_files": sum(
+                    len(members) for members in self._groups.values()
+                ),
+            }
@@ -0,0 +1,75 @@
+# std modules:
+from datetime import datetime
+
+from imars_dags.operators.FileWatcher.duplicate_index \
+    import DuplicateGroupIndex
+from imars_dags.util.testing import MetadataDBTestCase
+
+DT_1 = datetime(2017, 5, 12, 16, 34, 22)
+DT_2 = datetime(2017, 5, 13, 16, 34, 22)
+DT_3 = datetime(2017, 5, 14, 16, 34, 22)
+
+
+def _row(filepath, date_time, product_id=11, area_id=1, last_processed=None):
+    return {
+        "filepath": filepath, "date_time": date_time,
+        "product_id": product_id, "area_id": area_id, "multihash": filepath,
+        "last_processed": last_processed,
+    }
+
+
+class Test_DuplicateGroupIndex(MetadataDBTestCase):
+    def setUp(self):
+        super(Test_DuplicateGroupIndex, self).setUp()
+        self.insert_rows("file", [
+            _row("/a", DT_1, last_processed=datetime(2019, 1, 1)),
+            _row("/b", DT_1, last_processed=datetime(2019, 1, 2)),
+            _row("/c", DT_2),
+            _row("/d", DT_1, area_id=2),
+            _row("/e", DT_1, product_id=36),
+            _row("/f", DT_1, product_id=36),
+            _row("/h", DT_3, last_processed=datetime(2019, 1, 3)),
+        ])
+        self.index = DuplicateGroupIndex(self.get_conn, product_ids=[11])
+
+    def test_full_refresh(self):
+        """ only keys w/ >1 rows of the given products are indexed """
+        self.index.refresh()
+        self.assertEqual(
+            self.index.get_group(_row("/b", DT_1)),
+            [("/a", "/a", 1), ("/b", "/b", 2)]
+        )
+        self.assertEqual(self.index.get_group(_row("/c", DT_2)), [])
+        self.assertEqual(self.index.get_group(_row("/e", DT_1, 36)), [])
+        self.assertEqual(
+            self.index.stats(), {"duplicate_groups": 1, "duplicate_files": 2}
+        )
+
+    def test_incremental_refresh(self):
+        """ incremental refresh only re-reads keys of changed rows """
+        self.index.refresh()
+        self.insert_rows("file", [_row("/g", DT_2)])
+        self.assertEqual(self.index.refresh(), 1)
+        self.assertEqual(
+            self.index.get_group(_row("/c", DT_2)),
+            [("/c", "/c", 3), ("/g", "/g", 8)]
+        )
+        self.assertEqual(len(self.index.get_group(_row("/a", DT_1))), 2)
+        self.assertEqual(self.index.stats()["duplicate_groups"], 2)
+
+    def test_shrunk_groups_are_dropped(self):
+        """ groups left w/ one member by a delete or update are dropped """
+        self.insert_rows("file", [_row("/g", DT_2), _row("/i", DT_3)])
+        self.index.refresh()
+        self.assertEqual(self.index.stats()["duplicate_groups"], 3)
+        self.conn.execute("DELETE FROM file WHERE filepath='/g'")
+        self.conn.execute(
+            "UPDATE file SET area_id=3, last_processed=? WHERE filepath='/i'",
+            (datetime(2019, 2, 1),)
+        )
+        self.conn.commit()
+        self.assertEqual(self.index.refresh(), 0)
+        self.assertEqual(self.index.get_group(_row("/c", DT_2)), [])
+        self.assertEqual(self.index.get_group(_row("/h", DT_3)), [])
+        self.assertEqual(len(self.index.get_group(_row("/a", DT_1))), 2)
+        self.assertEqual(self.index.stats()["duplicate_groups"], 1)
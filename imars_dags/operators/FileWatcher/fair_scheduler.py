@@ -0,0 +1,78 @@
+"""
+Weighted fair ordering of files from several streams (eg: one per
+(product_id, area_id)) using deficit round-robin.
+
+Each round every stream with files waiting earns `weight` credits and
+sends one file per whole credit. Unused credit carries over to the next
+batch while the stream still has files waiting, so over several batches
+each busy stream gets a share of the watcher proportional to its weight
+regardless of how large its backlog is. Streams with nothing waiting
+lose their credit so they cannot save it up for a burst.
+
+ref: Shreedhar & Varghese, "Efficient fair queuing using deficit
+round-robin", 1996.
+"""
+
+
+class DeficitRoundRobin(object):
+    """
+    Usage:
+    ```
+    scheduler = DeficitRoundRobin({(36, 1): 4})  # default weight is 1
+    batch = scheduler.schedule({(36, 1): s3_rows, (11, 5): wv2_rows}, 100)
+    ```
+    Keep one scheduler per watcher so credit carries between batches.
+    """
+    def __init__(self, weights=None, default_weight=1):
+        """
+        parameters:
+        -----------
+        weights : dict
+            {stream_key: weight}. Weights are relative; fractions are ok.
+        default_weight : float
+            weight of streams not in weights.
+        """
+        self.weights = weights or {}
+        self.default_weight = default_weight
+        self.deficits = {}  # stream_key -> unused credit
+        self._n_rounds = 0  # rotates which stream goes first each batch
+
+    def get_weight(self, key):
+        return self.weights.get(key, self.default_weight)
+
+    def schedule(self, queues, limit):
+        """
+        returns up to limit items from the given {stream_key: [items]}
+        queues (each in priority order), interleaved by weight.
+        """
+        queues = {
+            key: list(items) for key, items in queues.items()
+            if len(items) > 0 and self.get_weight(key) > 0
+        }
+        for key in list(self.deficits):
+            if key not in queues:  # idle streams do not keep credit
+                del self.deficits[key]
+        keys = sorted(queues)
+        if len(keys) > 0:
+            start = self._n_rounds % len(keys)
+            keys = keys[start:] + keys[:start]
+        self._n_rounds += 1
+        scheduled = []
+        while len(keys) > 0 and len(scheduled) < limit:
+            for key in keys:
+                self.deficits[key] = (
+                    self.deficits.get(key, 0) + self.get_weight(key)
+                )
+                queue = queues[key]
+                while (
+                    self.deficits[key] >= 1 and len(queue) > 0 and
+                    len(scheduled) < limit
+                ):
+                    scheduled.append(queue.pop(0))
+                    self.deficits[key] -= 1
+                if len(queue) == 0:
+                    self.deficits[key] = 0
+                if len(scheduled) >= limit:
+                    break
+            keys = [key for key in keys if len(queues[key]) > 0]
+        return scheduled
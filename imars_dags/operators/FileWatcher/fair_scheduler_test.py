@@ -0,0 +1,72 @@
+# std modules:
+from unittest import TestCase
+
+from imars_dags.operators.FileWatcher import sqlite_standin
+from imars_dags.operators.FileWatcher.fair_scheduler \
+    import DeficitRoundRobin
+from imars_dags.operators.FileWatcher.routing import select_round_robin
+
+
+def _queue(key, n):
+    return ["{}{}".format(key, i) for i in range(n)]
+
+
+class Test_DeficitRoundRobin(TestCase):
+    def test_weighted_shares(self):
+        """ busy streams get files in proportion to their weights """
+        scheduler = DeficitRoundRobin({'a': 3, 'b': 1})
+        batch = scheduler.schedule(
+            {'a': _queue('a', 100), 'b': _queue('b', 100)}, 8
+        )
+        self.assertEqual(sum(item[0] == 'a' for item in batch), 6)
+        self.assertEqual(sum(item[0] == 'b' for item in batch), 2)
+
+    def test_backlog_does_not_starve_others(self):
+        """ a huge backlog only gets its share; short streams all go """
+        scheduler = DeficitRoundRobin()
+        batch = scheduler.schedule(
+            {'big': _queue('big', 1000), 'x': ['x0'], 'y': ['y0']}, 5
+        )
+        self.assertIn('x0', batch)
+        self.assertIn('y0', batch)
+        self.assertEqual(len(batch), 5)
+
+    def test_credit_carries_between_batches(self):
+        """ fractional weights are honored over several batches """
+        scheduler = DeficitRoundRobin({'a': 0.5})
+        n_a = 0
+        for _ in range(10):
+            batch = scheduler.schedule(
+                {'a': _queue('a', 10), 'b': _queue('b', 10)}, 3
+            )
+            n_a += sum(item[0] == 'a' for item in batch)
+        self.assertEqual(n_a, 10)  # 1/3 of 30
+
+    def test_idle_stream_loses_credit(self):
+        """ streams w/ nothing waiting do not save up credit """
+        scheduler = DeficitRoundRobin({'a': 0.5})
+        scheduler.schedule({'a': ['a0'], 'b': _queue('b', 10)}, 2)
+        scheduler.schedule({'b': _queue('b', 10)}, 2)
+        self.assertNotIn('a', scheduler.deficits)
+
+
+class Test_select_round_robin_scheduled(TestCase):
+    def test_scheduler_orders_rows(self):
+        """ rows from the db are ordered by the scheduler's weights """
+        conn = sqlite_standin.connect()
+        sqlite_standin.insert_rows(conn, "file", [
+            {"filepath": "/{}/{}".format(area_id, i), "product_id": 1,
+             "area_id": area_id, "proc_counter": i}
+            for area_id in [1, 2]
+            for i in range(10)
+        ])
+        rows = select_round_robin(
+            conn.cursor(), ["area_id=1", "area_id=2"], ['filepath'], 4,
+            scheduler=DeficitRoundRobin({(1, 2): 3}),
+            keys=[(1, 1), (1, 2)]
+        )
+        self.assertEqual(
+            [row['filepath'] for row in rows],
+            ['/1/0', '/2/0', '/2/1', '/2/2']
+        )
+        conn.close()
@@ -0,0 +1,127 @@
+"""
+Batched writes of FileWatcher results to the `file` table of the
+imars_metadata db.
+"""
+from datetime import datetime
+
+from imars_dags.util.timing import PhaseTimer
+
+
+class MetadataWriter(object):
+    """
+    Queues `file` row updates and writes them as one parameterized,
+    `CASE`-based multi-row UPDATE over a single connection.
+
+    The queue is flushed when it reaches `flush_size` and when the writer is
+    closed (including on exit from a `with` block, even if an error was
+    raised; DagRuns already created for those files should be recorded).
+
+    Usage:
+    ```
+    with MetadataWriter(get_conn) as writer:
+        for file_meta, validation_meta in results:
+            writer.add(file_meta['id'], validation_meta)
+    ```
+    """
+    # columns set from validation_meta, in order
+    COLUMNS = ['status_id', 'last_ipfs_host', 'multihash']
+
+    def __init__(self, get_conn, flush_size=100, timer=None):
+        """
+        parameters:
+        -----------
+        get_conn : function
+            returns a new DB-API connection to the metadata db (using the
+            `%s` paramstyle). Called at most once per writer.
+        flush_size : int
+            number of queued updates that triggers a flush.
+        timer : imars_dags.util.timing.PhaseTimer
+            times each flush as phase `metadata_update`.
+        """
+        self.get_conn = get_conn
+        self.flush_size = flush_size
+        self.n_written = 0
+        self.timer = timer or PhaseTimer()
+        self._conn = None
+        self._queue = {}  # file id -> dict of column values
+
+    def add(
+        self, file_id, validation_meta=None, last_processed=None,
+        next_eligible_at=None, fail_count=None
+    ):
+        """
+        queues update of one file row; flushes if the queue is full.
+        If validation_meta is None only last_processed & proc_counter are
+        updated. next_eligible_at & fail_count are only written if given.
+        """
+        row = {}
+        if validation_meta is not None:
+            row = {col: validation_meta[col] for col in self.COLUMNS}
+        row['last_processed'] = last_processed or datetime.now()
+        if next_eligible_at is not None:
+            row['next_eligible_at'] = next_eligible_at
+        if fail_count is not None:
+            row['fail_count'] = fail_count
+        self._queue[file_id] = row
+        if len(self._queue) >= self.flush_size:
+            self.flush()
+
+    def get_update_sql(self, file_ids):
+        """returns (sql, params) updating all given (queued) file ids"""
+        sql_sets = []
+        params = []
+        for col in self.COLUMNS + [
+            'last_processed', 'next_eligible_at', 'fail_count'
+        ]:
+            col_ids = [
+                file_id for file_id in file_ids if col in self._queue[file_id]
+            ]
+            if len(col_ids) < 1:
+                continue
+            # ELSE keeps the value of rows not setting this column
+            sql_sets.append("{col}=CASE id {whens} ELSE {col} END".format(
+                col=col, whens=" ".join(["WHEN %s THEN %s"] * len(col_ids))
+            ))
+            for file_id in col_ids:
+                params.extend([file_id, self._queue[file_id][col]])
+        sql = "UPDATE file SET {},proc_counter=proc_counter+1 " \
+            "WHERE id IN ({})".format(
+                ",".join(sql_sets), ",".join(["%s"] * len(file_ids))
+            )
+        return sql, params + file_ids
+
+    def flush(self):
+        """writes all queued updates. returns number of rows written."""
+        if len(self._queue) < 1:
+            return 0
+        file_ids = list(self._queue.keys())
+        sql, params = self.get_update_sql(file_ids)
+        print("updating {} rows in metadata db: ids {}".format(
+            len(file_ids), file_ids
+        ))
+        with self.timer.phase("metadata_update"):
+            if self._conn is None:
+                self._conn = self.get_conn()
+            cursor = self._conn.cursor()
+            try:
+                cursor.execute(sql, params)
+                self._conn.commit()
+            finally:
+                cursor.close()
+        self._queue = {}
+        self.n_written += len(file_ids)
+        return len(file_ids)
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,69 @@
+# std modules:
+from datetime import datetime
+
+from imars_dags.operators.FileWatcher.metadata_writer import MetadataWriter
+from imars_dags.util.testing import MetadataDBTestCase
+
+
+def _validation_meta(status_id):
+    return {
+        "last_ipfs_host": "NA",
+        "multihash": "hash_{}".format(status_id),
+        "status_id": status_id,
+    }
+
+
+class Test_MetadataWriter(MetadataDBTestCase):
+    def setUp(self):
+        super(Test_MetadataWriter, self).setUp()
+        self.insert_rows("file", [
+            {"filepath": "/f/{}".format(i), "status_id": 3}
+            for i in range(5)
+        ])
+
+    def get_rows(self):
+        return self.select(
+            "SELECT id,status_id,multihash,proc_counter,last_processed "
+            "FROM file ORDER BY id"
+        )
+
+    def test_flush_on_exit(self):
+        """ queued rows are written w/ different values on exit """
+        with MetadataWriter(self.get_conn) as writer:
+            writer.add(1, _validation_meta(1))
+            writer.add(2, _validation_meta(8))
+            self.assertEqual(self.get_rows()[0][1], 3)  # not written yet
+        rows = self.get_rows()
+        self.assertEqual(rows[0][1:4], (1, "hash_1", 1))
+        self.assertEqual(rows[1][1:4], (8, "hash_8", 1))
+        self.assertEqual(rows[2][1:4], (3, None, 0))  # untouched
+        self.assertIsInstance(rows[0][4], datetime)
+        self.assertEqual(writer.n_written, 2)
+
+    def test_flush_on_size_reuses_connection(self):
+        """ flushes every flush_size rows over a single connection """
+        with MetadataWriter(self.get_conn, flush_size=2) as writer:
+            for file_id in range(1, 6):
+                writer.add(file_id, _validation_meta(1))
+            self.assertEqual(writer.n_written, 4)
+        self.assertEqual(writer.n_written, 5)
+        self.assertEqual(self.n_conns, 1)
+        self.assertTrue(all(row[1] == 1 for row in self.get_rows()))
+
+    def test_flush_on_error(self):
+        """ queued rows are still written when an error is raised """
+        with self.assertRaises(RuntimeError):
+            with MetadataWriter(self.get_conn) as writer:
+                writer.add(3, _validation_meta(6))
+                raise RuntimeError("oops")
+        self.assertEqual(self.get_rows()[2][1], 6)
+
+    def test_touch_only(self):
+        """ rows added w/o validation_meta only get proc_counter bumped """
+        with MetadataWriter(self.get_conn) as writer:
+            writer.add(1, _validation_meta(8))
+            writer.add(2)
+        rows = self.get_rows()
+        self.assertEqual(rows[0][1:4], (8, "hash_8", 1))
+        self.assertEqual(rows[1][1:4], (3, None, 1))
+        self.assertIsInstance(rows[1][4], datetime)
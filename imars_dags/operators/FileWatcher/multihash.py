@@ -0,0 +1,291 @@
+"""
+In-process hashing of files into IPFS-compatible multihashes.
+
+Produces the same CIDv0 (`Qm...`) that `ipfs add --only-hash` gives with
+its defaults: 256KiB fixed-size chunks, balanced DAG layout with up to 174
+links per node, UnixFS `File` nodes encoded as dag-pb and sha2-256 hashes.
+Leaves are `File` nodes too; CIDv0 adds do not use raw leaves (the
+multi-chunk test vectors come from kubo's `ipfs add --only-hash`).
+
+Files are read sequentially in chunks, so memory use does not depend on
+file size, and hashing stops at an optional deadline so a multi-GB file
+cannot hold up a time-budgeted batch. Results are kept in an on-disk cache
+keyed by (device, inode, size, mtime) so unchanged files are not re-read.
+The progress of hashes stopped at a deadline is cached too, so the next
+visit of an unchanged file resumes where the last one stopped & files
+larger than one time budget are hashed over several visits.
+"""
+import hashlib
+import os
+import sqlite3
+import struct
+import threading
+import time
+
+CHUNK_SIZE = 262144
+MAX_LINKS = 174
+DEFAULT_CACHE_PATH = os.path.expanduser(
+    "~/.cache/imars_dags/multihash.db"
+)
+
+_UNIXFS_FILE = 2
+_SHA2_256 = b'\x12\x20'  # multihash code & digest length
+_B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+_NODE_STRUCT = struct.Struct(">34sQQ")  # (multihash, tsize, filesize)
+
+
+class HashTimeout(TimeoutError):
+    """
+    raised when a deadline passes while hashing. `partial` is the
+    (offset, groups, leaves) progress to pass to multihash_stream to resume.
+    """
+    def __init__(self, partial):
+        super(HashTimeout, self).__init__("deadline passed while hashing")
+        self.partial = partial
+
+
+# === protobuf encoding
+def _varint(n):
+    out = bytearray()
+    while True:
+        to_write = n & 0x7f
+        n >>= 7
+        if n:
+            out.append(to_write | 0x80)
+        else:
+            out.append(to_write)
+            return bytes(out)
+
+
+def _pb_varint(field_n, value):
+    return _varint(field_n << 3) + _varint(value)
+
+
+def _pb_bytes(field_n, value):
+    return _varint(field_n << 3 | 2) + _varint(len(value)) + value
+
+
+def _unixfs_file(data, filesize, blocksizes=()):
+    """encodes a UnixFS `Data` message of type `File`"""
+    msg = _pb_varint(1, _UNIXFS_FILE)
+    if data is not None:
+        msg += _pb_bytes(2, data)
+    msg += _pb_varint(3, filesize)
+    for blocksize in blocksizes:
+        msg += _pb_varint(4, blocksize)
+    return msg
+
+
+def _dag_pb_node(data, links=()):
+    """
+    encodes a dag-pb `PBNode`. Links are (multihash, tsize) tuples and are
+    written before Data, like go-ipfs does.
+    """
+    node = b''
+    for mhash, tsize in links:
+        link = _pb_bytes(1, mhash) + _pb_bytes(2, b'') + _pb_varint(3, tsize)
+        node += _pb_bytes(2, link)
+    return node + _pb_bytes(1, data)
+
+
+def _b58encode(raw):
+    n = int.from_bytes(raw, 'big')
+    encoded = ''
+    while n > 0:
+        n, rem = divmod(n, 58)
+        encoded = _B58_ALPHABET[rem] + encoded
+    n_pad = len(raw) - len(raw.lstrip(b'\x00'))
+    return _B58_ALPHABET[0] * n_pad + encoded
+
+
+# === DAG building
+def _add_block(block):
+    """returns multihash of given serialized block"""
+    return _SHA2_256 + hashlib.sha256(block).digest()
+
+
+def _leaf(chunk):
+    """returns (multihash, tsize, filesize) for a leaf w/ given data"""
+    block = _dag_pb_node(_unixfs_file(chunk, len(chunk)))
+    return _add_block(block), len(block), len(chunk)
+
+
+def _parent(children):
+    """returns (multihash, tsize, filesize) for node linking to children"""
+    blocksizes = [filesize for _, _, filesize in children]
+    block = _dag_pb_node(
+        _unixfs_file(None, sum(blocksizes), blocksizes),
+        [(mhash, tsize) for mhash, tsize, _ in children]
+    )
+    return (
+        _add_block(block),
+        len(block) + sum(tsize for _, tsize, _ in children),
+        sum(blocksizes)
+    )
+
+
+def multihash_stream(
+    fileobj, chunk_size=CHUNK_SIZE, deadline=None, partial=None
+):
+    """
+    returns base58 CIDv0 multihash of data read from binary fileobj.
+    Raises HashTimeout if still reading after deadline
+    (a `time.monotonic()` value).
+
+    parameters:
+    -----------
+    partial : (int, list, list)
+        (offset, groups, leaves) from a HashTimeout of the same data;
+        reading resumes at offset. groups are the parents of each full run
+        of MAX_LINKS leaves (the DAG's first layer of parents) & leaves the
+        leaves read since.
+    """
+    offset, groups, leaves = partial or (0, [], [])
+    groups = list(groups)
+    leaves = list(leaves)
+    if offset > 0:
+        fileobj.seek(offset)
+    while True:
+        if deadline is not None and time.monotonic() > deadline:
+            raise HashTimeout((offset, groups, leaves))
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        offset += len(chunk)
+        leaves.append(_leaf(chunk))
+        if len(leaves) == MAX_LINKS:
+            groups.append(_parent(leaves))
+            leaves = []
+    if len(groups) == 0 and len(leaves) == 0:  # empty: File node w/o data
+        return _b58encode(_add_block(_dag_pb_node(_unixfs_file(None, 0))))
+    if len(groups) == 0 and len(leaves) == 1:  # single chunk: leaf is root
+        return _b58encode(leaves[0][0])
+    nodes = groups
+    if len(leaves) > 0:
+        nodes = groups + [_parent(leaves)]
+    # balanced layout: each layer groups the one below MAX_LINKS at a time
+    while len(nodes) > 1:
+        nodes = [
+            _parent(nodes[i:i+MAX_LINKS])
+            for i in range(0, len(nodes), MAX_LINKS)
+        ]
+    return _b58encode(nodes[0][0])
+
+
+def multihash_file(filepath, chunk_size=CHUNK_SIZE, deadline=None,
+                   partial=None):
+    with open(filepath, 'rb') as fileobj:
+        return multihash_stream(fileobj, chunk_size, deadline, partial)
+
+
+def _pack_nodes(nodes):
+    return b"".join(_NODE_STRUCT.pack(*node) for node in nodes)
+
+
+def _unpack_nodes(blob):
+    return list(_NODE_STRUCT.iter_unpack(blob))
+
+
+# === caching
+class MultihashCache(object):
+    """
+    sqlite-backed cache of multihashes & of the progress of unfinished
+    hashes, keyed by (st_dev, st_ino, st_size, st_mtime_ns). Safe to share
+    between threads.
+    """
+    def __init__(self, db_path=DEFAULT_CACHE_PATH):
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS multihash ("
+            "dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER, "
+            "multihash TEXT NOT NULL, "
+            "PRIMARY KEY (dev, ino, size, mtime_ns))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS partial ("
+            "dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER, "
+            "offset INTEGER NOT NULL, groups BLOB NOT NULL, "
+            "leaves BLOB NOT NULL, "
+            "PRIMARY KEY (dev, ino, size, mtime_ns))"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _key(f_stat):
+        return (f_stat.st_dev, f_stat.st_ino, f_stat.st_size,
+                f_stat.st_mtime_ns)
+
+    def get(self, f_stat):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT multihash FROM multihash WHERE "
+                "dev=? AND ino=? AND size=? AND mtime_ns=?",
+                self._key(f_stat)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def put(self, f_stat, mhash):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO multihash VALUES (?,?,?,?,?)",
+                self._key(f_stat) + (mhash,)
+            )
+            self._conn.execute(
+                "DELETE FROM partial WHERE "
+                "dev=? AND ino=? AND size=? AND mtime_ns=?",
+                self._key(f_stat)
+            )
+            self._conn.commit()
+
+    def get_partial(self, f_stat):
+        """returns progress of an unfinished hash (see HashTimeout)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT offset, groups, leaves FROM partial WHERE "
+                "dev=? AND ino=? AND size=? AND mtime_ns=?",
+                self._key(f_stat)
+            ).fetchone()
+        if row is None:
+            return None
+        offset, groups, leaves = row
+        return offset, _unpack_nodes(groups), _unpack_nodes(leaves)
+
+    def put_partial(self, f_stat, partial):
+        offset, groups, leaves = partial
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO partial VALUES (?,?,?,?,?,?,?)",
+                self._key(f_stat) + (
+                    offset, _pack_nodes(groups), _pack_nodes(leaves)
+                )
+            )
+            self._conn.commit()
+
+
+def get_multihash(filepath, f_stat=None, cache=None, deadline=None):
+    """
+    returns multihash of file, using cache (if given) when the file
+    has not changed since it was last hashed. See multihash_stream for
+    deadline; w/ a cache, a hash stopped at the deadline is resumed by
+    the next call for the unchanged file.
+    """
+    if f_stat is None:
+        f_stat = os.stat(filepath)
+    partial = None
+    if cache is not None:
+        mhash = cache.get(f_stat)
+        if mhash is not None:
+            return mhash
+        partial = cache.get_partial(f_stat)
+    try:
+        mhash = multihash_file(filepath, deadline=deadline, partial=partial)
+    except HashTimeout as timeout:
+        if cache is not None:
+            cache.put_partial(f_stat, timeout.partial)
+        raise
+    if cache is not None:
+        cache.put(f_stat, mhash)
+    return mhash
@@ -0,0 +1,148 @@
+# std modules:
+import io
+import itertools
+import os
+import tempfile
+import time
+from unittest import TestCase
+from unittest.mock import Mock
+from unittest.mock import patch
+
+from imars_dags.operators.FileWatcher import multihash
+
+CHUNK = multihash.CHUNK_SIZE
+
+
+def _interrupt(data, chunk_size, n_reads):
+    """returns HashTimeout.partial after reading n_reads chunks of data"""
+    clock = itertools.count()  # one tick per chunk read
+    with patch.object(multihash, 'time', Mock(monotonic=lambda: next(clock))):
+        try:
+            multihash.multihash_stream(
+                io.BytesIO(data), chunk_size, deadline=n_reads - 0.5
+            )
+        except multihash.HashTimeout as timeout:
+            return timeout.partial
+    raise AssertionError("hash finished before the deadline")
+
+
+def _pattern(n_bytes):
+    """n_bytes of the repeating sequence 0..250 (avoids chunk repeats)"""
+    period = bytes(range(251))
+    return period * (n_bytes // 251) + period[:n_bytes % 251]
+
+
+class Test_multihash_stream(TestCase):
+    def test_empty_file(self):
+        """ empty file matches `ipfs add` """
+        self.assertEqual(
+            multihash.multihash_stream(io.BytesIO(b'')),
+            'QmbFMke1KXqnYyBBWxB74N4c5SBnJMVAiMNRcGu6x1AwQH'
+        )
+
+    def test_single_chunk(self):
+        """ `echo "hello world" | ipfs add` """
+        self.assertEqual(
+            multihash.multihash_stream(io.BytesIO(b'hello world\n')),
+            'QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o'
+        )
+
+    def test_multi_chunk_files(self):
+        """ `ipfs add --only-hash` (kubo, default chunker & layout) """
+        for n_bytes, expected in [
+            (3 * CHUNK + 5, 'QmYMHCc2cJx17KoAerHGZveEQPLBdN4FEWC6TU4c2iJYU3'),
+            (2 * CHUNK, 'QmX9AxjaxS7HCFKUdcQRgNKmfEj9hhjTsE57CB5iPe8zus'),
+            # 175 chunks: two layers of parents
+            (175 * CHUNK + 1,
+             'QmfSNfmSo1Gg885jm8qFWAEe14nkjYc7bXgXjuvKWjVoKw'),
+        ]:
+            self.assertEqual(
+                multihash.multihash_stream(io.BytesIO(_pattern(n_bytes))),
+                expected
+            )
+
+    def test_deadline(self):
+        """ hashing stops once the deadline has passed """
+        with self.assertRaises(TimeoutError):
+            multihash.multihash_stream(
+                io.BytesIO(b'data'), deadline=time.monotonic() - 1
+            )
+
+    def test_resume(self):
+        """ hashes resumed after a deadline match uninterrupted ones """
+        links = multihash.MAX_LINKS
+        for n_chunks, n_reads in [
+            (1, 1), (3, 1), (links, links - 1), (links, links),
+            (links * 2 + 3, links), (links * 2 + 3, links + 1),
+            (links * 2 + 3, links * 2 + 2),
+        ]:
+            data = _pattern(n_chunks * 4 - 1)
+            partial = _interrupt(data, 4, n_reads)
+            self.assertEqual(partial[0], min(n_reads * 4, len(data)))
+            self.assertEqual(
+                multihash.multihash_stream(io.BytesIO(data), 4,
+                                           partial=partial),
+                multihash.multihash_stream(io.BytesIO(data), 4),
+                (n_chunks, n_reads)
+            )
+
+    def test_multi_layer_dag(self):
+        """ files w/ more than MAX_LINKS chunks hash to a deeper DAG """
+        data = os.urandom(multihash.MAX_LINKS * 4 + 3)
+        with patch.object(multihash, '_parent', wraps=multihash._parent) \
+                as mock_parent:
+            mhash = multihash.multihash_stream(io.BytesIO(data), 4)
+        # 175 leaves -> 2 parents -> 1 root
+        self.assertEqual(mock_parent.call_count, 3)
+        self.assertTrue(mhash.startswith('Qm'))
+        self.assertEqual(len(mhash), 46)
+        self.assertNotEqual(
+            mhash, multihash.multihash_stream(io.BytesIO(data[:-1]), 4)
+        )
+
+
+class Test_get_multihash(TestCase):
+    def test_cache_skips_unchanged_files(self):
+        """ unchanged files are not re-read; changed files are """
+        cache = multihash.MultihashCache(":memory:")
+        with tempfile.NamedTemporaryFile() as tmp_file:
+            tmp_file.write(b'hello world\n')
+            tmp_file.flush()
+            first = multihash.get_multihash(tmp_file.name, cache=cache)
+            with patch.object(multihash, 'multihash_file') as mock_hash:
+                self.assertEqual(
+                    multihash.get_multihash(tmp_file.name, cache=cache),
+                    first
+                )
+                mock_hash.assert_not_called()
+            tmp_file.write(b'more')
+            tmp_file.flush()
+            self.assertNotEqual(
+                multihash.get_multihash(tmp_file.name, cache=cache), first
+            )
+
+    def test_progress_is_cached(self):
+        """ a hash stopped at the deadline resumes on the next call """
+        cache = multihash.MultihashCache(":memory:")
+        data = _pattern(3 * CHUNK + 5)
+        with tempfile.NamedTemporaryFile() as tmp_file:
+            tmp_file.write(data)
+            tmp_file.flush()
+            partial = _interrupt(data, CHUNK, 2)
+            with patch.object(
+                multihash, 'multihash_file',
+                side_effect=multihash.HashTimeout(partial)
+            ):
+                with self.assertRaises(TimeoutError):
+                    multihash.get_multihash(tmp_file.name, cache=cache)
+            f_stat = os.stat(tmp_file.name)
+            self.assertEqual(cache.get_partial(f_stat), partial)
+            with patch.object(
+                multihash, 'multihash_file', wraps=multihash.multihash_file
+            ) as mock_hash:
+                self.assertEqual(
+                    multihash.get_multihash(tmp_file.name, cache=cache),
+                    'QmYMHCc2cJx17KoAerHGZveEQPLBdN4FEWC6TU4c2iJYU3'
+                )
+            self.assertEqual(mock_hash.call_args[1]['partial'], partial)
+            self.assertIsNone(cache.get_partial(f_stat))
@@ -0,0 +1,320 @@
+"""
+Content fingerprints for NITF files & an index of them in the
+imars_metadata db.
+
+A fingerprint is a sha256 over all NITF header fields except the volatile
+ones (see nitf_header.VOLATILE_FIELDS) plus the offset & length of each
+image data segment. NITF-synonyms (the same image delivered twice) have
+the same fingerprint, so finding them is a keyed lookup instead of a
+pairwise comparison of headers.
+
+Fingerprints are computed once per file version; the index stores the
+(size, mtime) each was computed from and only recomputes when those
+change. The index is keyed by `file.id` & shared by all workers, so the
+duplicate report covers every file any worker has fingerprinted.
+
+The file watcher reads & writes the index once per batch (see
+FingerprintBatch). If the table is missing or the db cannot be reached
+it fingerprints files directly instead, w/o an index.
+The table is added to the imars_metadata db once, eg:
+```
+python3 -c "from imars_dags.operators.FileWatcher.nitf_fingerprint import *; \\
+    print(NITF_FINGERPRINT_DDL_MYSQL)" | mysql imars_metadata
+```
+
+example usage:
+# add files of NITF products 11 & 24 to the index:
+python3 -m imars_dags.operators.FileWatcher.nitf_fingerprint index 11 24
+# list groups of synonymous files:
+python3 -m imars_dags.operators.FileWatcher.nitf_fingerprint report
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+
+from imars_dags.operators.FileWatcher.nitf_header import get_field_name
+from imars_dags.operators.FileWatcher.nitf_header import parse_nitf
+from imars_dags.operators.FileWatcher.nitf_header import VOLATILE_FIELDS
+
+METADATA_CONN_ID = 'imars_metadata'
+NITF_FINGERPRINT_DDL_MYSQL = """
+CREATE TABLE IF NOT EXISTS nitf_fingerprint (
+    file_id INT NOT NULL PRIMARY KEY,
+    size BIGINT NOT NULL,
+    mtime_ns BIGINT NOT NULL,
+    fingerprint CHAR(64) NOT NULL,
+    INDEX fingerprint_idx (fingerprint)
+);
+"""
+
+
+class IndexUnavailable(Exception):
+    """the fingerprint index cannot be read or written"""
+
+
+def _get_metadata_conn():
+    # imported here so fingerprints can be computed w/o airflow configured
+    from airflow.hooks.mysql_hook import MySqlHook
+    return MySqlHook(mysql_conn_id=METADATA_CONN_ID).get_conn()
+
+
+def nitf_fingerprint(filepath):
+    """returns hex fingerprint of the NITF file at filepath"""
+    with open(filepath, 'rb') as fileobj:
+        fields, image_segments = parse_nitf(fileobj)
+    stable_fields = sorted(
+        (key, value) for key, value in fields.items()
+        if get_field_name(key) not in VOLATILE_FIELDS
+    )
+    return hashlib.sha256(
+        json.dumps([stable_fields, image_segments]).encode('utf-8')
+    ).hexdigest()
+
+
+class NitfFingerprintIndex(object):
+    """
+    index of NITF fingerprints by `file.id` in the `nitf_fingerprint` table.
+    Safe to share between threads; each call uses its own connection.
+    """
+    def __init__(self, get_conn=_get_metadata_conn):
+        """
+        parameters:
+        -----------
+        get_conn : function
+            returns a new DB-API connection to the metadata db (using the
+            `%s` paramstyle).
+        """
+        self.get_conn = get_conn
+
+    def _query(self, sql, params=None, commit=False, many=False):
+        """
+        returns all rows of a query. If `many` the query is executed once
+        per tuple in params.
+        Raises IndexUnavailable on db errors (eg a missing table).
+        """
+        try:
+            conn = self.get_conn()
+        except Exception as err:
+            raise IndexUnavailable(err)
+        try:
+            cursor = conn.cursor()
+            try:
+                if many:
+                    cursor.executemany(sql, params)
+                else:
+                    cursor.execute(sql, params)
+                rows = cursor.fetchall()
+                if commit:
+                    conn.commit()
+            except conn.Error as err:
+                raise IndexUnavailable(err)
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+        return rows
+
+    def get_fingerprint(self, file_id, filepath, f_stat=None):
+        """
+        returns fingerprint of file; computed & stored only if the file is
+        not in the index or has changed since it was indexed.
+        """
+        return self.get_batch([file_id]).get_fingerprint(
+            file_id, filepath, f_stat, flush=True
+        )
+
+    def get_batch(self, file_ids):
+        """returns FingerprintBatch of the given files"""
+        return FingerprintBatch(self, file_ids)
+
+    def get_versions(self, file_ids):
+        """
+        returns {file_id: (size, mtime_ns, fingerprint)} of the given files
+        that are in the index.
+        """
+        if len(file_ids) < 1:
+            return {}
+        return {
+            row[0]: tuple(row[1:]) for row in self._query(
+                "SELECT file_id,size,mtime_ns,fingerprint "
+                "FROM nitf_fingerprint WHERE file_id IN ({})".format(
+                    ",".join(["%s"] * len(file_ids))
+                ),
+                tuple(file_ids)
+            )
+        }
+
+    def put_versions(self, versions):
+        """
+        stores {file_id: (size, mtime_ns, fingerprint)} using a single
+        connection.
+        """
+        if len(versions) < 1:
+            return
+        self._query(
+            "REPLACE INTO nitf_fingerprint "
+            "(file_id,size,mtime_ns,fingerprint) VALUES (%s,%s,%s,%s)",
+            [(file_id,) + version for file_id, version in versions.items()],
+            commit=True, many=True
+        )
+
+    def get_indexed(self, file_ids):
+        """
+        returns {file_id: fingerprint} of the given files that are in the
+        index, as stored (the files are not read).
+        """
+        if len(file_ids) < 1:
+            return {}
+        return dict(self._query(
+            "SELECT file_id,fingerprint FROM nitf_fingerprint "
+            "WHERE file_id IN ({})".format(",".join(["%s"] * len(file_ids))),
+            tuple(file_ids)
+        ))
+
+    def find_synonyms(self, fingerprint):
+        """returns list of filepaths of indexed files w/ given fingerprint"""
+        return [row[0] for row in self._query(
+            "SELECT f.filepath FROM nitf_fingerprint n "
+            "JOIN file f ON f.id = n.file_id "
+            "WHERE n.fingerprint=%s ORDER BY f.filepath",
+            (fingerprint,)
+        )]
+
+    def remove(self, file_id):
+        self._query(
+            "DELETE FROM nitf_fingerprint WHERE file_id=%s", (file_id,),
+            commit=True
+        )
+
+    def duplicate_report(self):
+        """returns dict of {fingerprint: [filepaths]} w/ >1 file each"""
+        rows = self._query(
+            "SELECT n.fingerprint, f.filepath FROM nitf_fingerprint n "
+            "JOIN file f ON f.id = n.file_id "
+            "WHERE n.fingerprint IN ("
+            "  SELECT fingerprint FROM nitf_fingerprint "
+            "  GROUP BY fingerprint HAVING COUNT(*) > 1"
+            ") ORDER BY n.fingerprint, f.filepath"
+        )
+        report = {}
+        for fingerprint, filepath in rows:
+            report.setdefault(fingerprint, []).append(filepath)
+        return report
+
+    def index_products(self, product_ids):
+        """
+        fingerprints the files of given products that are not indexed or
+        have changed. yields (filepath, fingerprint or error).
+        """
+        rows = self._query(
+            "SELECT id,filepath FROM file WHERE product_id IN ({}) "
+            "ORDER BY id".format(",".join(["%s"] * len(product_ids))),
+            tuple(product_ids)
+        )
+        for file_id, filepath in rows:
+            try:
+                yield filepath, self.get_fingerprint(file_id, filepath)
+            except (OSError, ValueError) as err:
+                yield filepath, err
+
+
+class FingerprintBatch(object):
+    """
+    fingerprints of a batch of files. The indexed versions are read w/ one
+    query when the batch is created & new fingerprints are kept until
+    `flush` writes them w/ one more, so a batch uses two connections to
+    the index no matter how many files it has.
+    Safe to share between threads.
+    """
+    def __init__(self, index, file_ids):
+        """
+        parameters:
+        -----------
+        index : NitfFingerprintIndex
+            index to read from & write to.
+        file_ids : list of int
+            files to read indexed fingerprints of. Other files are
+            fingerprinted when asked for.
+        """
+        self.index = index
+        self._versions = index.get_versions(file_ids)
+        self._new = {}
+        self._lock = threading.Lock()
+
+    def get_fingerprint(self, file_id, filepath, f_stat=None, flush=False):
+        """
+        returns fingerprint of file; computed only if the file is not in the
+        index or has changed since it was indexed.
+        Raises OSError or ValueError if the file cannot be read.
+
+        parameters:
+        -----------
+        f_stat : os.stat_result
+            stat of the file if already known.
+        flush : bool
+            store a new fingerprint right away instead of waiting for
+            `flush`.
+        """
+        if f_stat is None:
+            f_stat = os.stat(filepath)
+        version = (f_stat.st_size, f_stat.st_mtime_ns)
+        with self._lock:
+            known = self._versions.get(file_id)
+        if known is not None and tuple(known[:2]) == version:
+            return known[2]
+        fingerprint = nitf_fingerprint(filepath)
+        with self._lock:
+            self._versions[file_id] = version + (fingerprint,)
+            self._new[file_id] = version + (fingerprint,)
+        if flush:
+            self.flush()
+        return fingerprint
+
+    def get_indexed(self, file_id):
+        """returns fingerprint of file as stored (or None) w/o reading it"""
+        with self._lock:
+            known = self._versions.get(file_id)
+        return None if known is None else known[2]
+
+    def flush(self):
+        """stores the fingerprints computed since the last flush"""
+        with self._lock:
+            new, self._new = self._new, {}
+        self.index.put_versions(new)
+        return len(new)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="index NITF fingerprints & report duplicates"
+    )
+    subparsers = parser.add_subparsers(dest="action")
+    index_parser = subparsers.add_parser("index")
+    index_parser.add_argument("product_ids", nargs="+", type=int)
+    subparsers.add_parser("report")
+    args = parser.parse_args(argv)
+
+    index = NitfFingerprintIndex()
+    if args.action == "index":
+        for filepath, fingerprint in index.index_products(args.product_ids):
+            if isinstance(fingerprint, Exception):
+                print("cannot fingerprint '{}': {}".format(
+                    filepath, fingerprint
+                ))
+            else:
+                print("{}  {}".format(fingerprint, filepath))
+    elif args.action == "report":
+        report = index.duplicate_report()
+        for fingerprint, filepaths in report.items():
+            print("{} ({} files):\n\t{}".format(
+                fingerprint, len(filepaths), "\n\t".join(filepaths)
+            ))
+        print("{} groups of synonymous files.".format(len(report)))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# std modules:
+from datetime import datetime
+import os
+import tempfile
+from unittest.mock import patch
+
+from imars_dags.operators.FileWatcher import nitf_fingerprint
+from imars_dags.operators.FileWatcher.nitf_fingerprint \
+    import NitfFingerprintIndex
+from imars_dags.operators.FileWatcher.nitf_header_test import make_nitf
+from imars_dags.util.testing import MetadataDBTestCase
+
+DT = datetime(2017, 5, 12, 16, 34, 22)
+
+
+class NitfTestCase(MetadataDBTestCase):
+    def setUp(self):
+        super(NitfTestCase, self).setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.index = NitfFingerprintIndex(self.get_conn)
+        self.n_files = 0
+
+    def write_nitf(self, name, **kwargs):
+        """writes & inserts a NITF file; returns its file row"""
+        fpath = os.path.join(self.tmp_dir.name, name)
+        with open(fpath, 'wb') as ntf_file:
+            ntf_file.write(make_nitf(**kwargs))
+        self.n_files += 1
+        row = {
+            'id': self.n_files, 'filepath': fpath, 'date_time': DT,
+            'product_id': 11, 'area_id': 1, 'multihash': fpath,
+        }
+        self.insert_rows("file", [row])
+        return row
+
+
+class Test_NitfFingerprintIndex(NitfTestCase):
+    def get_fingerprint(self, row):
+        return self.index.get_fingerprint(row['id'], row['filepath'])
+
+    def test_synonyms_share_fingerprint(self):
+        """ synonyms are found & reported; other files are not """
+        original = self.write_nitf("a.ntf")
+        synonym = self.write_nitf(
+            "b.ntf", fdt="20190103163752", ftitle="other.NTF", iid2="other"
+        )
+        different = self.write_nitf("c.ntf", ostaid="other")
+        fingerprint = self.get_fingerprint(original)
+        self.assertEqual(self.get_fingerprint(synonym), fingerprint)
+        self.assertNotEqual(self.get_fingerprint(different), fingerprint)
+        paths = [original['filepath'], synonym['filepath']]
+        self.assertEqual(self.index.find_synonyms(fingerprint), paths)
+        # any worker sees the same report
+        self.assertEqual(
+            NitfFingerprintIndex(self.get_conn).duplicate_report(),
+            {fingerprint: paths}
+        )
+        self.assertEqual(
+            self.index.get_indexed([1, 2, 4]), {1: fingerprint, 2: fingerprint}
+        )
+
+    def test_changed_file_is_refingerprinted(self):
+        """ fingerprint is updated when the file changes """
+        row = self.write_nitf("a.ntf")
+        before = self.get_fingerprint(row)
+        with patch.object(
+            nitf_fingerprint, 'nitf_fingerprint',
+            wraps=nitf_fingerprint.nitf_fingerprint
+        ) as mock_fingerprint:
+            self.assertEqual(self.get_fingerprint(row), before)
+            mock_fingerprint.assert_not_called()
+        with open(row['filepath'], 'wb') as ntf_file:
+            ntf_file.write(make_nitf(image_data=b"y" * 65))
+        self.assertNotEqual(self.get_fingerprint(row), before)
+        self.assertEqual(self.index.find_synonyms(before), [])
+
+    def test_index_products(self):
+        row = self.write_nitf("a.ntf")
+        self.insert_rows("file", [
+            {'filepath': "/missing.ntf", 'product_id': 11},
+            {'filepath': "/other_product.zip", 'product_id': 36},
+        ])
+        indexed = list(self.index.index_products([11]))
+        self.assertEqual(
+            [filepath for filepath, _ in indexed],
+            [row['filepath'], "/missing.ntf"]
+        )
+        self.assertIsInstance(indexed[1][1], OSError)
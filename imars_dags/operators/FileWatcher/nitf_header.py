@@ -0,0 +1,225 @@
+"""
+Reads NITF 2.1 (and NSIF 1.0) file & image subheaders without GDAL.
+
+Only the header bytes are read, so this is cheap even for multi-GB
+WorldView .ntf files.
+Field names follow the keys `gdalinfo` reports (eg: NITF_FDT, NITF_IID2).
+Fields of the first image segment use the plain `NITF_` prefix like GDAL;
+those of later image segments are prefixed `NITF_IMAGE{n}_`.
+TREs are included as `NITF_FILE_TRE_{tag}` (file header) and
+`NITF_TRE_{tag}` (image subheader).
+Structural fields (lengths & counts) are not included in the fields;
+image data segment locations are returned separately instead.
+
+ref: MIL-STD-2500C
+"""
+
+# (name, length) of the file header fields before FL
+_FILE_HEADER_FIELDS = [
+    ('FHDR', 4), ('FVER', 5), ('CLEVEL', 2), ('STYPE', 4), ('OSTAID', 10),
+    ('FDT', 14), ('FTITLE', 80),
+    ('FSCLAS', 1), ('FSCLSY', 2), ('FSCODE', 11), ('FSCTLH', 2),
+    ('FSREL', 20), ('FSDCTP', 2), ('FSDCDT', 8), ('FSDCXM', 4),
+    ('FSDG', 1), ('FSDGDT', 8), ('FSCLTX', 43), ('FSCATP', 1),
+    ('FSCAUT', 40), ('FSCRSN', 1), ('FSSRDT', 8), ('FSCTLN', 15),
+    ('FSCOP', 5), ('FSCPYS', 5), ('ENCRYP', 1), ('FBKGC', 3),
+    ('ONAME', 24), ('OPHONE', 18),
+]
+_BINARY_FIELDS = ['FBKGC']
+# fields that differ between copies of the same NITF content
+# (they contain the file's delivery date, name & order number)
+VOLATILE_FIELDS = ['NITF_FDT', 'NITF_FTITLE', 'NITF_IID2']
+_FILE_HEADER_MIN_LEN = 360  # up to & including HL
+SUPPORTED_VERSIONS = [('NITF', '02.10'), ('NSIF', '01.00')]
+
+# image subheader fields up to ICORDS
+_IMAGE_HEADER_FIELDS = [
+    ('IM', 2), ('IID1', 10), ('IDATIM', 14), ('TGTID', 17), ('IID2', 80),
+    ('ISCLAS', 1), ('ISCLSY', 2), ('ISCODE', 11), ('ISCTLH', 2),
+    ('ISREL', 20), ('ISDCTP', 2), ('ISDCDT', 8), ('ISDCXM', 4),
+    ('ISDG', 1), ('ISDGDT', 8), ('ISCLTX', 43), ('ISCATP', 1),
+    ('ISCAUT', 40), ('ISCRSN', 1), ('ISSRDT', 8), ('ISCTLN', 15),
+    ('ENCRYP', 1), ('ISORCE', 42), ('NROWS', 8), ('NCOLS', 8),
+    ('PVTYPE', 3), ('IREP', 8), ('ICAT', 8), ('ABPP', 2), ('PJUST', 1),
+    ('ICORDS', 1),
+]
+_BAND_FIELDS = [
+    ('IREPBAND', 2), ('ISUBCAT', 6), ('IFC', 1), ('IMFLT', 3),
+]
+_IMAGE_MODE_FIELDS = [
+    ('ISYNC', 1), ('IMODE', 1), ('NBPR', 4), ('NBPC', 4), ('NPPBH', 4),
+    ('NPPBV', 4), ('NBPP', 2), ('IDLVL', 3), ('IALVL', 3), ('ILOC', 10),
+    ('IMAG', 4),
+]
+# (length-of-subheader, length-of-segment) field sizes for each segment
+# type listed in the file header after NUMI's image segments
+_OTHER_SEGMENT_SIZES = [
+    ('NUMS', 4, 6), ('NUMX', 0, 0), ('NUMT', 4, 5), ('NUMDES', 4, 9),
+    ('NUMRES', 4, 7),
+]
+
+
+class _Reader(object):
+    """sequential reader of fixed-width fields from header bytes"""
+    def __init__(self, data, offset=0):
+        self.data = data
+        self.pos = offset
+
+    def raw(self, length):
+        if self.pos + length > len(self.data):
+            raise ValueError("NITF header truncated")
+        value = self.data[self.pos:self.pos + length]
+        self.pos += length
+        return value
+
+    def text(self, length):
+        return self.raw(length).decode('latin-1').rstrip(' ')
+
+    def number(self, length):
+        value = self.raw(length).decode('latin-1').strip()
+        try:
+            return int(value) if value else 0
+        except ValueError:
+            raise ValueError(
+                "expected integer in NITF header, got '{}'".format(value)
+            )
+
+    def fields(self, field_list, out, prefix):
+        for name, length in field_list:
+            if name in _BINARY_FIELDS:
+                out[prefix + name] = self.raw(length).hex()
+            else:
+                out[prefix + name] = self.text(length)
+
+
+def _read_tres(data, out, prefix):
+    """adds each TRE in given TRE overflow area data to out"""
+    reader = _Reader(data)
+    while reader.pos < len(data):
+        tag = reader.text(6)
+        length = reader.number(5)
+        key = prefix + tag
+        n = 1
+        while key in out:  # some TREs repeat
+            n += 1
+            key = "{}{}_{}".format(prefix, tag, n)
+        out[key] = reader.raw(length).decode('latin-1')
+
+
+def _read_extension(reader, length_size, out, tre_prefix):
+    """reads (length, overflow, TREs) extension fields"""
+    ext_length = reader.number(length_size)
+    if ext_length > 0:
+        reader.number(3)  # overflow segment number
+        _read_tres(reader.raw(ext_length - 3), out, tre_prefix)
+
+
+def _parse_file_header(data):
+    """
+    returns (fields, header_length, image_segment_sizes) where
+    image_segment_sizes is a list of (subheader_length, data_length).
+    """
+    reader = _Reader(data)
+    fields = {}
+    reader.fields(_FILE_HEADER_FIELDS, fields, 'NITF_')
+    version = (fields['NITF_FHDR'], fields['NITF_FVER'])
+    if version not in SUPPORTED_VERSIONS:
+        raise ValueError("unsupported NITF version {}".format(version))
+    reader.number(12)  # FL
+    header_length = reader.number(6)
+    image_sizes = [
+        (reader.number(6), reader.number(10)) for _ in range(reader.number(3))
+    ]
+    for _, subheader_size, segment_size in _OTHER_SEGMENT_SIZES:
+        for _ in range(reader.number(3)):
+            reader.number(subheader_size)
+            reader.number(segment_size)
+    _read_extension(reader, 5, fields, 'NITF_FILE_TRE_')  # UDHDL
+    _read_extension(reader, 5, fields, 'NITF_FILE_TRE_')  # XHDL
+    return fields, header_length, image_sizes
+
+
+def _parse_image_subheader(data, prefix):
+    reader = _Reader(data)
+    fields = {}
+    reader.fields(_IMAGE_HEADER_FIELDS, fields, prefix)
+    if fields[prefix + 'ICORDS'] != '':
+        fields[prefix + 'IGEOLO'] = reader.text(60)
+    for i in range(reader.number(1)):
+        fields[prefix + 'ICOM{}'.format(i + 1)] = reader.text(80)
+    fields[prefix + 'IC'] = reader.text(2)
+    if fields[prefix + 'IC'] not in ['NC', 'NM']:
+        fields[prefix + 'COMRAT'] = reader.text(4)
+    n_bands = reader.number(1)
+    if n_bands == 0:
+        n_bands = reader.number(5)  # XBANDS
+    for band_n in range(1, n_bands + 1):
+        reader.fields(
+            _BAND_FIELDS, fields, "{}BAND{}_".format(prefix, band_n)
+        )
+        n_luts = reader.number(1)
+        if n_luts > 0:
+            n_lut_entries = reader.number(5)
+            fields["{}BAND{}_LUTD".format(prefix, band_n)] = reader.raw(
+                n_luts * n_lut_entries
+            ).hex()
+    reader.fields(_IMAGE_MODE_FIELDS, fields, prefix)
+    _read_extension(reader, 5, fields, prefix + 'TRE_')  # UDIDL
+    _read_extension(reader, 5, fields, prefix + 'TRE_')  # IXSHDL
+    return fields
+
+
+def parse_nitf(fileobj):
+    """
+    reads headers from a binary file object opened on a NITF file.
+
+    returns
+    -------
+    (fields, image_segments) where fields is a dict of header fields and
+    image_segments is a list of (offset, length) of each image data segment.
+    """
+    data = fileobj.read(_FILE_HEADER_MIN_LEN)
+    if len(data) < _FILE_HEADER_MIN_LEN:
+        raise ValueError("file too short to be NITF")
+    header_length = _Reader(data, _FILE_HEADER_MIN_LEN - 6).number(6)
+    data += fileobj.read(header_length - len(data))
+    fields, header_length, image_sizes = _parse_file_header(data)
+
+    image_segments = []
+    offset = header_length
+    for image_n, (subheader_length, data_length) in enumerate(image_sizes):
+        fileobj.seek(offset)
+        prefix = 'NITF_' if image_n == 0 else 'NITF_IMAGE{}_'.format(image_n)
+        fields.update(_parse_image_subheader(
+            fileobj.read(subheader_length), prefix
+        ))
+        offset += subheader_length
+        image_segments.append((offset, data_length))
+        offset += data_length
+    return fields, image_segments
+
+
+def read_nitf_header(filepath):
+    """returns dict of header fields for NITF file at filepath"""
+    with open(filepath, 'rb') as fileobj:
+        return parse_nitf(fileobj)[0]
+
+
+def get_field_name(key):
+    """returns key of first image's field for any image's field key"""
+    if key.startswith('NITF_IMAGE') and key[10:11].isdigit():
+        return 'NITF_' + key.split('_', 2)[2]
+    return key
+
+
+def diff_nitf_headers(fields_1, fields_2, ignore=()):
+    """
+    returns sorted list of keys whose values differ between two header
+    field dicts. Keys of fields named in ignore (eg: 'NITF_FDT') are
+    skipped for all image segments.
+    """
+    return sorted(
+        key for key in set(fields_1).union(fields_2)
+        if get_field_name(key) not in ignore and
+        fields_1.get(key) != fields_2.get(key)
+    )
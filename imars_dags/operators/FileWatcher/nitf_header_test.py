@@ -0,0 +1,116 @@
+# std modules:
+import io
+from unittest import TestCase
+
+from imars_dags.operators.FileWatcher.nitf_header import diff_nitf_headers
+from imars_dags.operators.FileWatcher.nitf_header import parse_nitf
+
+
+def _pad(value, length):
+    value = str(value)
+    assert len(value) <= length
+    return value + " " * (length - len(value))
+
+
+def _num(value, length):
+    return str(value).rjust(length, "0")
+
+
+def _tre(tag, data):
+    return _pad(tag, 6) + _num(len(data), 5) + data
+
+
+def make_nitf(fdt="20190207231221", ftitle="17MAY12-P1BS.NTF",
+              iid2="12MAY17WV0212", ostaid="DigitalGlb", image_data=b"x"*64):
+    """returns bytes of a minimal single-image NITF 2.1 file"""
+    security = "U" + " " * 166
+    xhd = "000" + _tre("FILTRE", "abc")
+    image_subheader = (
+        "IM" + _pad("P1BS", 10) + "20170512163422" + " " * 17 +
+        _pad(iid2, 80) + security + "0" + _pad("WV02", 42) +
+        _num(8, 8) + _num(8, 8) + "INT" + _pad("MONO", 8) +
+        _pad("MS", 8) + "11" + "R" + "G" +
+        _pad("2740N08240W2740N08240W2740N08240W2740N08240W", 60) +
+        "0" + "NC" + "1" + _pad("M", 2) + " " * 6 + "N" + "   " + "0" +
+        "0" + "B" + "0001" + "0001" + "0008" + "0008" + "08" + "001" +
+        "000" + "0000000000" + "1.0 " +
+        "00000" + _num(3 + len(_tre("RPC00B", "rpc")), 5) + "000" +
+        _tre("RPC00B", "rpc")
+    ).encode('latin-1')
+    header_fields = (
+        "NITF" + "02.10" + "05" + "BF01" + _pad(ostaid, 10) + fdt +
+        _pad(ftitle, 80) + security + "00000" + "00000" + "0"
+    )
+    header_tail = (
+        _pad("ONAME", 24) + _pad("", 18)
+    )
+    segments = (
+        "001" + _num(len(image_subheader), 6) + _num(len(image_data), 10) +
+        "000" + "000" + "000" + "000" + "000" +
+        "00000" + _num(len(xhd), 5) + xhd
+    )
+    header_length = len(header_fields) + 3 + len(header_tail) + 12 + 6 + \
+        len(segments)
+    file_length = header_length + len(image_subheader) + len(image_data)
+    header = (
+        header_fields.encode('latin-1') + b"\x00\x00\x00" +
+        (header_tail + _num(file_length, 12) + _num(header_length, 6) +
+         segments).encode('latin-1')
+    )
+    return header + image_subheader + image_data
+
+
+class Test_parse_nitf(TestCase):
+    def test_fields_and_segments(self):
+        """ reads header fields, TREs & image segment location """
+        data = make_nitf()
+        fields, segments = parse_nitf(io.BytesIO(data))
+        self.assertEqual(fields['NITF_FDT'], "20190207231221")
+        self.assertEqual(fields['NITF_FTITLE'], "17MAY12-P1BS.NTF")
+        self.assertEqual(fields['NITF_OSTAID'], "DigitalGlb")
+        self.assertEqual(fields['NITF_FBKGC'], "000000")
+        self.assertEqual(fields['NITF_FILE_TRE_FILTRE'], "abc")
+        self.assertEqual(fields['NITF_IID2'], "12MAY17WV0212")
+        self.assertEqual(fields['NITF_ISORCE'], "WV02")
+        self.assertEqual(fields['NITF_IC'], "NC")
+        self.assertEqual(fields['NITF_BAND1_IREPBAND'], "M")
+        self.assertEqual(fields['NITF_IMAG'], "1.0")
+        self.assertEqual(fields['NITF_TRE_RPC00B'], "rpc")
+        self.assertEqual(segments, [(len(data) - 64, 64)])
+        self.assertEqual(data[segments[0][0]:], b"x" * 64)
+
+    def test_unsupported_version(self):
+        """ non 2.1 NITF raises ValueError """
+        data = make_nitf().replace(b"NITF02.10", b"NITF02.00", 1)
+        with self.assertRaises(ValueError):
+            parse_nitf(io.BytesIO(data))
+
+
+class Test_diff_nitf_headers(TestCase):
+    def test_synonyms_differ_only_in_ignored(self):
+        """ synonyms only differ in volatile fields """
+        fields_1, _ = parse_nitf(io.BytesIO(make_nitf()))
+        fields_2, _ = parse_nitf(io.BytesIO(make_nitf(
+            fdt="20190103163752", ftitle="17MAY12-P1BS-2.NTF",
+            iid2="12MAY17WV0212-2"
+        )))
+        self.assertEqual(
+            diff_nitf_headers(fields_1, fields_2),
+            ['NITF_FDT', 'NITF_FTITLE', 'NITF_IID2']
+        )
+        self.assertEqual(
+            diff_nitf_headers(
+                fields_1, fields_2,
+                ignore=['NITF_FDT', 'NITF_FTITLE', 'NITF_IID2']
+            ),
+            []
+        )
+
+    def test_non_synonyms(self):
+        """ other header differences are reported """
+        fields_1, _ = parse_nitf(io.BytesIO(make_nitf()))
+        fields_2, _ = parse_nitf(io.BytesIO(make_nitf(ostaid="other")))
+        self.assertEqual(
+            diff_nitf_headers(fields_1, fields_2, ignore=['NITF_FDT']),
+            ['NITF_OSTAID']
+        )
@@ -0,0 +1,109 @@
+"""
+Backoff & quarantine of files the FileWatcher keeps coming back to.
+
+Each time a file is processed its `next_eligible_at` is pushed back by a
+delay that grows exponentially with its `proc_counter`, so files that
+were already handled are revisited less & less often and new files get
+the watcher's capacity. `fail_count` counts the visits a file failed
+(validation or area checks) in a row and is reset by a successful visit.
+Files that fail `quarantine_after` visits in a row are quarantined:
+`next_eligible_at` is set to QUARANTINE_UNTIL and they are never claimed
+again until someone resets it to NULL, eg:
+```
+UPDATE file SET next_eligible_at=NULL, fail_count=0
+    WHERE next_eligible_at='9999-12-31';
+```
+
+The columns & index are added to the imars_metadata db once, eg:
+```
+python3 -c "from imars_dags.operators.FileWatcher.retry_policy import *; \
+    print(RETRY_DDL_MYSQL)" | mysql imars_metadata
+```
+"""
+from datetime import datetime
+from datetime import timedelta
+
+QUARANTINE_UNTIL = datetime(9999, 12, 31)
+RETRY_DDL_MYSQL = """
+ALTER TABLE file
+    ADD COLUMN next_eligible_at DATETIME NULL DEFAULT NULL,
+    ADD COLUMN fail_count INT NOT NULL DEFAULT 0,
+    ADD INDEX product_eligible_idx (product_id, next_eligible_at);
+"""
+# rows not backed off or quarantined. Takes `now` as a parameter.
+ELIGIBLE_SQL = "(next_eligible_at IS NULL OR next_eligible_at <= %s)"
+# `file` columns read by the claim query when a RetryPolicy is used
+RETRY_COLS = ['fail_count']
+
+
+class RetryPolicy(object):
+    def __init__(
+        self, base_delay=timedelta(minutes=1), factor=2,
+        max_delay=timedelta(days=1), quarantine_after=10
+    ):
+        """
+        parameters:
+        -----------
+        base_delay : datetime.timedelta
+            delay after a file is processed for the first time.
+        factor : float
+            growth of the delay with each further visit.
+        max_delay : datetime.timedelta
+            longest delay between visits of a (not quarantined) file.
+        quarantine_after : int
+            number of failed visits in a row after which a file is
+            quarantined. None never quarantines.
+        """
+        self.base_delay = base_delay
+        self.factor = factor
+        self.max_delay = max_delay
+        self.quarantine_after = quarantine_after
+
+    def get_delay(self, proc_counter):
+        """returns delay before the next visit of a file w/ proc_counter"""
+        proc_counter = proc_counter or 0
+        max_seconds = self.max_delay.total_seconds()
+        # stop growing once past max_delay to avoid float overflow
+        seconds = self.base_delay.total_seconds()
+        for _ in range(proc_counter):
+            seconds *= self.factor
+            if seconds >= max_seconds:
+                return self.max_delay
+        return timedelta(seconds=seconds)
+
+    @staticmethod
+    def get_fail_count(fail_count, failed):
+        """
+        returns the file's fail_count after a visit.
+
+        parameters:
+        -----------
+        fail_count : int
+            the file's fail_count before this visit.
+        failed : bool
+            the file failed validation or was out of area on this visit.
+        """
+        if failed:
+            return (fail_count or 0) + 1
+        return 0
+
+    def is_quarantined(self, fail_count):
+        return (
+            self.quarantine_after is not None and
+            fail_count >= self.quarantine_after
+        )
+
+    def next_eligible_at(self, proc_counter, fail_count, now=None):
+        """
+        returns the next time a file may be claimed after being processed.
+
+        parameters:
+        -----------
+        proc_counter : int
+            the file's proc_counter before this visit.
+        fail_count : int
+            the file's fail_count after this visit (see get_fail_count).
+        """
+        if self.is_quarantined(fail_count):
+            return QUARANTINE_UNTIL
+        return (now or datetime.now()) + self.get_delay(proc_counter)
@@ -0,0 +1,76 @@
+# std modules:
+from datetime import datetime
+from datetime import timedelta
+from unittest import TestCase
+
+from imars_dags.operators.FileWatcher import sqlite_standin
+from imars_dags.operators.FileWatcher.metadata_writer import MetadataWriter
+from imars_dags.operators.FileWatcher.retry_policy import ELIGIBLE_SQL
+from imars_dags.operators.FileWatcher.retry_policy import QUARANTINE_UNTIL
+from imars_dags.operators.FileWatcher.retry_policy import RetryPolicy
+
+NOW = datetime(2019, 3, 1, 12)
+
+
+class Test_RetryPolicy(TestCase):
+    def setUp(self):
+        self.policy = RetryPolicy(
+            base_delay=timedelta(minutes=1), factor=2,
+            max_delay=timedelta(hours=1), quarantine_after=3
+        )
+
+    def test_exponential_delay(self):
+        """ delay doubles w/ each visit up to max_delay """
+        self.assertEqual(
+            [self.policy.get_delay(n).total_seconds() for n in range(8)],
+            [60, 120, 240, 480, 960, 1920, 3600, 3600]
+        )
+        self.assertEqual(
+            self.policy.get_delay(10**6), timedelta(hours=1)
+        )
+
+    def test_fail_count(self):
+        """ failures in a row are counted; a success resets the count """
+        self.assertEqual(self.policy.get_fail_count(None, failed=True), 1)
+        self.assertEqual(self.policy.get_fail_count(2, failed=True), 3)
+        self.assertEqual(self.policy.get_fail_count(2, failed=False), 0)
+
+    def test_quarantine(self):
+        """ only files failing quarantine_after visits in a row """
+        self.assertEqual(
+            self.policy.next_eligible_at(1, fail_count=2, now=NOW),
+            NOW + timedelta(minutes=2)
+        )
+        self.assertEqual(
+            self.policy.next_eligible_at(2, fail_count=3, now=NOW),
+            QUARANTINE_UNTIL
+        )
+        # many visits but not failing in a row
+        self.assertEqual(
+            self.policy.next_eligible_at(20, fail_count=1, now=NOW),
+            NOW + timedelta(hours=1)
+        )
+
+    def test_backed_off_rows_not_eligible(self):
+        """ rows written w/ next_eligible_at are excluded until then """
+        conn = sqlite_standin.connect()
+        sqlite_standin.insert_rows(conn, "file", [
+            {"filepath": "/f/{}".format(i)} for i in range(3)
+        ])
+        writer = MetadataWriter(lambda: conn)
+        writer.add(1, next_eligible_at=self.policy.next_eligible_at(
+            0, fail_count=0, now=NOW
+        ))
+        writer.add(2, next_eligible_at=QUARANTINE_UNTIL)
+        writer.flush()
+
+        def eligible_ids(now):
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id FROM file WHERE " + ELIGIBLE_SQL + " ORDER BY id",
+                (now,)
+            )
+            return [row[0] for row in cursor.fetchall()]
+        self.assertEqual(eligible_ids(NOW), [3])
+        self.assertEqual(eligible_ids(NOW + timedelta(minutes=1)), [1, 3])
+        conn.close()
@@ -0,0 +1,98 @@
+"""
+Routing of files from many products through a single FileWatcher.
+
+A routing table maps each watched `product_id` to the
+`(dags_to_trigger, area_names)` its files trigger. All routed products
+are read with one query: a `UNION ALL` of one `ORDER BY ... LIMIT` subquery
+per product, whose results are interleaved round-robin so a large backlog
+of one product cannot starve the others.
+"""
+from itertools import zip_longest
+
+DEFAULT_ORDER_BY = "proc_counter,last_processed ASC"
+
+
+def get_routes(
+    routes=None, product_ids=None, dags_to_trigger=None, area_names=None
+):
+    """
+    returns routing table {product_id: (dags_to_trigger, area_names)} from
+    either a routing table or (for a single route) the other args.
+    """
+    if routes is None:
+        if product_ids is None or dags_to_trigger is None:
+            raise ValueError(
+                "either routes or product_ids & dags_to_trigger must be given"
+            )
+        routes = {
+            product_id: (dags_to_trigger, area_names)
+            for product_id in product_ids
+        }
+    elif product_ids is not None or dags_to_trigger is not None:
+        raise ValueError(
+            "routes cannot be combined with product_ids or dags_to_trigger"
+        )
+    return {
+        int(product_id): (list(dags), list(areas))
+        for product_id, (dags, areas) in routes.items()
+    }
+
+
+def get_union_sql(selections, cols, limit, order_by=DEFAULT_ORDER_BY):
+    """
+    returns sql selecting up to limit rows of cols for each of the given
+    WHERE clauses. Each row has an extra last column: the index of the
+    selection it came from.
+    """
+    parts = [
+        "SELECT * FROM (SELECT {cols},{i} AS selection_n FROM file "
+        "WHERE {sel} ORDER BY {order_by} LIMIT {limit}) part_{i}".format(
+            cols=",".join(cols), i=i, sel=selection, order_by=order_by,
+            limit=int(limit)
+        )
+        for i, selection in enumerate(selections)
+    ]
+    return " UNION ALL ".join(parts)
+
+
+def interleave(rows, n_selections, limit, scheduler=None, keys=None):
+    """
+    returns up to limit rows taken round-robin from each selection.
+    rows must end w/ the selection index (see get_union_sql) and be in
+    priority order within each selection.
+    If a scheduler (eg: fair_scheduler.DeficitRoundRobin) is given it
+    orders the rows instead, using keys[i] as the key of selection i.
+    """
+    by_selection = [[] for _ in range(n_selections)]
+    for row in rows:
+        by_selection[row[-1]].append(row[:-1])
+    if scheduler is not None:
+        keys = keys or list(range(n_selections))
+        return scheduler.schedule(dict(zip(keys, by_selection)), limit)
+    return [
+        row
+        for rank in zip_longest(*by_selection)
+        for row in rank if row is not None
+    ][:limit]
+
+
+def select_round_robin(
+    cursor, selections, cols, limit, params=(), order_by=DEFAULT_ORDER_BY,
+    scheduler=None, keys=None
+):
+    """
+    returns up to limit rows (as dicts of cols) matching any of the given
+    WHERE clauses, fairly interleaved between them.
+    params are the parameters of each selection (the same for all).
+    scheduler & keys are passed to interleave.
+    """
+    cursor.execute(
+        get_union_sql(selections, cols, limit, order_by),
+        list(params) * len(selections)
+    )
+    return [
+        dict(zip(cols, row))
+        for row in interleave(
+            cursor.fetchall(), len(selections), limit, scheduler, keys
+        )
+    ]
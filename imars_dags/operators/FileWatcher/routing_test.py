@@ -0,0 +1,55 @@
+# std modules:
+from unittest import TestCase
+
+from imars_dags.operators.FileWatcher import sqlite_standin
+from imars_dags.operators.FileWatcher.routing import get_routes
+from imars_dags.operators.FileWatcher.routing import select_round_robin
+
+
+class Test_get_routes(TestCase):
+    def test_single_route(self):
+        """ product_ids args give one route per product """
+        self.assertEqual(
+            get_routes(
+                product_ids=[11, 24], dags_to_trigger=['a'],
+                area_names=['na']
+            ),
+            {11: (['a'], ['na']), 24: (['a'], ['na'])}
+        )
+
+    def test_routes_xor_product_ids(self):
+        """ routes cannot be combined w/ product_ids """
+        with self.assertRaises(ValueError):
+            get_routes(
+                routes={11: (['a'], ['na'])}, product_ids=[11],
+                dags_to_trigger=['a']
+            )
+        with self.assertRaises(ValueError):
+            get_routes(area_names=['na'])
+
+
+class Test_select_round_robin(TestCase):
+    def setUp(self):
+        self.conn = sqlite_standin.connect()
+        # big backlog of product 1, a few of 2 & 3
+        sqlite_standin.insert_rows(self.conn, "file", [
+            {"filepath": "/{}/{}".format(product_id, i),
+             "product_id": product_id, "proc_counter": i}
+            for product_id, n_files in [(1, 10), (2, 2), (3, 1)]
+            for i in range(n_files)
+        ])
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_products_interleaved(self):
+        """ each product gets a turn in every round """
+        rows = select_round_robin(
+            self.conn.cursor(),
+            ["product_id={}".format(pid) for pid in [1, 2, 3]],
+            ['product_id', 'filepath'], 6
+        )
+        self.assertEqual(
+            [row['filepath'] for row in rows],
+            ['/1/0', '/2/0', '/3/0', '/1/1', '/2/1', '/1/2']
+        )
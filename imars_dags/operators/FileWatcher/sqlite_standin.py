@@ -0,0 +1,135 @@
+"""
+SQLite stand-in for the imars_metadata MySQL db.
+
+Only the tables & columns used by the FileWatcher are created, plus the
+`file_changelog` table & triggers (see changelog.CHANGELOG_DDL_MYSQL),
+the lease & backoff columns (see claim.CLAIM_DDL_MYSQL &
+retry_policy.RETRY_DDL_MYSQL) and the `nitf_fingerprint` table (see
+nitf_fingerprint.NITF_FINGERPRINT_DDL_MYSQL).
+Connections returned accept queries written for MySQLdb (`%s` paramstyle,
+`INSERT IGNORE`, no-op `ON DUPLICATE KEY UPDATE id=id`) so the same SQL
+can be tested locally.
+Used by tests and offline benchmarks; not for production use.
+"""
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS area (
+    id INTEGER PRIMARY KEY,
+    short_name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS product (
+    id INTEGER PRIMARY KEY,
+    short_name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS file (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    filepath TEXT NOT NULL,
+    date_time TIMESTAMP,
+    product_id INTEGER,
+    area_id INTEGER,
+    status_id INTEGER,
+    n_bytes INTEGER,
+    multihash TEXT,
+    last_ipfs_host TEXT,
+    last_processed TIMESTAMP,
+    proc_counter INTEGER NOT NULL DEFAULT 0,
+    provenance TEXT,
+    claimed_by TEXT,
+    claim_expires TIMESTAMP,
+    next_eligible_at TIMESTAMP,
+    fail_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS product_eligible_idx
+    ON file (product_id, next_eligible_at);
+CREATE TABLE IF NOT EXISTS file_changelog (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_id INTEGER NOT NULL,
+    product_id INTEGER,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS nitf_fingerprint (
+    file_id INTEGER PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fingerprint_idx ON nitf_fingerprint (fingerprint);
+CREATE TRIGGER IF NOT EXISTS file_changelog_insert AFTER INSERT ON file
+BEGIN
+    INSERT INTO file_changelog (file_id, product_id)
+    VALUES (NEW.id, NEW.product_id);
+END;
+CREATE TRIGGER IF NOT EXISTS file_changelog_to_load
+AFTER UPDATE OF status_id ON file
+WHEN NEW.status_id = 3 AND OLD.status_id IS NOT 3
+BEGIN
+    INSERT INTO file_changelog (file_id, product_id)
+    VALUES (NEW.id, NEW.product_id);
+END;
+"""
+
+
+def _to_qmark(sql, params):
+    """converts MySQLdb `format` paramstyle to sqlite3 `qmark`"""
+    sql = sql.replace("INSERT IGNORE ", "INSERT OR IGNORE ")
+    sql = sql.replace(
+        " ON DUPLICATE KEY UPDATE id=id", " ON CONFLICT DO NOTHING"
+    )
+    if params is None:
+        return sql
+    return sql.replace("%s", "?").replace("%%", "%")
+
+
+class _Cursor(object):
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=None):
+        if params is None:
+            return self._cursor.execute(_to_qmark(sql, None))
+        return self._cursor.execute(_to_qmark(sql, params), params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._cursor.executemany(_to_qmark(sql, []), seq_of_params)
+
+    def __getattr__(self, name):
+        # fetchone, fetchall, rowcount, description, close, etc
+        return getattr(self._cursor, name)
+
+
+class _Connection(object):
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return _Cursor(self._conn.cursor())
+
+    def __getattr__(self, name):
+        # commit, rollback, close, etc
+        return getattr(self._conn, name)
+
+
+def connect(database=":memory:"):
+    """returns a connection to a sqlite db w/ the metadata db schema"""
+    conn = sqlite3.connect(
+        database,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        check_same_thread=False,
+    )
+    conn.executescript(SCHEMA)
+    return _Connection(conn)
+
+
+def insert_rows(conn, table, rows):
+    """inserts list of dicts as rows of given table"""
+    for row in rows:
+        cols = list(row.keys())
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO {} ({}) VALUES ({})".format(
+                table, ",".join(cols), ",".join(["%s"] * len(cols))
+            ),
+            [row[col] for col in cols]
+        )
+    conn.commit()
@@ -0,0 +1,164 @@
+"""
+Validation of a batch of file rows before triggering.
+
+Each file is `stat`ed once and that snapshot is shared by all the checks.
+Files are validated on a bounded thread pool so slow NFS responses for
+one file do not hold up the rest of the batch.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+import os
+import time
+
+# from imars_dags.operators.FileWatcher.check_ipfs_accessible \
+#     import check_ipfs_accessible
+from imars_dags.operators.FileWatcher.check_locally_accessible \
+    import check_locally_accessible
+from imars_dags.operators.FileWatcher.check_for_duplicates \
+    import check_for_duplicates
+from imars_dags.operators.FileWatcher.check_filesize_match \
+    import check_filesize_match
+from imars_dags.operators.FileWatcher.check_multihash import check_multihash
+from imars_dags.util.timing import PhaseTimer
+
+
+def _get_stat(fpath):
+    """returns `os.stat` result for fpath or None if it cannot be stat'ed"""
+    try:
+        return os.stat(fpath)
+    except OSError as os_err:
+        print(os_err)
+        return None
+
+
+def _validate_file(
+    f_meta, check_hash=False, duplicate_index=None, deadline=None,
+    fingerprints=None
+):
+    """
+    performs validation on file row before triggering.
+    `failed` is True if any check failed; `status_id` is changed only by
+    checks that have a status for the failure.
+    The time taken by each check is returned as `phase_timer`.
+    Raises TimeoutError if still hashing the file at deadline.
+    """
+    timer = PhaseTimer()
+    fpath = f_meta['filepath']
+    new_status = int(f_meta.get("status_id", 1))
+    failed = False
+    print("validating fpath:\n\t{}".format(fpath))
+    with timer.phase("stat"):
+        f_stat = _get_stat(fpath)
+
+    # TODO: make available on ipfs
+    # hash, ipfs_host = check_ipfs_accessible(f_meta)
+    hash, ipfs_host = (f_meta['filepath'], "NA")  # temporary disable
+
+    try:
+        check_locally_accessible(f_meta, f_stat)
+    except AssertionError as a_err:
+        print(a_err)
+        new_status = 8  # status_id.lost
+        failed = True
+
+    if f_stat is not None:  # the other checks need the file
+        try:
+            with timer.phase("check_filesize"):
+                check_filesize_match(f_meta, f_stat)
+        except RuntimeError as r_err:
+            print(r_err)
+            new_status = 6  # status_id.wrong_size
+            failed = True
+
+        if check_hash:
+            try:
+                with timer.phase("check_multihash"):
+                    hash = check_multihash(f_meta, f_stat, deadline)
+            except ValueError as v_err:
+                # content changed since load. No status fits; keep the
+                # status & the db hash, but do not trigger.
+                print(v_err)
+                hash = f_meta['multihash']
+                failed = True
+
+        try:
+            with timer.phase("check_for_duplicates"):
+                check_for_duplicates(
+                    f_meta, duplicate_index, f_stat, fingerprints
+                )
+        except NotImplementedError:
+            print('this file found to be a duplicate of another in db.')
+            new_status = 7  # status_id.duplicate
+            failed = True
+
+    return {
+        "last_ipfs_host": ipfs_host,
+        "multihash": hash,
+        "status_id": new_status,
+        "failed": failed,
+        "phase_timer": timer,
+    }
+
+
+def validate_files(
+    f_metas, max_workers=8, deadline=None, check_hash=False,
+    duplicate_index=None, fingerprints=None
+):
+    """
+    Validates file rows concurrently.
+
+    parameters:
+    -----------
+    f_metas : list of dict
+        file rows to validate.
+    max_workers : int
+        max number of files validated at once.
+    deadline : float
+        `time.monotonic()` value after which no more validations are
+        started. Validations already running are allowed to finish, but
+        hashing is stopped & those files are left unvalidated. Their
+        hashing resumes where it stopped when they are next claimed (see
+        multihash.py).
+    check_hash : bool
+        compute (cached) IPFS multihash of each file & compare w/ the db.
+    duplicate_index : DuplicateGroupIndex
+        refreshed index used to skip per-file duplicate queries.
+    fingerprints : FingerprintBatch
+        NITF fingerprints read for the whole batch (see
+        check_for_duplicates.prepare_fingerprints).
+
+    returns
+    -------
+    list of (f_meta, validation_meta) for the files validated, in the same
+    order as f_metas.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                _validate_file, f_meta, check_hash, duplicate_index,
+                deadline, fingerprints
+            )
+            for f_meta in f_metas
+        ]
+        timeout = None
+        if deadline is not None:
+            timeout = max(0, deadline - time.monotonic())
+        done, not_done = wait(futures, timeout=timeout)
+        for future in not_done:
+            future.cancel()
+    # exiting the `with` waits for validations still running
+    results = []
+    for f_meta, future in zip(f_metas, futures):
+        if future.cancelled():
+            continue
+        try:
+            results.append((f_meta, future.result()))
+        except TimeoutError as t_err:
+            print("{}; progress saved for the next visit:\n\t{}".format(
+                t_err, f_meta['filepath']
+            ))
+    if len(results) < len(f_metas):
+        print("Time budget exhausted; {} files left unvalidated.".format(
+            len(f_metas) - len(results)
+        ))
+    return results
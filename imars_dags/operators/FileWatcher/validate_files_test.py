@@ -0,0 +1,120 @@
+# std modules:
+from datetime import datetime
+import os
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+from imars_dags.operators.FileWatcher import check_multihash
+from imars_dags.operators.FileWatcher import validate_files as module
+from imars_dags.operators.FileWatcher.duplicate_index \
+    import DuplicateGroupIndex
+from imars_dags.operators.FileWatcher.multihash import MultihashCache
+from imars_dags.operators.FileWatcher.validate_files import validate_files
+from imars_dags.util.testing import MetadataDBTestCase
+
+HELLO_HASH = 'QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o'
+
+
+class Test_validate_files(MetadataDBTestCase):
+    def setUp(self):
+        super(Test_validate_files, self).setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.f_metas = []
+        for i, (content, n_bytes, status_id) in enumerate([
+            (b'hello world\n', 12, None),  # ok
+            (b'hello world\n', 100, 3),  # wrong size
+            (None, 12, 3),  # lost
+        ]):
+            f_meta = {
+                'id': i + 1,
+                'filepath': os.path.join(self.tmpdir.name, str(i)),
+                'date_time': datetime(2019, 11, 30, 15, i),
+                'product_id': 36,
+                'area_id': 1,
+                'n_bytes': n_bytes,
+                'multihash': None,
+            }
+            if status_id is not None:
+                f_meta['status_id'] = status_id
+            if content is not None:
+                with open(f_meta['filepath'], 'wb') as f_obj:
+                    f_obj.write(content)
+            self.f_metas.append(f_meta)
+        self.insert_rows("file", [
+            {col: f_meta[col] for col in ['filepath', 'date_time',
+                                          'product_id', 'area_id']}
+            for f_meta in self.f_metas
+        ])
+        self.duplicate_index = DuplicateGroupIndex(self.get_conn)
+        self.duplicate_index.refresh()
+        patcher = patch.object(
+            check_multihash, '_CACHE', MultihashCache(":memory:")
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_statuses(self):
+        """ failed checks set the status; order of f_metas is kept """
+        results = validate_files(
+            self.f_metas, max_workers=2, duplicate_index=self.duplicate_index
+        )
+        self.assertEqual([f_meta for f_meta, _ in results], self.f_metas)
+        self.assertEqual(
+            [meta['status_id'] for _, meta in results], [1, 6, 8]
+        )
+        self.assertEqual(
+            [meta['failed'] for _, meta in results], [False, True, True]
+        )
+        self.assertIn("stat", results[0][1]['phase_timer'].totals)
+
+    def test_check_hash(self):
+        results = validate_files(
+            self.f_metas[:1], check_hash=True,
+            duplicate_index=self.duplicate_index
+        )
+        self.assertEqual(results[0][1]['multihash'], HELLO_HASH)
+
+    def test_hash_mismatch(self):
+        """ fails w/o changing the status or the hash in the db """
+        f_meta = dict(
+            self.f_metas[0], status_id=3,
+            multihash='QmbFMke1KXqnYyBBWxB74N4c5SBnJMVAiMNRcGu6x1AwQH'
+        )
+        _, meta = validate_files(
+            [f_meta], check_hash=True, duplicate_index=self.duplicate_index
+        )[0]
+        self.assertEqual(
+            (meta['status_id'], meta['multihash'], meta['failed']),
+            (3, f_meta['multihash'], True)
+        )
+
+    def test_hashing_stops_at_deadline(self):
+        """ files still being hashed at the deadline are not validated """
+        results = validate_files(
+            self.f_metas[:1], check_hash=True, deadline=time.monotonic(),
+            duplicate_index=self.duplicate_index
+        )
+        self.assertEqual(results, [])
+
+    def test_deadline(self):
+        """ no validations are started after the deadline """
+        deadline_passed = threading.Event()
+        release = threading.Timer(0.1, deadline_passed.set)
+        validate_file = module._validate_file
+
+        def slow_validate_file(*args):
+            deadline_passed.wait(1)  # still running at the deadline
+            return validate_file(*args)
+
+        release.start()
+        with patch.object(module, '_validate_file', slow_validate_file):
+            results = validate_files(
+                self.f_metas, max_workers=1, deadline=time.monotonic(),
+                duplicate_index=self.duplicate_index
+            )
+        self.assertEqual(
+            [f_meta for f_meta, _ in results], self.f_metas[:1]
+        )
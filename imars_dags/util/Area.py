@@ -1,8 +1,6 @@
-import imars_etl
+from imars_dags.util import registry
 
 
-# TODO: memoize this?
-#  https://stackoverflow.com/questions/10879137/how-can-i-memoize-a-class-instantiation-in-python
 class Area(object):
     """
     Usage:
@@ -13,10 +11,12 @@ class Area(object):
     print(gulf_area.short_name)
     print(gulf_area.id)
     ```
+    ids are looked up in the cached registry (see registry.py), so
+    creating many Areas does not query the metadata db each time.
     """
     def __init__(self, short_name):
         self.short_name = short_name
-        self.id = imars_etl.id_lookup(short_name, "area")
+        self.id = registry.id_lookup(short_name, "area")
 
     def __getitem__(self, n):
         """For backwards-compat w/ older scripts"""
@@ -87,3 +87,13 @@ SLEEP_ARGS = {
     'priority_weight': PRIORITY.SLEEP
     # 'pool': POOL.SLEEP
 }
+
+
+class GRAPHITE:
+    """
+    carbon daemon that metrics are sent to using the pickle protocol
+    (see imars_dags.dags.bouys_to_graphite.GraphiteInterface).
+    """
+    HOST = "graphite"
+    PORT = 2004
+    PREFIX = "imars_dags"  # root of metric names from this repo
@@ -0,0 +1,174 @@
+"""
+In-process cache of the small lookup tables (`area` & `product`) of the
+imars_metadata db so that DAG factories & the FileWatcher look up ids &
+short names as dict hits instead of one `imars_etl.id_lookup` query each.
+
+Usage:
+```
+from imars_dags.util import registry
+
+area_id = registry.id_lookup("florida", "area")
+area_name = registry.id_lookup(table="area", value=area_id)
+```
+
+Each table is loaded whole (one connection for all tables) & kept for
+`ttl` seconds. Every load is written to a JSON snapshot on disk; while the
+snapshot is younger than the ttl other processes (eg: the scheduler
+re-parsing DAG files) load it instead of connecting to the db. If the db
+cannot be reached an older snapshot is used.
+"""
+import json
+import os
+import threading
+import time
+
+METADATA_CONN_ID = 'imars_metadata'
+DEFAULT_SNAPSHOT_PATH = os.path.expanduser(
+    "~/.cache/imars_dags/registry.json"
+)
+TABLES = ['area', 'product']
+_REGISTRY = None  # created on first use & shared by all threads
+
+
+def _get_metadata_conn():
+    # imported here so lookups from a snapshot work w/o airflow configured
+    from airflow.hooks.mysql_hook import MySqlHook
+    return MySqlHook(mysql_conn_id=METADATA_CONN_ID).get_conn()
+
+
+class Registry(object):
+    def __init__(
+        self, get_conn=_get_metadata_conn,
+        snapshot_path=DEFAULT_SNAPSHOT_PATH, ttl=3600, clock=time.time
+    ):
+        """
+        parameters:
+        -----------
+        get_conn : function
+            returns a new DB-API connection to the metadata db.
+        snapshot_path : str
+            JSON file the tables are cached in. None keeps no snapshot.
+        ttl : float
+            seconds before the tables are reloaded.
+        """
+        self.get_conn = get_conn
+        self.snapshot_path = snapshot_path
+        self.ttl = ttl
+        self.clock = clock
+        self._ids = {}  # table -> {short_name: id}
+        self._names = {}  # table -> {id: short_name}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _set_tables(self, tables, loaded_at):
+        self._ids = {
+            table: {short_name: id for id, short_name in rows}
+            for table, rows in tables.items()
+        }
+        self._names = {
+            table: {id: short_name for id, short_name in rows}
+            for table, rows in tables.items()
+        }
+        self._loaded_at = loaded_at
+
+    def _read_snapshot(self):
+        """returns (loaded_at, tables) from the snapshot or None"""
+        if self.snapshot_path is None:
+            return None
+        try:
+            with open(self.snapshot_path) as f_obj:
+                snapshot = json.load(f_obj)
+            return snapshot['loaded_at'], snapshot['tables']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_snapshot(self, tables, loaded_at):
+        if self.snapshot_path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            tmp_path = "{}.{}.tmp".format(self.snapshot_path, os.getpid())
+            with open(tmp_path, "w") as f_obj:
+                json.dump({'loaded_at': loaded_at, 'tables': tables}, f_obj)
+            os.replace(tmp_path, self.snapshot_path)  # atomic
+        except OSError as os_err:
+            print("cannot write registry snapshot: {}".format(os_err))
+
+    def _query_tables(self):
+        """returns {table: [(id, short_name), ...]} read from the db"""
+        conn = self.get_conn()
+        try:
+            cursor = conn.cursor()
+            tables = {}
+            for table in TABLES:
+                cursor.execute("SELECT id,short_name FROM {}".format(table))
+                tables[table] = [list(row) for row in cursor.fetchall()]
+            cursor.close()
+        finally:
+            conn.close()
+        return tables
+
+    def refresh(self, force=False):
+        """
+        (re)loads the tables from the snapshot if it is younger than the
+        ttl, else from the db. force skips the snapshot.
+        """
+        with self._lock:
+            now = self.clock()
+            snapshot = self._read_snapshot()
+            if (
+                not force and snapshot is not None and
+                now - snapshot[0] <= self.ttl
+            ):
+                self._set_tables(snapshot[1], snapshot[0])
+                return
+            try:
+                tables = self._query_tables()
+            except Exception as err:
+                if snapshot is None:
+                    raise
+                print("using stale registry snapshot; db failed: {}".format(
+                    err
+                ))
+                self._set_tables(snapshot[1], now)  # retry after ttl
+                return
+            self._write_snapshot(tables, now)
+            self._set_tables(tables, now)
+
+    def _get(self, mapping, table, key):
+        if (
+            self._loaded_at is None or
+            self.clock() - self._loaded_at > self.ttl
+        ):
+            self.refresh()
+        if key not in getattr(self, mapping).get(table, {}):
+            self.refresh(force=True)  # maybe added since loaded
+        try:
+            return getattr(self, mapping)[table][key]
+        except KeyError:
+            raise KeyError("{} '{}' not found in metadata db".format(
+                table, key
+            ))
+
+    def get_id(self, table, short_name):
+        return self._get('_ids', table, short_name)
+
+    def get_short_name(self, table, id):
+        return self._get('_names', table, int(id))
+
+
+def get_registry():
+    global _REGISTRY
+    if _REGISTRY is None:
+        _REGISTRY = Registry()
+    return _REGISTRY
+
+
+def id_lookup(value, table):
+    """
+    like `imars_etl.id_lookup`: returns the short_name for an id or the id
+    for a short_name in given table.
+    """
+    if isinstance(value, str):
+        return get_registry().get_id(table, value)
+    return get_registry().get_short_name(table, value)
@@ -0,0 +1,87 @@
+# std modules:
+import os
+import tempfile
+
+from imars_dags.util.registry import Registry
+from imars_dags.util.testing import FakeClock
+from imars_dags.util.testing import MetadataDBTestCase
+
+
+class Test_Registry(MetadataDBTestCase):
+    def setUp(self):
+        super(Test_Registry, self).setUp()
+        self.insert_rows("area", [
+            {'id': 1, 'short_name': "florida"},
+            {'id': 5, 'short_name': "big_bend"},
+        ])
+        self.insert_rows("product", [
+            {'id': 36, 'short_name': "s3a_ol_1_efr"},
+        ])
+        self.db_up = True
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.snapshot_path = os.path.join(self.tmpdir.name, "registry.json")
+        self.clock = FakeClock(1000.0)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        super(Test_Registry, self).tearDown()
+
+    def get_conn(self):
+        if not self.db_up:
+            raise RuntimeError("db is down")
+        return super(Test_Registry, self).get_conn()
+
+    def make_registry(self, ttl=60):
+        return Registry(
+            self.get_conn, self.snapshot_path, ttl=ttl, clock=self.clock
+        )
+
+    def test_lookups_are_cached(self):
+        """ many lookups of both tables use one connection """
+        registry = self.make_registry()
+        for _ in range(10):
+            self.assertEqual(registry.get_id("area", "florida"), 1)
+            self.assertEqual(registry.get_short_name("area", 5), "big_bend")
+            self.assertEqual(
+                registry.get_short_name("product", 36), "s3a_ol_1_efr"
+            )
+        self.assertEqual(self.n_conns, 1)
+
+    def test_snapshot_avoids_db(self):
+        """ a fresh snapshot from another process needs no db """
+        self.make_registry().get_id("area", "florida")
+        self.db_up = False
+        self.assertEqual(self.make_registry().get_id("area", "big_bend"), 5)
+
+    def test_ttl_expiry_reloads(self):
+        """ changes are seen once the ttl has passed """
+        registry = self.make_registry(ttl=60)
+        self.assertEqual(registry.get_short_name("area", 1), "florida")
+        self.conn.cursor().execute(
+            "UPDATE area SET short_name='fl' WHERE id=1"
+        )
+        self.conn.commit()
+        self.clock.now += 30
+        self.assertEqual(registry.get_short_name("area", 1), "florida")
+        self.clock.now += 31
+        self.assertEqual(registry.get_short_name("area", 1), "fl")
+        self.assertEqual(self.n_conns, 2)
+
+    def test_stale_snapshot_when_db_down(self):
+        """ an expired snapshot is used if the db cannot be reached """
+        self.make_registry().get_id("area", "florida")
+        self.clock.now += 3600
+        self.db_up = False
+        self.assertEqual(self.make_registry().get_id("area", "florida"), 1)
+
+    def test_miss_reloads_then_raises(self):
+        """ unknown names are re-checked in the db once """
+        registry = self.make_registry()
+        registry.get_id("area", "florida")
+        self.insert_rows("area", [
+            {'id': 9, 'short_name': "texas_ne"},
+        ])
+        self.assertEqual(registry.get_id("area", "texas_ne"), 9)
+        with self.assertRaises(KeyError):
+            registry.get_id("area", "atlantis")
+        self.assertEqual(self.n_conns, 3)
@@ -0,0 +1,107 @@
+"""
+Helpers shared by the unit tests (`*_test.py`).
+"""
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from imars_dags.operators.FileWatcher import sqlite_standin
+
+
+class FakeClock(object):
+    """
+    Clock for code that takes `clock` (& `sleep`) functions. Time only
+    moves when the test sets `now` or, if advance_on_sleep, when slept on.
+
+    Usage:
+    ```
+    clock = FakeClock()
+    timer = PhaseTimer(clock=clock)  # or clock=clock.clock
+    clock.now += 5
+    ```
+    """
+    def __init__(self, now=0.0, advance_on_sleep=True, on_sleep=None):
+        """
+        parameters:
+        -----------
+        on_sleep : function
+            called w/ the number of sleeps so far after each sleep.
+        """
+        self.now = now
+        self.advance_on_sleep = advance_on_sleep
+        self.on_sleep = on_sleep
+        self.waits = []  # seconds of each sleep
+
+    def __call__(self):
+        return self.now
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.waits.append(seconds)
+        if self.advance_on_sleep:
+            self.now += seconds
+        if self.on_sleep is not None:
+            self.on_sleep(len(self.waits))
+
+
+class MetadataDBTestCase(TestCase):
+    """
+    TestCase w/ a temporary sqlite_standin metadata db. `get_conn` opens a
+    new connection to it each call (like MySqlHook.get_conn) & counts them
+    in `n_conns`; `conn` is a connection kept by the test itself.
+    """
+    def setUp(self):
+        tmp_fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(tmp_fd)
+        self.conn = sqlite_standin.connect(self.db_path)
+        self.n_conns = 0
+
+    def tearDown(self):
+        self.conn.close()
+        os.remove(self.db_path)
+
+    def get_conn(self):
+        self.n_conns += 1
+        return sqlite_standin.connect(self.db_path)
+
+    def insert_rows(self, table, rows):
+        sqlite_standin.insert_rows(self.conn, table, rows)
+
+    def select(self, sql, params=None):
+        """returns all rows of a query run on `conn`"""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+
+class AirflowDBTestCase(TestCase):
+    """
+    TestCase w/ airflow's `settings.Session` bound to a new in-memory sqlite
+    db that has the `dag` & `dag_run` tables.
+    """
+    def setUp(self):
+        # imported here so tests w/o airflow can use the helpers above
+        from airflow import settings
+        from airflow.models import DagModel
+        from airflow.models import DagRun
+        from airflow.models.base import Base
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(
+            engine, tables=[DagModel.__table__, DagRun.__table__]
+        )
+        patcher = patch.object(
+            settings, 'Session', sessionmaker(bind=engine)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.session = settings.Session()
+        self.addCleanup(self.session.close)
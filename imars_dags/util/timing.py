@@ -0,0 +1,104 @@
+"""
+Timing of the phases of a task, for logs & graphite.
+
+Usage:
+```
+from imars_dags.util.timing import PhaseTimer
+
+timer = PhaseTimer()
+with timer.phase("claim"):
+    rows = claim()
+
+@timer.timed("parse")
+def parse(path):
+    ...
+
+print(timer.log_line("batch_done", n_files=len(rows)))
+graphite.send_data(timer.to_graphite("imars_dags.my_operator"))
+```
+Timers are safe to share between threads; time spent in the same phase by
+several threads adds up.
+"""
+from contextlib import contextmanager
+from functools import wraps
+import json
+import threading
+import time
+
+
+class PhaseTimer(object):
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.totals = {}  # phase name -> seconds
+        self.counts = {}  # phase name -> number of times timed
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.totals[name] = self.totals.get(name, 0) + seconds
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    @contextmanager
+    def phase(self, name):
+        """times the enclosed block as phase name (even if it raises)"""
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.add(name, self.clock() - start)
+
+    def timed(self, name=None):
+        """decorator timing each call of a function as phase name"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.phase(name or func.__name__):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def merge(self, other):
+        """adds the phases timed by another PhaseTimer to this one"""
+        for name, seconds in other.as_dict().items():
+            with self._lock:
+                self.totals[name] = self.totals.get(name, 0) + seconds
+                self.counts[name] = (
+                    self.counts.get(name, 0) + other.counts[name]
+                )
+
+    def as_dict(self):
+        """returns {phase name: seconds}"""
+        with self._lock:
+            return dict(self.totals)
+
+    def to_graphite(self, prefix, ts=None):
+        """
+        returns graphite (metric, (timestamp, value)) tuples of
+        `{prefix}.{phase}.seconds` & `{prefix}.{phase}.count`
+        """
+        ts = ts or time.time()
+        with self._lock:
+            return [
+                (
+                    "{}.{}.{}".format(prefix, name, stat),
+                    (ts, value)
+                )
+                for name in sorted(self.totals)
+                for stat, value in [
+                    ("seconds", self.totals[name]),
+                    ("count", self.counts[name]),
+                ]
+            ]
+
+    def log_line(self, event, **fields):
+        """
+        returns a one-line JSON log record of the phase timings (in ms)
+        and any other given fields.
+        """
+        record = dict(fields)
+        record['event'] = event
+        record['phases_ms'] = {
+            name: round(seconds * 1000, 1)
+            for name, seconds in self.as_dict().items()
+        }
+        return json.dumps(record, sort_keys=True, default=str)
@@ -0,0 +1,85 @@
+# std modules:
+import json
+from unittest import TestCase
+
+from imars_dags.util.testing import FakeClock
+from imars_dags.util.timing import PhaseTimer
+
+
+class Test_PhaseTimer(TestCase):
+    def test_phase_adds_up(self):
+        """ repeated phases sum their time & count """
+        clock = FakeClock()
+        timer = PhaseTimer(clock=clock)
+        for seconds in [1, 2]:
+            with timer.phase("claim"):
+                clock.now += seconds
+        self.assertEqual(timer.totals, {"claim": 3})
+        self.assertEqual(timer.counts, {"claim": 2})
+
+    def test_phase_timed_when_raising(self):
+        """ a phase that raises is still timed """
+        clock = FakeClock()
+        timer = PhaseTimer(clock=clock)
+        with self.assertRaises(ValueError):
+            with timer.phase("stat"):
+                clock.now += 1
+                raise ValueError()
+        self.assertEqual(timer.totals, {"stat": 1})
+
+    def test_timed_decorator(self):
+        """ decorated functions are timed under their name by default """
+        clock = FakeClock()
+        timer = PhaseTimer(clock=clock)
+
+        @timer.timed()
+        def parse(seconds):
+            clock.now += seconds
+            return "parsed"
+
+        @timer.timed("load")
+        def _load():
+            clock.now += 5
+
+        self.assertEqual(parse(2), "parsed")
+        _load()
+        self.assertEqual(timer.as_dict(), {"parse": 2, "load": 5})
+
+    def test_merge(self):
+        """ merging adds another timer's totals & counts """
+        clock = FakeClock()
+        batch_timer = PhaseTimer(clock=clock)
+        file_timer = PhaseTimer(clock=clock)
+        with batch_timer.phase("stat"):
+            clock.now += 1
+        with file_timer.phase("stat"):
+            clock.now += 2
+        with file_timer.phase("id_lookup"):
+            clock.now += 3
+        batch_timer.merge(file_timer)
+        self.assertEqual(batch_timer.totals, {"stat": 3, "id_lookup": 3})
+        self.assertEqual(batch_timer.counts, {"stat": 2, "id_lookup": 1})
+
+    def test_to_graphite(self):
+        """ seconds & count metrics are named under the prefix """
+        timer = PhaseTimer()
+        timer.add("claim", 0.5)
+        self.assertEqual(
+            timer.to_graphite("imars_dags.file_watcher.phases", ts=10),
+            [
+                ("imars_dags.file_watcher.phases.claim.seconds", (10, 0.5)),
+                ("imars_dags.file_watcher.phases.claim.count", (10, 1)),
+            ]
+        )
+
+    def test_log_line(self):
+        """ log line is one line of JSON w/ the fields & phases in ms """
+        timer = PhaseTimer()
+        timer.add("stat", 0.0123)
+        line = timer.log_line("file_watcher_file", file_id=7)
+        self.assertNotIn("\n", line)
+        self.assertEqual(json.loads(line), {
+            "event": "file_watcher_file",
+            "file_id": 7,
+            "phases_ms": {"stat": 12.3},
+        })